@@ -0,0 +1,117 @@
+"""
+Benchmark the in-process customer search index against the per-listing find_matching_customers RPC path.
+
+The RPC path is modelled as one sequential round trip per listing (--rtt-ms) plus a full scan of the
+searches, which is what the Postgres function does for every call. Pass --live to time the real RPC
+against the configured Supabase project instead. scan_match is a Python model of the RPC; check the
+index against the real function with scripts.check_customer_matching.
+
+Also checks an incremental refresh where only one of a user's two devices changed: the search must keep
+matching on both (sql_model follows the contract of sql/get_active_customer_searches.sql).
+
+Usage (from project root):
+    python -m benchmarks.bench_customer_matching --searches 10000 --listings 100 --rtt-ms 40
+"""
+
+import argparse
+import time
+
+from benchmarks.generators import make_customer_searches, make_match_listings
+from util.customer_matcher import CustomerSearchIndex, resolve_area_name
+
+
+def scan_match(searches, listing):
+    """Reference semantics of the find_matching_customers RPC: a filter over every search."""
+    area = resolve_area_name(listing["area_name"], listing.get("zip_code"))
+    return [
+        {"customer_search_id": s["customer_search_id"], "device_token": s["device_token"], "user_id": s["user_id"]}
+        for s in searches
+        if area in s["neighborhoods"]
+        and listing["bedroom_count"] in s["bedrooms"]
+        and s["min_bathroom"] <= listing["bathroom_count"]
+        and s["min_price"] <= listing["price"] <= s["max_price"]
+        and (s["broker_fees"] or not listing["broker_fees"])
+    ]
+
+
+def sql_model(rows):
+    """get_active_customer_searches over (search, device) rows: a changed row brings back its whole search."""
+    def load(updated_since):
+        if updated_since is None:
+            return [r for r in rows if r["is_active"]]
+        changed = {r["customer_search_id"] for r in rows if r["updated_at"] >= updated_since}
+        return [r for r in rows if r["customer_search_id"] in changed]
+    return load
+
+
+def check_sibling_devices():
+    """One device of a two-device user changes; after an incremental refresh both must still match."""
+    rows = make_customer_searches(50)
+    search = rows[0]
+    sibling = {**search, "device_token": "ExponentPushToken[sibling]"}
+    rows.append(sibling)
+    index = CustomerSearchIndex(loader=sql_model(rows))
+    index.refresh()
+
+    # Another search changes first to move the watermark past the sibling, then only the first device changes
+    rows[1] = {**rows[1], "updated_at": "2026-01-02T00:00:00+00:00"}
+    index.refresh()
+    rows[0] = {**search, "updated_at": "2026-01-03T00:00:00+00:00"}
+    index.refresh()
+    listing = {"area_name": search["neighborhoods"][0], "bedroom_count": search["bedrooms"][0],
+               "bathroom_count": search["min_bathroom"], "price": search["min_price"], "broker_fees": False}
+    matched = {r["device_token"] for r in index.match(**listing) if r["customer_search_id"] == 0}
+    return matched == {search["device_token"], sibling["device_token"]}
+
+
+def _key(rows):
+    return sorted((r["customer_search_id"], r["device_token"]) for r in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark customer search matching")
+    parser.add_argument("--searches", type=int, default=10000)
+    parser.add_argument("--listings", type=int, default=100)
+    parser.add_argument("--rtt-ms", type=float, default=40.0, help="Modelled Supabase RPC round trip")
+    parser.add_argument("--live", action="store_true", help="Time the real RPC for the same listings")
+    args = parser.parse_args()
+
+    searches = make_customer_searches(args.searches)
+    listings = make_match_listings(args.listings)
+
+    start = time.perf_counter()
+    index = CustomerSearchIndex(loader=lambda updated_since: searches)
+    index.refresh()
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    local = index.match_batch(listings)
+    local_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference = {l["id"]: scan_match(searches, l) for l in listings}
+    scan_s = time.perf_counter() - start
+    rpc_s = scan_s + args.listings * args.rtt_ms / 1000
+
+    mismatches = [lid for lid in reference if _key(reference[lid]) != _key(local[lid])]
+    total_matches = sum(len(v) for v in local.values())
+
+    print(f"searches={args.searches} listings={args.listings} matches={total_matches}")
+    print(f"index build:          {build_s * 1000:9.1f} ms")
+    print(f"index batch match:    {local_s * 1000:9.1f} ms")
+    print(f"rpc path (modelled):  {rpc_s * 1000:9.1f} ms  ({scan_s * 1000:.1f} ms scan + {args.listings} x {args.rtt_ms} ms)")
+    print(f"speedup:              {rpc_s / local_s:9.1f}x")
+    print(f"result mismatches:    {len(mismatches)}")
+    print(f"sibling devices kept: {'yes' if check_sibling_devices() else 'NO'}")
+
+    if args.live:
+        from util.db_queries import find_matching_customers
+        start = time.perf_counter()
+        for l in listings:
+            find_matching_customers(l["area_name"], l["bedroom_count"], l["bathroom_count"], l["price"],
+                                    l["broker_fees"], l["zip_code"])
+        print(f"rpc path (live):      {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark the compiled listing mapper against the hand-written mapping it replaced.
+
+v6: node -> row dict per listing. web: node -> normalized node copy (the /getListings?method=web shape)
+-> row dict per listing. Checks that both produce the same rows, then reports time and peak traced
+memory per batch.
+
+Usage (from project root):
+    python -m benchmarks.bench_listing_mapper --listings 1000 --repeat 20
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.generators import make_edges, make_srp_page
+from util.get_listings import parse_web_listings, web_response_node
+from util.listing_mapper import map_listing_edges, map_web_listing_edges
+
+
+def legacy_row(node):
+    """Row mapping as previously written out in insert_listings_util."""
+    return {
+        "id": node.get("id"),
+        "area_name": node.get("areaName"),
+        "available_at": node.get("availableAt"),
+        "bedroom_count": node.get("bedroomCount"),
+        "building_type": node.get("buildingType"),
+        "full_bathroom_count": node.get("fullBathroomCount"),
+        "furnished": node.get("furnished"),
+        "latitude": node.get("geoPoint", {}).get("latitude"),
+        "longitude": node.get("geoPoint", {}).get("longitude"),
+        "half_bathroom_count": node.get("halfBathroomCount"),
+        "has_tour_3d": node.get("hasTour3d"),
+        "has_videos": node.get("hasVideos"),
+        "is_new_development": node.get("isNewDevelopment"),
+        "lease_term": node.get("leaseTerm"),
+        "living_area_size": node.get("livingAreaSize"),
+        "media_asset_count": node.get("mediaAssetCount"),
+        "months_free": node.get("monthsFree"),
+        "no_fee": node.get("noFee"),
+        "net_effective_price": node.get("netEffectivePrice"),
+        "off_market_at": node.get("offMarketAt"),
+        "price": node.get("price"),
+        "price_changed_at": node.get("priceChangedAt"),
+        "price_delta": node.get("priceDelta"),
+        "source_group_label": node.get("sourceGroupLabel"),
+        "source_type": node.get("sourceType"),
+        "state": node.get("state"),
+        "status": node.get("status"),
+        "street": node.get("street"),
+        "unit": node.get("unit"),
+        "zip_code": node.get("zipCode"),
+        "url_path": node.get("urlPath"),
+        "lead_media_photo": (node.get("leadMedia") or {}).get("photo", {}).get("key"),
+        "photos": ",".join(photo.get("key", "") for photo in (node.get("photos") or [])),
+        "upcoming_open_house_start": (node.get("upcomingOpenHouse") or {}).get("startTime"),
+        "upcoming_open_house_end": (node.get("upcomingOpenHouse") or {}).get("endTime"),
+        "upcoming_open_house_appointment_only": (node.get("upcomingOpenHouse") or {}).get("appointmentOnly"),
+    }
+
+
+def measure(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def report(label, legacy, compiled, repeat):
+    old, old_s, old_peak = measure(legacy, repeat)
+    new, new_s, new_peak = measure(compiled, repeat)
+    print(f"{label}: rows={len(new)} identical_output={old == new}")
+    print(f"  hand-written: {old_s * 1000:8.2f} ms  {old_peak / 1024:9.1f} KiB peak")
+    print(f"  compiled:     {new_s * 1000:8.2f} ms  {new_peak / 1024:9.1f} KiB peak")
+    print(f"  speedup:      {old_s / new_s:8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the compiled listing mapper")
+    parser.add_argument("--listings", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    edges = make_edges(args.listings)
+    wanted = {edge["node"]["id"] for edge in edges[::2]}
+    report(
+        "v6 (half of the page new)",
+        lambda: [legacy_row(e["node"]) for e in edges if str(e["node"].get("id")) in wanted],
+        lambda: map_listing_edges(edges, wanted),
+        args.repeat,
+    )
+
+    web_edges = parse_web_listings(make_srp_page(args.listings))["edges"]
+    report(
+        "web",
+        lambda: [legacy_row(web_response_node(e["node"])) for e in web_edges],
+        lambda: map_web_listing_edges(web_edges),
+        args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Cold-start budget: time to import the app and to serve the first GET / in a fresh interpreter.
+
+Each run is a new subprocess so nothing is cached between measurements. Use --output to record the
+numbers (e.g. before and after a change) and --max-import-ms to fail when the budget is exceeded.
+
+Usage (from project root):
+    python -m benchmarks.bench_startup --runs 5 --output startup.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+heavy = [m for m in ("supabase", "upstash_redis", "bs4", "httpx", "requests") if m in sys.modules]
+from fastapi.testclient import TestClient
+client = TestClient(main.app)
+ready = time.perf_counter()
+client.get("/")
+served = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "first_request_ms": (served - ready) * 1000,
+                  "loaded": heavy}))
+"""
+
+
+def measure_once():
+    output = subprocess.run(
+        [sys.executable, "-c", "import sys\n" + PROBE], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import and first-request time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--max-import-ms", type=float, help="Exit non-zero if the median import exceeds this")
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(args.runs)]
+    summary = {
+        "import_ms_median": round(statistics.median(r["import_ms"] for r in runs), 1),
+        "first_request_ms_median": round(statistics.median(r["first_request_ms"] for r in runs), 1),
+        "modules_loaded_at_startup": runs[-1]["loaded"],
+        "runs": runs,
+    }
+    print(f"import main:    {summary['import_ms_median']:8.1f} ms (median of {args.runs})")
+    print(f"first GET /:    {summary['first_request_ms_median']:8.1f} ms")
+    print(f"heavy modules loaded: {', '.join(summary['modules_loaded_at_startup']) or 'none'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    if args.max_import_ms and summary["import_ms_median"] > args.max_import_ms:
+        sys.exit(f"Import budget exceeded: {summary['import_ms_median']} ms > {args.max_import_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Micro-benchmarks for the CPU-bound parts of ingest, at several input sizes.
+
+Each case is timed per call (best of --rounds, each round repeated until it takes at least
+--min-time) and its peak traced memory is measured over a single call. Save a run with --output and
+compare a later run against it with --baseline to see whether a change actually helped.
+
+Usage (from project root):
+    python -m benchmarks.bench_suite --output baseline.json
+    python -m benchmarks.bench_suite --baseline baseline.json --cases map_listing_nodes,parse_web_listings
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.generators import (
+    make_buildings, make_customer_searches, make_edges, make_match_listings, make_srp_page,
+)
+
+DEFAULT_SCALES = [10, 100, 1000, 10000]
+VIN_CRITERIA = {
+    "allowed_areas": {"Tribeca", "Soho", "Gramercy Park", "Chelsea", "Nolita", "Greenwich Village", "West Village",
+                      "Flatiron", "Financial District"},
+    "max_price": 2700,
+    "max_bedroom_count": 1,
+}
+
+
+class _SortedSetRedis:
+    """In-memory stand-in for the two sorted-set commands SeenListingStore.filter_unseen pipelines."""
+
+    def __init__(self, members):
+        self.members = members
+
+    def pipeline(self):
+        return self
+
+    def zmscore(self, key, ids):
+        self._scores = [self.members.get(lid) for lid in ids]
+
+    def exists(self, key):
+        pass
+
+    def exec(self):
+        return [self._scores, 1]
+
+
+def map_listing_nodes(n):
+    """searchRentals edges -> listings rows (compiled listing mapper)."""
+    from util.listing_mapper import map_listing_edges
+
+    edges = make_edges(n)
+    return lambda: map_listing_edges(edges)
+
+
+def parse_web_listings(n):
+    """SRP fallback page -> {search, totalCount, edges}."""
+    from util.get_listings import parse_web_listings as parse
+
+    html = make_srp_page(n)
+    return lambda: parse(html)
+
+
+def parse_building(n):
+    """buildingsByIds response -> buildings rows."""
+    from util.get_building import _parse_building
+
+    raw = make_buildings(n)
+    return lambda: [_parse_building(b) for b in raw]
+
+
+def seen_listing_diff(n):
+    """Client side of the new-ID check: half of the IDs already seen."""
+    from util.seen_listings import SeenListingStore
+
+    ids = [edge["node"]["id"] for edge in make_edges(n)]
+    redis = _SortedSetRedis({lid: 1.0 for lid in ids[::2]})
+    store = SeenListingStore(lambda: redis)
+    return lambda: store.filter_unseen(ids)
+
+
+def evaluate_listing(n):
+    """util.vin.evaluate_listing over n listings."""
+    from util.vin import evaluate_listing as evaluate
+
+    listings = make_match_listings(n)
+    return lambda: [evaluate(listing, **VIN_CRITERIA) for listing in listings]
+
+
+def match_customers(n):
+    """Customer search index: 100 new listings against n active searches."""
+    from util.customer_matcher import CustomerSearchIndex
+
+    searches = make_customer_searches(n)
+    index = CustomerSearchIndex(loader=lambda updated_since: searches)
+    index.refresh()
+    listings = make_match_listings(100)
+    return lambda: index.match_batch(listings)
+
+
+CASES = {fn.__name__: fn for fn in (
+    map_listing_nodes, parse_web_listings, parse_building, seen_listing_diff, evaluate_listing, match_customers,
+)}
+
+
+def measure(fn, rounds, min_time):
+    """(seconds per call, peak traced bytes for one call)."""
+    fn()  # warm up lazy imports and caches
+    repeat = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or repeat >= 1 << 20:
+            break
+        repeat *= 2
+    best = elapsed / repeat
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeat)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def _format_time(seconds):
+    if seconds >= 1:
+        return f"{seconds:8.2f} s "
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:8.2f} ms"
+    return f"{seconds * 1e6:8.1f} us"
+
+
+def run(cases, scales, rounds, min_time):
+    results = {}
+    for name in cases:
+        for n in scales:
+            fn = CASES[name](n)
+            seconds, peak = measure(fn, rounds, min_time)
+            results[f"{name}@{n}"] = {"case": name, "n": n, "seconds": seconds, "peak_bytes": peak}
+            print(f"{name:<20} n={n:<6} {_format_time(seconds)}  {seconds / n * 1e6:9.2f} us/item  "
+                  f"{peak / 1024:10.1f} KiB peak", flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Print time and memory ratios against a saved run; return the keys that got slower."""
+    regressions = []
+    print(f"\n{'case':<28} {'time':>8} {'memory':>8}   (current / baseline)")
+    for key, current in results.items():
+        previous = baseline.get("results", {}).get(key)
+        if not previous:
+            print(f"{key:<28} {'new':>8}")
+            continue
+        time_ratio = current["seconds"] / previous["seconds"]
+        memory_ratio = current["peak_bytes"] / previous["peak_bytes"] if previous["peak_bytes"] else 1.0
+        flag = ""
+        if time_ratio > 1 + tolerance:
+            flag = "  SLOWER"
+            regressions.append(key)
+        elif time_ratio < 1 - tolerance:
+            flag = "  faster"
+        print(f"{key:<28} {time_ratio:7.2f}x {memory_ratio:7.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the ingest hot paths")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"Comma-separated subset of: {', '.join(CASES)}")
+    parser.add_argument("--scales", default=",".join(str(n) for n in DEFAULT_SCALES))
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timing round")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results saved with --output")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Time ratio change treated as noise")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    cases = [c for c in args.cases.split(",") if c]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(unknown)}")
+    scales = [int(n) for n in args.scales.split(",") if n]
+
+    results = run(cases, scales, args.rounds, args.min_time)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+        print(f"\nSaved {len(results)} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
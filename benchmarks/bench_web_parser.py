@@ -0,0 +1,56 @@
+"""
+Benchmark the targeted SRP extractor against the BeautifulSoup parser on synthetic fixture pages.
+
+Checks that both produce the same output, then reports time and peak traced memory per page.
+
+Usage (from project root):
+    python -m benchmarks.bench_web_parser --listings 50 --repeat 10
+    python -m benchmarks.bench_web_parser --html saved_page.html
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.generators import make_srp_page
+from util.get_listings import parse_web_listings, _parse_web_listings_soup
+
+
+def measure(fn, html, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(html)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    fn(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SRP web parser")
+    parser.add_argument("--listings", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--html", help="Saved SRP page to parse instead of a synthetic one")
+    args = parser.parse_args()
+
+    if args.html:
+        with open(args.html, encoding="utf-8") as f:
+            html = f.read()
+    else:
+        html = make_srp_page(args.listings)
+
+    fast, fast_s, fast_peak = measure(parse_web_listings, html, args.repeat)
+    soup, soup_s, soup_peak = measure(_parse_web_listings_soup, html, args.repeat)
+
+    edges = len(fast.get("edges", [])) if isinstance(fast, dict) else 0
+    print(f"page={len(html) / 1024:.0f} KiB edges={edges} identical_output={fast == soup}")
+    print(f"BeautifulSoup:  {soup_s * 1000:8.1f} ms  {soup_peak / 2**20:7.1f} MiB peak")
+    print(f"targeted scan:  {fast_s * 1000:8.1f} ms  {fast_peak / 2**20:7.1f} MiB peak")
+    print(f"speedup:        {soup_s / fast_s:8.1f}x  {soup_peak / max(fast_peak, 1):7.1f}x less memory")
+
+
+if __name__ == "__main__":
+    main()
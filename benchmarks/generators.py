@@ -0,0 +1,192 @@
+"""
+Synthetic data for benchmarks: GraphQL listing nodes, buildings, customer searches and search result
+(SRP) pages. Everything is seeded, so the same arguments always produce the same data.
+"""
+
+import json
+import random
+
+AREAS = [
+    "Chelsea", "Murray Hill", "Upper West Side", "Upper East Side", "East Village", "West Village",
+    "Williamsburg", "Bushwick", "Astoria", "Long Island City", "Harlem", "Financial District",
+    "Tribeca", "Soho", "Greenpoint", "Park Slope", "Crown Heights", "Bedford-Stuyvesant",
+    "Lower East Side", "Gramercy Park", "Flatiron", "Midtown", "Hell's Kitchen", "Sunnyside",
+]
+
+
+def make_listing_node(i, rng):
+    """One searchRentals node in the shape requested by fetch_listings_v6."""
+    photos = [{"key": f"{rng.getrandbits(64):016x}"} for _ in range(rng.randint(0, 20))]
+    return {
+        "id": str(4000000 + i),
+        "areaName": rng.choice(AREAS),
+        "availableAt": "2026-11-01",
+        "bedroomCount": rng.choice([0, 1, 1, 2, 2, 3, 4]),
+        "buildingType": rng.choice(["RENTAL", "CONDO", "COOP", "HOUSE"]),
+        "fullBathroomCount": rng.choice([1, 1, 2]),
+        "furnished": rng.random() < 0.1,
+        "geoPoint": {"latitude": 40.7 + rng.random() / 10, "longitude": -74.0 + rng.random() / 10},
+        "halfBathroomCount": rng.choice([0, 0, 1]),
+        "hasTour3d": rng.random() < 0.2,
+        "hasVideos": rng.random() < 0.2,
+        "isNewDevelopment": rng.random() < 0.1,
+        "leadMedia": {"photo": photos[0]} if photos else None,
+        "leaseTerm": 12,
+        "livingAreaSize": rng.choice([None, 550, 700, 900, 1200]),
+        "mediaAssetCount": len(photos),
+        "monthsFree": rng.choice([None, None, 1]),
+        "noFee": rng.random() < 0.5,
+        "netEffectivePrice": rng.randrange(1800, 9000, 25),
+        "offMarketAt": None,
+        "photos": photos,
+        "price": rng.randrange(1800, 9000, 25),
+        "priceChangedAt": None,
+        "priceDelta": None,
+        "sourceGroupLabel": "Broker",
+        "sourceType": "PARTNER",
+        "state": "NY",
+        "status": "ACTIVE",
+        "street": f"{rng.randint(1, 999)} {rng.choice(['West', 'East'])} {rng.randint(1, 200)}th Street",
+        "upcomingOpenHouse": rng.choice([None, {"startTime": "2026-11-02T12:00:00Z", "endTime": "2026-11-02T13:00:00Z",
+                                                "appointmentOnly": False}]),
+        "unit": f"{rng.randint(1, 30)}{rng.choice('ABCDEF')}",
+        "zipCode": rng.choice(["10011", "10016", "10025", "11211", "11104"]),
+        "urlPath": f"/building/synthetic-{i}/{rng.randint(1, 30)}{rng.choice('abcdef')}",
+    }
+
+
+def make_edges(n, seed=0):
+    rng = random.Random(seed)
+    return [{"node": make_listing_node(i, rng)} for i in range(n)]
+
+
+def make_building(building_id, rng):
+    """One building in the shape requested with BUILDING_FIELDS."""
+    street = f"{rng.randint(1, 999)} {rng.choice(['West', 'East'])} {rng.randint(1, 200)}th Street"
+    units = rng.randint(4, 400)
+    return {
+        "id": str(building_id),
+        "slug": f"synthetic-building-{building_id}",
+        "name": rng.choice([None, f"The {rng.choice(AREAS)}"]),
+        "description": None,
+        "address": {"street": street, "city": "New York", "state": "NY",
+                    "zipCode": rng.choice(["10011", "10016", "10025", "11211", "11104"])},
+        "geoCenter": {"latitude": 40.7 + rng.random() / 10, "longitude": -74.0 + rng.random() / 10},
+        "yearBuilt": rng.randint(1880, 2025),
+        "floorCount": rng.randint(3, 60),
+        "totalUnitCount": units,
+        "residentialUnitCount": units,
+        "type": rng.choice(["RENTAL", "CONDO", "COOP"]),
+        "status": "COMPLETED",
+        "amenities": {
+            "list": rng.sample(["ELEVATOR", "GYM", "LAUNDRY", "ROOF_DECK", "BIKE_ROOM", "POOL"], rng.randint(0, 4)),
+            "doormanTypes": rng.choice([[], ["FULL_TIME"], ["VIRTUAL"]]),
+            "parkingTypes": [],
+            "sharedOutdoorSpaceTypes": [],
+            "storageSpaceTypes": [],
+        },
+        "policies": {
+            "list": [],
+            "petPolicy": {"catsAllowed": rng.random() < 0.7, "dogsAllowed": rng.random() < 0.5,
+                          "maxDogWeight": None, "restrictedDogBreeds": []},
+        },
+        "rentalInventorySummary": {"featureSummary": {"list": []}},
+        "nyc": {"bin": str(1000000 + building_id), "bbl": str(1000000000 + building_id), "buildingClass": "D3",
+                "buildingClassDescription": "Elevator apartment", "hasAbatements": rng.random() < 0.2,
+                "schoolDistrict": str(rng.randint(1, 32))},
+    }
+
+
+def make_buildings(n, seed=0):
+    rng = random.Random(seed)
+    return [make_building(100000 + i, rng) for i in range(n)]
+
+
+# Searches can also name the disambiguated areas that resolve_area_name maps some zip codes to
+SEARCH_AREAS = AREAS + [
+    "Murray Hill (Queens)", "Chelsea (Staten Island)", "Sunnyside (Staten Island)", "Bay Terrace",
+]
+
+
+def make_customer_searches(n, seed=0):
+    """Active customer_searches rows as returned by get_active_customer_searches."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        min_price = rng.choice([0, 1500, 2000, 2500, 3000, 3500])
+        rows.append({
+            "customer_search_id": i,
+            "user_id": f"user-{i}",
+            "device_token": f"ExponentPushToken[{i:022d}]",
+            "neighborhoods": rng.sample(SEARCH_AREAS, rng.randint(1, 8)),
+            "bedrooms": rng.sample([0, 1, 2, 3, 4], rng.randint(1, 3)),
+            "min_bathroom": rng.choice([0, 1, 1, 1.5, 2]),
+            "min_price": min_price,
+            "max_price": min_price + rng.choice([1000, 2000, 3000, 5000]),
+            "broker_fees": rng.random() < 0.5,
+            "is_active": True,
+            "updated_at": "2026-01-01T00:00:00+00:00",
+        })
+    return rows
+
+
+def make_match_listings(n, seed=1):
+    """New-listing criteria in the shape passed to find_matching_customers_batch."""
+    rng = random.Random(seed)
+    return [
+        {
+            "id": str(5000000 + i),
+            "area_name": rng.choice(AREAS),
+            "bedroom_count": rng.choice([0, 1, 1, 2, 2, 3, 4]),
+            "bathroom_count": rng.choice([1, 1, 1.5, 2, 2.5]),
+            "price": rng.randrange(1800, 9000, 25),
+            "broker_fees": rng.random() < 0.4,
+            "zip_code": rng.choice(["10011", "10016", "11354", "10314", "11104"]),
+        }
+        for i in range(n)
+    ]
+
+
+def _listing_item(node, sponsored, featured):
+    tag = '<p class="ImageContainerFooter-module__sponsoredTag___pzzz- x">Sponsored</p>' if sponsored else ""
+    feature = '<span class="Tag" data-testid="tag-text">Featured</span>' if featured else ""
+    carousel = "".join(
+        f'<li class="slide"><img src="https://photos.zillowstatic.com/{p["key"]}.jpg" alt="photo"/></li>'
+        for p in (node["photos"] or [])[:8]
+    )
+    return (
+        '<li class="sc-541ed69f-1 listing">'
+        f'<div class="ImageContainer"><ul class="carousel">{carousel}</ul>{tag}</div>'
+        f'<div class="ListingDescription"><div class="tags">{feature}</div>'
+        f'<a class="ListingDescription-module__addressTextAction___xAFZJ" href="https://streeteasy.com{node["urlPath"]}">'
+        f'{node["street"]} #{node["unit"]}</a>'
+        f'<p class="price">${node["price"]:,}</p><p class="beds">{node["bedroomCount"]} beds</p></div>'
+        '</li>'
+    )
+
+
+def make_srp_page(n, seed=0, sponsored_every=7, featured_every=11):
+    """An SRP page with n listings in the results list and a matching __next_f listingData payload."""
+    edges = make_edges(n, seed)
+    items = "".join(
+        _listing_item(e["node"], i % sponsored_every == 3, i % featured_every == 5)
+        for i, e in enumerate(edges)
+    )
+    listing_data = {
+        "search": {"criteria": "rental_type:frbo,brokernofee,brokerfee|sort_by:listed_desc"},
+        "totalCount": n * 40,
+        "edges": edges,
+        "pageInfo": {"hasNextPage": True, "endCursor": "$Sabc"},
+    }
+    tree = ["$", "$L1", None, {"children": [None, "$L2", None, {"listingData": listing_data}]}]
+    push = json.dumps([1, "7:" + json.dumps(tree)])
+    noise = json.dumps({"props": {"blob": [f"{j:08x}" * 8 for j in range(n * 20)]}})
+    return (
+        "<!DOCTYPE html><html><head><title>NYC Rentals</title>"
+        f'<script id="__NEXT_DATA__" type="application/json">{noise}</script></head><body>'
+        '<nav><ul class="menu"><li>Rent</li><li>Buy</li></ul></nav>'
+        f'<main><ul class="sc-541ed69f-0 results">{items}</ul></main>'
+        '<footer><ul><li class="sc-541ed69f-1">Not a listing</li></ul></footer>'
+        f"<script>self.__next_f.push([0])</script><script>self.__next_f.push({push})</script>"
+        "</body></html>"
+    )
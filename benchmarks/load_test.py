@@ -0,0 +1,161 @@
+"""
+Concurrency load test: the API under uvicorn against the local stand-ins, hammered by many concurrent
+clients, reporting throughput and latency percentiles per endpoint.
+
+Starts benchmarks.mock_backends (Supabase + Upstash), benchmarks.mock_streeteasy and the app in
+subprocesses, then fires --requests requests per endpoint with --concurrency in flight. Average
+requests use distinct criteria so every one misses the cache and reaches the database stand-in. With
+the async request path, latency should stay close to the stand-ins' latency as concurrency grows; a
+route that blocks the event loop shows up as p50 climbing with concurrency and throughput flat-lining.
+
+Usage (from project root):
+    python -m benchmarks.load_test --requests 500 --concurrency 100 --latency-ms 40
+    python -m benchmarks.load_test --endpoints avg --concurrency 200 --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+TOKEN = "load-test"
+ENDPOINTS = ("avg", "avg_batch", "listings")
+
+
+def _start(args, env=None):
+    return subprocess.Popen([sys.executable, "-m", *args], env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+
+
+def _wait_ready(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process for {url} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def _request(endpoint, i):
+    """(method, path, json) for the i-th request to an endpoint."""
+    criteria = {"neighborhood_names": ["Chelsea", "Tribeca"], "min_price": 1000 + i, "max_price": 6000,
+                "bedrooms": [1, 2], "min_bathroom": 1}
+    if endpoint == "avg":
+        return "POST", "/getAvgListingsLast14Days", criteria
+    if endpoint == "avg_batch":
+        return "POST", "/getAvgListingsLast14DaysBatch", [{**criteria, "min_price": 1000 + i * 10 + k} for k in range(5)]
+    return "GET", "/getListings?perPage=25", None
+
+
+async def _run_endpoint(client, endpoint, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        method, path, body = _request(endpoint, i)
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(50), 1),
+        "p95_ms": round(percentile(95), 1),
+        "p99_ms": round(percentile(99), 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 1),
+    }
+
+
+async def run_load(base_url, endpoints, requests, concurrency):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60,
+                                 headers={"Authorization": f"Bearer {TOKEN}"}) as client:
+        # One warm-up request per endpoint so client creation isn't in the measurement
+        for endpoint in endpoints:
+            method, path, body = _request(endpoint, -1)
+            await client.request(method, path, json=body)
+        return {endpoint: await _run_endpoint(client, endpoint, requests, concurrency) for endpoint in endpoints}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API against local stand-ins")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"Comma-separated: {', '.join(ENDPOINTS)}")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="Stand-in latency (database, Redis, StreetEasy)")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8790, help="App port; the stand-ins use the next two")
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    endpoints = [e for e in args.endpoints.split(",") if e]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    backends_url = f"http://127.0.0.1:{args.port + 1}"
+    streeteasy_url = f"http://127.0.0.1:{args.port + 2}/"
+    latency = ["--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms)]
+    env = {
+        **os.environ,
+        "SUPABASE_URL": backends_url, "SUPABASE_KEY": "load.test.key",
+        "KV_REST_API_URL": backends_url, "KV_REST_API_TOKEN": "load-test",
+        "STREETEASY_API_URL": streeteasy_url, "STREETEASY_USE_PROXY": "false",
+        "BEARER_TOKEN": TOKEN,
+    }
+
+    processes = []
+    try:
+        processes.append(_start(["benchmarks.mock_backends", "--port", str(args.port + 1), *latency]))
+        _wait_ready(f"{backends_url}/stats", processes[-1])
+        processes.append(_start(["benchmarks.mock_streeteasy", "--port", str(args.port + 2), "--listings", "2000",
+                                 *latency]))
+        _wait_ready(f"{streeteasy_url}stats", processes[-1])
+        processes.append(_start(["uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"], env=env))
+        _wait_ready(f"http://127.0.0.1:{args.port}/", processes[-1])
+
+        results = asyncio.run(run_load(f"http://127.0.0.1:{args.port}", endpoints, args.requests, args.concurrency))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    print(f"{'endpoint':<12} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for endpoint, r in results.items():
+        print(f"{endpoint:<12} {r['throughput_rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} "
+              f"{r['errors']:>7}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"latency_ms": args.latency_ms, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Local stand-ins for Supabase (PostgREST) and Upstash Redis (REST API), so the API can be load-tested
+offline. Both are served from one app:
+
+    POST /rest/v1/rpc/{function}    canned RPC results (avg_listings_* return a number derived from
+                                    the arguments, everything else null)
+    GET  /rest/v1/{table}           [] (no rows); POST/PATCH/DELETE echo [] as well
+    POST /                          one Redis command, e.g. ["GET", "key"]
+    POST /pipeline                  a list of commands
+
+Redis keeps an in-memory store covering the commands the app uses (strings, hashes, sets, sorted
+sets, INCR, SET NX and the lock-release script; EXPIRE is accepted and ignored). Results are
+base64-encoded when the client asks for it with Upstash-Encoding, as the real service does. Every
+request waits --latency-ms (+/- jitter), so concurrency behaves like it does against a remote database.
+
+Point the app at it with:
+    SUPABASE_URL=http://127.0.0.1:8788 KV_REST_API_URL=http://127.0.0.1:8788 KV_REST_API_TOKEN=x
+
+Usage (from project root):
+    python -m benchmarks.mock_backends --latency-ms 40 --jitter-ms 10
+"""
+
+import argparse
+import asyncio
+import base64
+import random
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+class MockRedis:
+    """Just enough of Redis for the app's caches, seen/known-building sets, fingerprints and jobs."""
+
+    def __init__(self):
+        self.strings = {}
+        self.hashes = {}
+        self.sets = {}
+        self.zsets = {}
+
+    def execute(self, command):
+        name, args = command[0].upper(), [str(a) for a in command[1:]]
+        handler = getattr(self, f"_{name.lower()}", None)
+        if handler is None:
+            raise ValueError(f"ERR unknown command '{name}'")
+        return handler(*args)
+
+    def _get(self, key):
+        return self.strings.get(key)
+
+    def _set(self, key, value, *options):
+        if "NX" in (o.upper() for o in options) and key in self.strings:
+            return None
+        self.strings[key] = value
+        return "OK"
+
+    def _eval(self, script, numkeys, *keys_and_args):
+        """Only the compare-and-delete that releases the insert_listings lock."""
+        key, token = keys_and_args[0], keys_and_args[int(numkeys)]
+        if "del" not in script or self.strings.get(key) != token:
+            return 0
+        del self.strings[key]
+        return 1
+
+    def _incr(self, key):
+        value = int(self.strings.get(key) or 0) + 1
+        self.strings[key] = str(value)
+        return value
+
+    def _exists(self, *keys):
+        return sum(1 for k in keys if any(k in store for store in (self.strings, self.hashes, self.sets, self.zsets)))
+
+    def _expire(self, key, seconds, *options):
+        return 1
+
+    def _del(self, *keys):
+        return sum(1 for k in keys if any(store.pop(k, None) is not None
+                                          for store in (self.strings, self.hashes, self.sets, self.zsets)))
+
+    def _hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def _hmget(self, key, *fields):
+        values = self.hashes.get(key, {})
+        return [values.get(f) for f in fields]
+
+    def _hset(self, key, *pairs):
+        values = self.hashes.setdefault(key, {})
+        added = sum(1 for f in pairs[::2] if f not in values)
+        values.update(zip(pairs[::2], pairs[1::2]))
+        return added
+
+    def _hdel(self, key, *fields):
+        values = self.hashes.get(key, {})
+        return sum(1 for f in fields if values.pop(f, None) is not None)
+
+    def _sadd(self, key, *members):
+        values = self.sets.setdefault(key, set())
+        added = len(set(members) - values)
+        values.update(members)
+        return added
+
+    def _smismember(self, key, *members):
+        values = self.sets.get(key, set())
+        return [int(m in values) for m in members]
+
+    def _zadd(self, key, *args):
+        nx = args[:1] == ("NX",)
+        pairs = args[1:] if nx else args
+        members = self.zsets.setdefault(key, {})
+        added = sum(1 for m in pairs[1::2] if m not in members)
+        members.update((m, float(s)) for s, m in zip(pairs[::2], pairs[1::2]) if not (nx and m in members))
+        return added
+
+    def _zrem(self, key, *members):
+        scores = self.zsets.get(key, {})
+        return sum(1 for m in members if scores.pop(m, None) is not None)
+
+    def _zrangebyscore(self, key, low, high):
+        low, high = float(low), float(high)
+        return [m for m, s in sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1]) if low <= s <= high]
+
+    def _zmscore(self, key, *members):
+        scores = self.zsets.get(key, {})
+        return [str(scores[m]) if m in scores else None for m in members]
+
+    def _zremrangebyscore(self, key, low, high):
+        members = self.zsets.get(key, {})
+        low, high = float(low), float(high)
+        removed = [m for m, s in members.items() if low <= s <= high]
+        for m in removed:
+            del members[m]
+        return len(removed)
+
+
+def _encode(result):
+    """Upstash's base64 response encoding: strings (other than OK) encoded, lists recursively."""
+    if isinstance(result, str):
+        return result if result == "OK" else base64.b64encode(result.encode()).decode()
+    if isinstance(result, list):
+        return [_encode(r) for r in result]
+    return result
+
+
+def _rpc_result(function, args):
+    if function.startswith("avg_listings_last_14_days"):
+        # Deterministic, varies with the criteria
+        return round(len(args.get("p_neighborhoods") or []) * 3.5 + (args.get("p_min_price") or 0) % 97 / 10, 4)
+    return None
+
+
+def create_app(latency_ms=0.0, jitter_ms=0.0, seed=0):
+    app = FastAPI()
+    redis = MockRedis()
+    rng = random.Random(seed)
+    stats = Counter()
+
+    async def wait():
+        delay = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms))
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+    def run_command(command, encoded):
+        try:
+            result = redis.execute(command)
+        except Exception as e:
+            return {"error": str(e)}
+        return {"result": _encode(result) if encoded else result}
+
+    @app.post("/rest/v1/rpc/{function}")
+    async def rpc(function: str, request: Request):
+        stats[f"rpc:{function}"] += 1
+        args = await request.json()
+        await wait()
+        return JSONResponse(_rpc_result(function, args or {}))
+
+    @app.api_route("/rest/v1/{table}", methods=["GET", "POST", "PATCH", "DELETE"])
+    async def table(table: str, request: Request):
+        stats[f"{request.method.lower()}:{table}"] += 1
+        await wait()
+        return JSONResponse([])
+
+    @app.post("/")
+    async def command(request: Request):
+        body = await request.json()
+        stats[f"redis:{str(body[0]).lower()}"] += 1
+        await wait()
+        return JSONResponse(run_command(body, request.headers.get("upstash-encoding") == "base64"))
+
+    @app.post("/pipeline")
+    async def pipeline(request: Request):
+        body = await request.json()
+        stats["redis:pipeline"] += 1
+        await wait()
+        encoded = request.headers.get("upstash-encoding") == "base64"
+        return JSONResponse([run_command(c, encoded) for c in body])
+
+    @app.get("/stats")
+    def get_stats():
+        return dict(stats)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run local Supabase (PostgREST) and Upstash Redis stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app = create_app(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=args.seed)
+    base = f"http://{args.host}:{args.port}"
+    print(f"Serving Supabase and Upstash stand-ins on {base} (SUPABASE_URL={base} KV_REST_API_URL={base})")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
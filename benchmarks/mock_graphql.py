@@ -0,0 +1,312 @@
+"""
+Just enough GraphQL to serve our own StreetEasy queries from a local stand-in.
+
+The schema comes from introspection.json. That dump is shallow: no enum values, no input fields, and
+list element types cut off below NON_NULL. So this module doesn't build a full schema. It parses
+operations (fields, aliases, arguments, variables, inline fragments, named fragments) and walks the
+result along the field types the dump does have:
+    - selecting a field a type doesn't define is an error, so query drift shows up locally;
+    - fields the resolver data doesn't provide come back null, or as a type-appropriate placeholder
+      when the schema says they're non-null.
+"""
+
+import json
+import os
+import re
+
+INTROSPECTION_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "introspection.json")
+
+_SCALAR_PLACEHOLDERS = {
+    "Int": 0, "Long": 0, "Float": 0.0, "Boolean": False, "String": "", "ID": "0",
+    "Date": "1970-01-01", "DateTime": "1970-01-01T00:00:00Z", "UUID": "00000000-0000-0000-0000-000000000000",
+}
+
+_TOKEN_RE = re.compile(r"""
+    (?P<skip>[\s,]+|\#[^\n]*)
+  | (?P<spread>\.\.\.)
+  | (?P<punct>[{}()\[\]:!$=@])
+  | (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<name>[_A-Za-z][_0-9A-Za-z]*)
+""", re.VERBOSE)
+
+
+class GraphQLError(Exception):
+    pass
+
+
+class Schema:
+    """Field types per object type, read from an introspection dump."""
+
+    def __init__(self, introspection):
+        schema = introspection.get("data", introspection)["__schema"]
+        self.query_type = schema["queryType"]["name"]
+        self.kinds = {t["name"]: t["kind"] for t in schema["types"]}
+        self.fields = {
+            t["name"]: {f["name"]: f["type"] for f in t["fields"] or []}
+            for t in schema["types"] if t["kind"] in ("OBJECT", "INTERFACE")
+        }
+
+    @classmethod
+    def load(cls, path=INTROSPECTION_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def field_type(self, type_name, field_name):
+        fields = self.fields.get(type_name)
+        if fields is None:
+            return None
+        if field_name not in fields:
+            raise GraphQLError(f'Cannot query field "{field_name}" on type "{type_name}".')
+        return fields[field_name]
+
+    def placeholder(self, type_ref):
+        """Stand-in value for a field the data doesn't provide."""
+        if not type_ref or type_ref["kind"] != "NON_NULL":
+            return None
+        inner = type_ref.get("ofType") or {}
+        if inner.get("kind") == "LIST":
+            return []
+        name = inner.get("name")
+        kind = self.kinds.get(name)
+        if kind in ("OBJECT", "INTERFACE", "UNION"):
+            return {}
+        if kind == "ENUM":
+            return "UNKNOWN"
+        return _SCALAR_PLACEHOLDERS.get(name, {})
+
+
+def _unwrap(type_ref):
+    """(named type, is_list) for a possibly truncated type reference."""
+    is_list = False
+    while type_ref and type_ref.get("name") is None:
+        is_list = is_list or type_ref["kind"] == "LIST"
+        type_ref = type_ref.get("ofType")
+    return (type_ref or {}).get("name"), is_list
+
+
+class _Parser:
+    def __init__(self, source):
+        self.tokens = []
+        pos = 0
+        while pos < len(source):
+            match = _TOKEN_RE.match(source, pos)
+            if not match:
+                raise GraphQLError(f"Syntax Error: unexpected character {source[pos]!r} at {pos}")
+            pos = match.end()
+            if match.lastgroup != "skip":
+                self.tokens.append((match.lastgroup, match.group()))
+        self.i = 0
+
+    def peek(self, value=None):
+        if self.i >= len(self.tokens):
+            return None
+        token = self.tokens[self.i]
+        return token if value is None or token[1] == value else None
+
+    def take(self, value=None, kind=None):
+        token = self.peek()
+        if token is None or (value is not None and token[1] != value) or (kind is not None and token[0] != kind):
+            raise GraphQLError(f"Syntax Error: expected {value or kind}, found {token[1] if token else '<EOF>'}")
+        self.i += 1
+        return token[1]
+
+    def document(self):
+        operations, fragments = [], {}
+        while self.peek():
+            if self.peek("{"):
+                operations.append({"name": None, "selections": self.selection_set()})
+                continue
+            keyword = self.take(kind="name")
+            if keyword == "fragment":
+                name = self.take(kind="name")
+                self.take("on")
+                self.take(kind="name")
+                fragments[name] = self.selection_set()
+            elif keyword in ("query", "mutation", "subscription"):
+                name = self.take(kind="name") if self.peek() and self.peek()[0] == "name" else None
+                if self.peek("("):
+                    self.skip_block("(", ")")
+                self.directives()
+                operations.append({"name": name, "type": keyword, "selections": self.selection_set()})
+            else:
+                raise GraphQLError(f"Syntax Error: unexpected {keyword}")
+        return {"operations": operations, "fragments": fragments}
+
+    def skip_block(self, open_, close):
+        depth = 0
+        while True:
+            value = self.take()
+            depth += (value == open_) - (value == close)
+            if depth == 0:
+                return
+
+    def directives(self):
+        while self.peek("@"):
+            self.take("@")
+            self.take(kind="name")
+            if self.peek("("):
+                self.arguments()
+
+    def selection_set(self):
+        self.take("{")
+        selections = []
+        while not self.peek("}"):
+            if self.peek("..."):
+                self.take("...")
+                if self.peek("on"):
+                    self.take("on")
+                    type_condition = self.take(kind="name")
+                    self.directives()
+                    selections.append({"fragment_on": type_condition, "selections": self.selection_set()})
+                elif self.peek("{"):
+                    selections.append({"fragment_on": None, "selections": self.selection_set()})
+                else:
+                    selections.append({"spread": self.take(kind="name")})
+                    self.directives()
+                continue
+            alias = name = self.take(kind="name")
+            if self.peek(":"):
+                self.take(":")
+                name = self.take(kind="name")
+            args = self.arguments() if self.peek("(") else {}
+            self.directives()
+            children = self.selection_set() if self.peek("{") else None
+            selections.append({"alias": alias, "name": name, "args": args, "selections": children})
+        self.take("}")
+        return selections
+
+    def arguments(self):
+        self.take("(")
+        args = {}
+        while not self.peek(")"):
+            name = self.take(kind="name")
+            self.take(":")
+            args[name] = self.value()
+        self.take(")")
+        return args
+
+    def value(self):
+        kind, value = self.peek()
+        if value == "$":
+            self.take("$")
+            return ("var", self.take(kind="name"))
+        if value == "[":
+            self.take("[")
+            items = []
+            while not self.peek("]"):
+                items.append(self.value())
+            self.take("]")
+            return ("list", items)
+        if value == "{":
+            self.take("{")
+            fields = {}
+            while not self.peek("}"):
+                name = self.take(kind="name")
+                self.take(":")
+                fields[name] = self.value()
+            self.take("}")
+            return ("object", fields)
+        self.i += 1
+        if kind == "string":
+            return ("const", json.loads(value))
+        if kind == "number":
+            return ("const", float(value) if any(c in value for c in ".eE") else int(value))
+        return ("const", {"true": True, "false": False, "null": None}.get(value, value))
+
+
+def parse(source):
+    return _Parser(source).document()
+
+
+def _resolve_value(node, variables):
+    kind, value = node
+    if kind == "var":
+        return variables.get(value)
+    if kind == "list":
+        return [_resolve_value(v, variables) for v in value]
+    if kind == "object":
+        return {k: _resolve_value(v, variables) for k, v in value.items()}
+    return value
+
+
+class Executor:
+    """Runs parsed operations against a dict of root resolvers: {field_name: fn(**args) -> data}."""
+
+    def __init__(self, schema, resolvers):
+        self.schema = schema
+        self.resolvers = resolvers
+        self._documents = {}
+
+    def document(self, query):
+        # Clients send the same handful of query strings over and over
+        doc = self._documents.get(query)
+        if doc is None:
+            doc = self._documents[query] = parse(query)
+        return doc
+
+    def execute(self, query, variables=None, operation_name=None):
+        """Return a GraphQL response body: {"data": ...} or {"errors": [...]}."""
+        try:
+            doc = self.document(query)
+            operations = doc["operations"]
+            if operation_name:
+                operations = [op for op in operations if op["name"] == operation_name]
+            if len(operations) != 1:
+                raise GraphQLError("Must provide exactly one operation (or a matching operationName).")
+            if operations[0].get("type", "query") != "query":
+                raise GraphQLError("Only queries are supported.")
+            ctx = {"variables": variables or {}, "fragments": doc["fragments"]}
+            data = self._root(operations[0]["selections"], ctx)
+            return {"data": data}
+        except GraphQLError as e:
+            return {"errors": [{"message": str(e)}], "data": None}
+
+    def _fields(self, selections, type_name, ctx):
+        """Flatten fragments that apply to type_name into a list of field selections."""
+        for selection in selections:
+            if "spread" in selection:
+                fragment = ctx["fragments"].get(selection["spread"])
+                if fragment is None:
+                    raise GraphQLError(f'Unknown fragment "{selection["spread"]}".')
+                yield from self._fields(fragment, type_name, ctx)
+            elif "fragment_on" in selection:
+                if selection["fragment_on"] in (None, type_name):
+                    yield from self._fields(selection["selections"], type_name, ctx)
+            else:
+                yield selection
+
+    def _root(self, selections, ctx):
+        data = {}
+        for field in self._fields(selections, self.schema.query_type, ctx):
+            if field["name"] == "__typename":
+                data[field["alias"]] = self.schema.query_type
+                continue
+            type_ref = self.schema.field_type(self.schema.query_type, field["name"])
+            resolver = self.resolvers.get(field["name"])
+            if resolver is None:
+                raise GraphQLError(f'No mock resolver for Query.{field["name"]}.')
+            args = {k: _resolve_value(v, ctx["variables"]) for k, v in field["args"].items()}
+            data[field["alias"]] = self._complete(resolver(**args), type_ref, field["selections"], ctx)
+        return data
+
+    def _complete(self, value, type_ref, selections, ctx):
+        if value is None or selections is None:
+            return value
+        type_name, _ = _unwrap(type_ref)
+        if isinstance(value, list):
+            return [self._complete(item, type_ref, selections, ctx) for item in value]
+        type_name = value.get("__typename") or type_name
+        out = {}
+        for field in self._fields(selections, type_name, ctx):
+            name = field["name"]
+            if name == "__typename":
+                out[field["alias"]] = type_name
+                continue
+            field_type = self.schema.field_type(type_name, name) if type_name else None
+            if name in value:
+                child = value[name]
+            else:
+                child = self.schema.placeholder(field_type)
+            out[field["alias"]] = self._complete(child, field_type, field["selections"], ctx)
+        return out
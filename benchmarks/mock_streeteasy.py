@@ -0,0 +1,239 @@
+"""
+Local stand-in for the StreetEasy GraphQL API (api-v6), so fetch, check-off-market and backfill can
+be load-tested offline without the paid proxy.
+
+Serves searchRentals, rentalsByListingIds, buildingsByIds and buildingByRentalListingId. The data is
+seeded and synthetic: listings from benchmarks.generators, some already off-market, some purged
+(so rentalsByListingIds skips them), each one linked to a building. Latency, jitter, injected error
+rate and the page-size cap are configurable. Injected errors are either an HTTP 503 or a 200 with
+only "errors", the two failure modes the clients have to handle. Apollo persisted queries are
+supported (turn them off with --no-persisted-queries) and responses over 1 KB are gzipped.
+
+Point the app at it with:
+    STREETEASY_API_URL=http://127.0.0.1:8787/ STREETEASY_USE_PROXY=false
+
+Usage (from project root):
+    python -m benchmarks.mock_streeteasy --listings 50000 --latency-ms 150 --jitter-ms 50 --error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+
+from benchmarks.generators import make_building, make_listing_node
+from benchmarks.mock_graphql import Executor, Schema
+
+# Borough area IDs; searching area 1 (all of NYC) returns every listing
+MOCK_AREA_IDS = (100, 200, 300, 400, 500)
+
+
+class MockStreetEasy:
+    """Seeded listing and building inventory plus the root resolvers that query it."""
+
+    def __init__(self, listings=10000, buildings=None, seed=0, off_market_fraction=0.15, purged_fraction=0.05,
+                 new_per_minute=0.0, max_per_page=500):
+        self.rng = random.Random(seed)
+        self.off_market_fraction = off_market_fraction
+        self.purged_fraction = purged_fraction
+        self.new_per_minute = new_per_minute
+        self.max_per_page = max_per_page
+        self.building_count = buildings or max(1, listings // 8)
+        self.buildings = {}
+        self.listings = {}
+        self.newest_first = []  # listing IDs, newest first
+        self.purged = set()
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._initial = listings
+
+        for i in range(self.building_count):
+            building = make_building(100000 + i, self.rng)
+            building["__typename"] = "Building"  # buildingsByIds' item type is cut off in the dump
+            self.buildings[building["id"]] = building
+        for i in range(listings):
+            self._add_listing(i, initial=True)
+        self.newest_first.reverse()
+
+    def _add_listing(self, i, initial=False):
+        node = make_listing_node(i, self.rng)
+        node["buildingId"] = str(100000 + self.rng.randrange(self.building_count))
+        node["areaId"] = self.rng.choice(MOCK_AREA_IDS)
+        if initial and self.rng.random() < self.off_market_fraction:
+            node["status"] = self.rng.choice(["RENTED", "DELISTED"])
+            node["offMarketAt"] = "2026-10-01"
+        if initial and self.rng.random() < self.purged_fraction:
+            self.purged.add(node["id"])
+        self.listings[node["id"]] = node
+        self.newest_first.append(node["id"])
+
+    def advance(self):
+        """Publish the listings due since startup under new_per_minute."""
+        if not self.new_per_minute:
+            return
+        due = int((time.monotonic() - self._started) / 60 * self.new_per_minute)
+        with self._lock:
+            added = []
+            while len(self.listings) < self._initial + due:
+                self._add_listing(len(self.listings))
+                added.append(self.newest_first.pop())
+            if added:
+                self.newest_first[:0] = reversed(added)
+
+    def search_rentals(self, input):
+        filters = input.get("filters") or {}
+        areas = set(filters.get("areas") or [1])
+        status = filters.get("rentalStatus")
+        page = max(1, int(input.get("page") or 1))
+        per_page = min(int(input.get("perPage") or 50), self.max_per_page)
+
+        matches = [
+            self.listings[lid] for lid in self.newest_first
+            if lid not in self.purged
+            and (1 in areas or self.listings[lid]["areaId"] in areas)
+            and (status is None or self.listings[lid]["status"] == status)
+        ]
+        total_pages = max(1, -(-len(matches) // per_page))
+        edges = [
+            {"__typename": "OrganicRentalEdge", "node": node}
+            for node in matches[(page - 1) * per_page:page * per_page]
+        ]
+        return {
+            "search": {"criteria": f"areas:{','.join(str(a) for a in sorted(areas))}|sort_by:listed_desc", "type": "RENTAL"},
+            "totalCount": len(matches),
+            "edges": edges,
+            "pageInfo": {"currentPage": page, "hasNextPage": page < total_pages,
+                         "hasPreviousPage": page > 1, "totalPages": total_pages},
+        }
+
+    def rentals_by_listing_ids(self, ids):
+        return [
+            {**self.listings[str(lid)], "__typename": "RentalListing"}
+            for lid in ids if str(lid) in self.listings and str(lid) not in self.purged
+        ]
+
+    def buildings_by_ids(self, ids):
+        return [self.buildings[str(bid)] for bid in ids if str(bid) in self.buildings]
+
+    def building_by_rental_listing_id(self, id):
+        listing = self.listings.get(str(id))
+        return self.buildings.get(listing["buildingId"]) if listing else None
+
+    def resolvers(self):
+        return {
+            "searchRentals": self.search_rentals,
+            "rentalsByListingIds": self.rentals_by_listing_ids,
+            "buildingsByIds": self.buildings_by_ids,
+            "buildingByRentalListingId": self.building_by_rental_listing_id,
+        }
+
+
+def _persisted_query_error(message, code):
+    return JSONResponse({"errors": [{"message": message, "extensions": {"code": code}}]})
+
+
+def create_app(mock, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=0, schema=None, persisted_queries=True):
+    app = FastAPI(title="Mock StreetEasy GraphQL")
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+    schema = schema or Schema.load()
+    stats = Counter()
+    rng = random.Random(seed)
+
+    def counted(name, resolver):
+        def wrapper(**kwargs):
+            stats[name] += 1
+            return resolver(**kwargs)
+        return wrapper
+
+    executor = Executor(schema, {name: counted(name, fn) for name, fn in mock.resolvers().items()})
+    persisted = {}  # sha256 -> query text
+
+    def resolve_query(body):
+        """(query text, None) or (None, error response) for an optionally persisted request."""
+        query = body.get("query")
+        sha256 = ((body.get("extensions") or {}).get("persistedQuery") or {}).get("sha256Hash")
+        if not sha256:
+            return query, None
+        if not persisted_queries:
+            return None, _persisted_query_error("PersistedQueryNotSupported", "PERSISTED_QUERY_NOT_SUPPORTED")
+        if query is None:
+            stats["persisted_hits" if sha256 in persisted else "persisted_misses"] += 1
+            if sha256 not in persisted:
+                return None, _persisted_query_error("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+            return persisted[sha256], None
+        if hashlib.sha256(query.encode()).hexdigest() != sha256:
+            return None, JSONResponse({"errors": [{"message": "provided sha does not match query"}]}, status_code=400)
+        persisted[sha256] = query
+        return query, None
+
+    @app.post("/")
+    async def graphql(request: Request):
+        stats["requests"] += 1
+        delay = max(0.0, rng.gauss(latency_ms, jitter_ms)) if jitter_ms else latency_ms
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if error_rate and rng.random() < error_rate:
+            stats["injected_errors"] += 1
+            if rng.random() < 0.5:
+                return JSONResponse({"message": "Service Unavailable"}, status_code=503)
+            return JSONResponse({"errors": [{"message": "Internal server error"}]})
+
+        body = await request.json()
+        query, error = resolve_query(body)
+        if error is not None:
+            return error
+        mock.advance()
+        result = executor.execute(query or "", body.get("variables"), body.get("operationName"))
+        if result.get("errors"):
+            stats["query_errors"] += 1
+        return JSONResponse(result)
+
+    @app.get("/stats")
+    def get_stats():
+        return {**stats, "persisted_queries": len(persisted), "listings": len(mock.listings), "buildings": len(mock.buildings), "purged": len(mock.purged)}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local StreetEasy GraphQL stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--listings", type=int, default=10000)
+    parser.add_argument("--buildings", type=int, help="Defaults to listings / 8")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-per-page", type=int, default=500)
+    parser.add_argument("--off-market-fraction", type=float, default=0.15)
+    parser.add_argument("--purged-fraction", type=float, default=0.05)
+    parser.add_argument("--new-per-minute", type=float, default=0.0, help="New listings published per minute")
+    parser.add_argument("--no-persisted-queries", action="store_true",
+                        help="Answer persisted-query requests with PersistedQueryNotSupported")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    mock = MockStreetEasy(
+        listings=args.listings, buildings=args.buildings, seed=args.seed,
+        off_market_fraction=args.off_market_fraction, purged_fraction=args.purged_fraction,
+        new_per_minute=args.new_per_minute, max_per_page=args.max_per_page,
+    )
+    app = create_app(mock, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                     seed=args.seed, persisted_queries=not args.no_persisted_queries)
+    print(f"Serving {len(mock.listings)} listings and {len(mock.buildings)} buildings on "
+          f"http://{args.host}:{args.port}/ (STREETEASY_API_URL=http://{args.host}:{args.port}/ "
+          f"STREETEASY_USE_PROXY=false)")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,50 @@
-from fastapi import FastAPI, Request, Depends, Response
+import os
+from contextlib import asynccontextmanager
+from functools import partial
+
+import anyio
+from fastapi import FastAPI, Request, Depends, Response, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from util.validate import validate_bearer_token
-from util.get_listings import fetch_listings
-from util.insert_listings import insert_listings_util
-from util.db_queries import get_avg_listings_last_14_days_by_name
-from util.check_off_market import check_off_market
+from util.get_listings import fetch_listings_async, web_listings_response
+from util.insert_listings import insert_listings_util_async
+from util.db_queries import (
+    get_avg_listings_last_14_days_by_name_async, get_avg_listings_last_14_days_batch_async, avg_listings_cache,
+)
+from util.check_off_market import check_off_market_async
+from util.off_market_sweep import sweep_off_market
+from util.proxy_pool import get_proxy_pool
+from util.jobs import enqueue_insert_listings, get_job
+from util.clients import prewarm, close_async_clients
+from util.building_cache import warm_known_buildings
+from util import metrics
+
+PREWARM_CONNECTIONS = os.getenv("PREWARM_CONNECTIONS", "false").lower() in ("1", "true", "yes")
+WARM_BUILDING_CACHE = os.getenv("WARM_BUILDING_CACHE", "true").lower() in ("1", "true", "yes")
+# Long blocking jobs (the off-market sweep) get their own threads so they can't use up the default
+# threadpool that sync routes and dependencies run on
+BACKGROUND_THREADS = int(os.getenv("BACKGROUND_THREADS", "4"))
+background_limiter = anyio.CapacityLimiter(BACKGROUND_THREADS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Opening connections at startup moves their cost off the first request (worth it for long-lived
+    # workers; serverless cold starts usually skip it)
+    if PREWARM_CONNECTIONS:
+        await run_in_threadpool(prewarm)
+    # The known-building set saves a buildings-table query per check batch, so it's loaded on every
+    # start (usually one SMEMBERS); failures only leave it to fill lazily
+    if WARM_BUILDING_CACHE:
+        await run_in_threadpool(warm_known_buildings)
+    yield
+    await close_async_clients()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,30 +59,96 @@ def read_root():
     return {"message": "Bloop bloop welcome to the FirstMover API!"}
 
 @app.get("/getListings")
-def get_listings(perPage: int = 25, method: str = "v6", _: bool = Depends(validate_bearer_token)):
-    return fetch_listings(method=method, per_page=perPage)
+async def get_listings(perPage: int = 25, method: str = "v6", maxPages: int = 1,
+                       _: bool = Depends(validate_bearer_token)):
+    listing_data = await fetch_listings_async(method=method, per_page=perPage, max_pages=maxPages)
+    # Ingest maps the raw page nodes; API clients keep getting the normalized shape
+    return web_listings_response(listing_data) if method == "web" else listing_data
 
 
 @app.post("/insertListings")
-def insert_listings(perPage: int = 25, _: bool = Depends(validate_bearer_token)):
-    return insert_listings_util(perPage)
+async def insert_listings(perPage: int = 25, crawl: bool = False, maxPages: int = None, mode: str = "sync",
+                          _: bool = Depends(validate_bearer_token)):
+    if mode == "job":
+        job = await run_in_threadpool(enqueue_insert_listings, per_page=perPage, crawl=crawl, max_pages=maxPages)
+        return JSONResponse(status_code=202, content={"jobId": job["id"], "status": job["status"]})
+    return await insert_listings_util_async(perPage, crawl=crawl, max_pages=maxPages)
+
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str, _: bool = Depends(validate_bearer_token)):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+AVG_LISTINGS_BATCH_MAX = 100
+AVG_LISTINGS_CRITERIA_KEYS = ("neighborhood_names", "min_price", "max_price", "bedrooms", "min_bathroom")
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _avg_listings_criteria(criteria, label="Body"):
+    """The criteria fields of a request body; 400 if any is missing or of the wrong type."""
+    if not isinstance(criteria, dict):
+        raise HTTPException(status_code=400, detail=f"{label} must be a JSON object")
+    missing = [key for key in AVG_LISTINGS_CRITERIA_KEYS if key not in criteria]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"{label} is missing {', '.join(missing)}")
+    names, bedrooms = criteria["neighborhood_names"], criteria["bedrooms"]
+    if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+        raise HTTPException(status_code=400, detail=f"{label}: neighborhood_names must be a list of strings")
+    for key in ("min_price", "max_price", "min_bathroom"):
+        if criteria[key] is not None and not _is_number(criteria[key]):
+            raise HTTPException(status_code=400, detail=f"{label}: {key} must be a number or null")
+    if bedrooms is not None and not _is_number(bedrooms) and not (
+            isinstance(bedrooms, list) and all(_is_number(b) for b in bedrooms)):
+        raise HTTPException(status_code=400, detail=f"{label}: bedrooms must be a number, a list of numbers or null")
+    return {key: criteria[key] for key in AVG_LISTINGS_CRITERIA_KEYS}
 
 @app.post("/getAvgListingsLast14Days")
 async def get_avg_listings_last_14_days(request: Request):
     body = await request.json()
-    return get_avg_listings_last_14_days_by_name(
-        neighborhood_names=body["neighborhood_names"],
-        min_price=body["min_price"],
-        max_price=body["max_price"],
-        bedrooms=body["bedrooms"],
-        min_bathroom=body["min_bathroom"]
-    )
+    return await get_avg_listings_last_14_days_by_name_async(**_avg_listings_criteria(body))
+
+@app.post("/getAvgListingsLast14DaysBatch")
+async def get_avg_listings_last_14_days_batch_endpoint(request: Request):
+    """Body: a JSON array of criteria objects shaped like /getAvgListingsLast14Days; returns averages in order."""
+    body = await request.json()
+    if not isinstance(body, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of criteria")
+    if len(body) > AVG_LISTINGS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {AVG_LISTINGS_BATCH_MAX} criteria per request")
+    criteria_list = [_avg_listings_criteria(criteria, f"Criteria {i}") for i, criteria in enumerate(body)]
+    return await get_avg_listings_last_14_days_batch_async(criteria_list)
 
 @app.post("/checkOffMarket")
-def check_off_market_endpoint(batchSize: int = 500, _: bool = Depends(validate_bearer_token)):
-    return check_off_market(batch_size=batchSize)
+async def check_off_market_endpoint(batchSize: int = 500, _: bool = Depends(validate_bearer_token)):
+    return await check_off_market_async(batch_size=batchSize)
+
+@app.post("/sweepOffMarket")
+async def sweep_off_market_endpoint(pageSize: int = 500, concurrency: int = 2, requestsPerSecond: float = 1.0,
+                                    cursor: str = None, resume: bool = True, maxBatches: int = None,
+                                    timeBudget: float = 240, _: bool = Depends(validate_bearer_token)):
+    sweep = partial(sweep_off_market, page_size=pageSize, concurrency=concurrency,
+                    requests_per_second=requestsPerSecond, cursor=cursor, resume=resume, max_batches=maxBatches,
+                    time_budget=timeBudget)
+    return await anyio.to_thread.run_sync(sweep, limiter=background_limiter)
+
+@app.get("/cacheStats")
+def cache_stats(_: bool = Depends(validate_bearer_token)):
+    return {"avg_listings_last_14_days": avg_listings_cache.get_stats()}
+
+@app.get("/proxyStats")
+def proxy_stats(_: bool = Depends(validate_bearer_token)):
+    return get_proxy_pool().stats()
+
+@app.get("/metrics")
+def get_metrics(_: bool = Depends(validate_bearer_token)):
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.options("/getAvgListingsLast14Days")
+@app.options("/getAvgListingsLast14DaysBatch")
 def options_avg_listings_last_14_days(response: Response):
     response.headers["Access-Control-Allow-Origin"] = "*"
     response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
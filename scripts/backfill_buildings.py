@@ -3,41 +3,49 @@ Backfill buildings for existing listings that don't have a building_id.
 
 Strategy:
 1. Get distinct (street, zip_code) combos from listings without building_id
-2. Pick one listing_id per unique address
-3. Call buildingByRentalListingId concurrently (NO proxy — direct API, proven safe)
-4. Deduplicate buildings by ID before bulk upserting
-5. Bulk update listings with building_id
+2. Pick one listing_id per unique address, skipping addresses already in the checkpoint
+3. Resolve building IDs concurrently behind an adaptive rate limit that backs off on 429/5xx and
+   speeds up while the API is healthy:
+   - bulk (default): one rentalsByListingIds call per --listings-per-call addresses returns their
+     buildingId; only buildings we don't have yet are then fetched, in chunked parallel
+     buildingsByIds calls
+   - per-address: one buildingByRentalListingId call per address
+4. As results arrive, upsert each chunk's buildings (deduplicated by ID) and link every listing at
+   those addresses in one link_listings_to_buildings RPC (sql/link_listings_to_buildings.sql)
+5. Record each linked address in the checkpoint file, so an interrupted run resumes where it stopped;
+   addresses that resolved to no building aren't recorded, so the next run tries them again
 
 Usage (from project root):
-    python -m scripts.backfill_buildings --batch-size 1000 --workers 1 --delay 0.5
+    python -m scripts.backfill_buildings --batch-size 1000 --concurrency 4 --rate 2 --max-rate 10
+    python -m scripts.backfill_buildings --mode per-address --concurrency 8
+    python -m scripts.backfill_buildings --reset  # forget the checkpoint and start over
 """
 
 import argparse
 import logging
-import os
+import math
 import sys
-import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from dotenv import load_dotenv
-from supabase import create_client
+import requests
 
-from util.get_building import fetch_building_by_listing_id
-from util.db_queries import upsert_buildings
+from util.backfill_engine import AdaptiveRateLimiter, Checkpoint, Throttled, is_throttle_status, run_backfill
+from util.clients import get_supabase
+from util.check_off_market import fetch_and_upsert_buildings, fetch_listing_statuses
+from util.get_building import _parse_building
+from util.db_queries import link_listings_to_buildings, upsert_buildings
+from util.streeteasy_api import BUILDING_BY_LISTING_ID, execute
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+DEFAULT_CHECKPOINT = "backfill_buildings.checkpoint.jsonl"
+LISTINGS_PER_CALL = 200
 
 
 def get_addresses_without_buildings(limit=1000):
     """Get unique (street, zip_code) pairs with a sample listing_id, where building_id is null."""
     try:
-        response = supabase.rpc("get_distinct_addresses_without_buildings", {"p_limit": limit}).execute()
+        response = get_supabase().rpc("get_distinct_addresses_without_buildings", {"p_limit": limit}).execute()
         if response.data:
             return [
                 {"listing_id": row["listing_id"], "street": row["street"], "zip_code": row["zip_code"]}
@@ -54,7 +62,7 @@ def get_addresses_without_buildings(limit=1000):
 
     while len(all_rows) < target_rows:
         response = (
-            supabase.table("listings")
+            get_supabase().table("listings")
             .select("id, street, zip_code")
             .is_("building_id", "null")
             .range(offset, offset + page_size - 1)
@@ -80,35 +88,6 @@ def get_addresses_without_buildings(limit=1000):
     return addresses[:limit]
 
 
-def bulk_update_listings_building_id(updates):
-    """Batch update listings with building_id."""
-    total = 0
-    for u in updates:
-        try:
-            response = (
-                supabase.table("listings")
-                .update({"building_id": u["building_id"]})
-                .eq("street", u["street"])
-                .eq("zip_code", u["zip_code"])
-                .is_("building_id", "null")
-                .execute()
-            )
-            total += len(response.data) if response.data else 0
-        except Exception as e:
-            logger.error(f"Failed to update listings at {u['street']}, {u['zip_code']}: {e}")
-    return total
-
-
-def fetch_one(addr, use_proxy=True):
-    """Fetch building for a single address."""
-    try:
-        building = fetch_building_by_listing_id(addr["listing_id"], use_proxy=use_proxy)
-        return (addr, building)
-    except Exception as e:
-        logger.warning(f"Error fetching building for listing {addr['listing_id']}: {e}")
-        return (addr, None)
-
-
 def deduplicate_buildings(buildings):
     """Remove duplicate buildings by ID, keeping the first occurrence."""
     seen = {}
@@ -118,74 +97,141 @@ def deduplicate_buildings(buildings):
     return list(seen.values())
 
 
-def backfill(batch_size=500, workers=1, delay=0.3):
-    """Run the backfill process with concurrent API calls."""
-    logger.info(f"Starting backfill: batch_size={batch_size}, workers={workers}, delay={delay}s")
+def fetch_building(addr, use_proxy=None):
+    """Fetch the building for one address. Raises Throttled when StreetEasy pushes back so it's retried."""
+    try:
+        data = execute(BUILDING_BY_LISTING_ID, {"id": str(addr["listing_id"])}, timeout=10, use_proxy=use_proxy)
+    except requests.exceptions.HTTPError as e:
+        status = e.response.status_code if e.response is not None else 500
+        if is_throttle_status(status):
+            retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+            raise Throttled(f"HTTP {status}", float(retry_after) if retry_after and retry_after.isdigit() else None)
+        raise
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+        raise Throttled(str(e))
+    if data.get("data") is None and data.get("errors"):
+        raise Throttled(f"GraphQL errors: {data['errors'][0].get('message')}")
+    return _parse_building(data["data"].get("buildingByRentalListingId"))
+
+
+def write_chunk(results):
+    """
+    Upsert one chunk's buildings and link its listings. Returns {listing_id: building_id} for the linked
+    addresses; ones with no building are left out so the next run tries them again.
+    """
+    unique_buildings = deduplicate_buildings([building for _, building in results if building])
+    if unique_buildings and upsert_buildings(unique_buildings) is None:
+        raise RuntimeError(f"building upsert failed for {len(unique_buildings)} buildings")
+
+    updates = [
+        {"street": addr["street"], "zip_code": addr["zip_code"], "building_id": building["id"]}
+        for addr, building in results if building
+    ]
+    linked, _ = link_listings_to_buildings(updates)
+    logger.info(f"Wrote chunk: {len(unique_buildings)} buildings upserted, {linked} listings linked")
+    return {addr["listing_id"]: building["id"] for addr, building in results if building}
+
+
+def resolve_building_ids(addrs):
+    """One rentalsByListingIds call for a batch of addresses -> [(addr, building_id or None)]."""
+    se_data = fetch_listing_statuses([a["listing_id"] for a in addrs])
+    if se_data is None:
+        raise Throttled(f"rentalsByListingIds failed for {len(addrs)} listings")
+    by_id = {str(lid): info for lid, info in se_data.items()}
+    return [(a, (by_id.get(str(a["listing_id"])) or {}).get("building_id")) for a in addrs]
+
+
+def write_bulk_chunk(results):
+    """
+    Fetch and upsert the buildings a chunk of resolved batches points at (only those we don't have),
+    then link the listings. Returns {listing_id: building_id} for the linked addresses; ones that
+    resolved to no building, or whose building couldn't be fetched, are left out so the next run tries
+    them again.
+    """
+    resolved = [pair for _, pairs in results for pair in pairs]
+    added, known_ids = fetch_and_upsert_buildings({bid for _, bid in resolved if bid})
+
+    updates = [
+        {"street": addr["street"], "zip_code": addr["zip_code"], "building_id": bid}
+        for addr, bid in resolved if bid and str(bid) in known_ids
+    ]
+    linked, _ = link_listings_to_buildings(updates)
+    logger.info(f"Wrote chunk: {added} buildings added, {linked} listings linked")
+    return {addr["listing_id"]: bid for addr, bid in resolved if bid and str(bid) in known_ids}
+
+
+def backfill(batch_size=500, concurrency=4, rate=2.0, max_rate=10.0, chunk_size=500,
+             checkpoint_path=DEFAULT_CHECKPOINT, reset=False, use_proxy=None, mode="bulk",
+             listings_per_call=LISTINGS_PER_CALL):
+    """Run the backfill with adaptive rate limiting, streaming writes and a resumable checkpoint."""
+    logger.info(f"Starting {mode} backfill: batch_size={batch_size}, concurrency={concurrency}, rate={rate}/s "
+                f"(max {max_rate}/s), chunk_size={chunk_size}")
+
+    checkpoint = Checkpoint(checkpoint_path)
+    if reset:
+        checkpoint.reset()
 
-    addresses = get_addresses_without_buildings(limit=batch_size)
+    # Older checkpoints recorded unresolved addresses as None; drop those so they're retried
+    for key in [key for key, bid in checkpoint.done.items() if bid is None]:
+        del checkpoint.done[key]
+
+    addresses = get_addresses_without_buildings(limit=batch_size + len(checkpoint))
+    addresses = [a for a in addresses if a["listing_id"] not in checkpoint][:batch_size]
     if not addresses:
         logger.info("No listings without buildings found. Done!")
         return
 
     logger.info(f"Found {len(addresses)} unique addresses to process")
 
-    buildings_to_upsert = []
-    listings_to_update = []
-    successes = 0
-    failures = 0
-
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = {}
-        for i, addr in enumerate(addresses):
-            future = executor.submit(fetch_one, addr, use_proxy=True)
-            futures[future] = addr
-
-            if delay > 0 and i < len(addresses) - 1:
-                time.sleep(delay)
-
-        for future in as_completed(futures):
-            addr, building = future.result()
-            if building:
-                buildings_to_upsert.append(building)
-                listings_to_update.append({
-                    "street": addr["street"],
-                    "zip_code": addr["zip_code"],
-                    "building_id": building["id"],
-                })
-                successes += 1
-            else:
-                failures += 1
-
-            done = successes + failures
-            if done % 100 == 0:
-                logger.info(f"  Progress: {done}/{len(addresses)} ({successes} ok, {failures} failed)")
-
-    # Deduplicate buildings by ID before upserting
-    unique_buildings = deduplicate_buildings(buildings_to_upsert)
-    logger.info(f"Upserting {len(unique_buildings)} unique buildings (from {len(buildings_to_upsert)} total)...")
-
-    for i in range(0, len(unique_buildings), 100):
-        chunk = unique_buildings[i:i+100]
-        upsert_buildings(chunk)
-
-    # Only update listings whose building was successfully upserted
-    upserted_ids = {b["id"] for b in unique_buildings}
-    valid_updates = [u for u in listings_to_update if u["building_id"] in upserted_ids]
-
-    logger.info(f"Updating listings with building_id ({len(valid_updates)} addresses)...")
-    total_updated = bulk_update_listings_building_id(valid_updates)
+    limiter = AdaptiveRateLimiter(rate=rate, max_rate=max_rate)
+    if mode == "bulk":
+        batches = [addresses[i:i + listings_per_call] for i in range(0, len(addresses), listings_per_call)]
+        stats = run_backfill(
+            batches,
+            fetch=resolve_building_ids,
+            write=write_bulk_chunk,
+            key=lambda batch: f"batch starting at {batch[0]['listing_id']}",
+            checkpoint=checkpoint,
+            limiter=limiter,
+            concurrency=concurrency,
+            chunk_size=max(1, math.ceil(chunk_size / listings_per_call)),
+            progress_every=10,
+        )
+    else:
+        stats = run_backfill(
+            addresses,
+            fetch=lambda addr: fetch_building(addr, use_proxy=use_proxy),
+            write=write_chunk,
+            key=lambda addr: addr["listing_id"],
+            checkpoint=checkpoint,
+            limiter=limiter,
+            concurrency=concurrency,
+            chunk_size=chunk_size,
+        )
 
     logger.info(
-        f"Backfill complete: {len(unique_buildings)} buildings upserted, "
-        f"{total_updated} listings updated, {failures} API failures"
+        f"Backfill complete: {stats['written']} {'batches' if mode == 'bulk' else 'addresses'} written, {stats['failed']} API failures, "
+        f"{stats['throttled']} throttled responses, {stats['write_failures']} unwritten, "
+        f"{stats['elapsed_seconds']}s, final rate {stats['final_rate']} req/s"
     )
+    return stats
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Backfill building data for listings")
     parser.add_argument("--batch-size", type=int, default=1000, help="Unique addresses to process per run")
-    parser.add_argument("--workers", type=int, default=1, help="Concurrent API requests")
-    parser.add_argument("--delay", type=float, default=0.3, help="Seconds between submitting requests")
+    parser.add_argument("--mode", choices=["bulk", "per-address"], default="bulk",
+                        help="bulk: rentalsByListingIds + buildingsByIds; per-address: buildingByRentalListingId")
+    parser.add_argument("--listings-per-call", type=int, default=LISTINGS_PER_CALL,
+                        help="Listing IDs per rentalsByListingIds call (bulk mode)")
+    parser.add_argument("--concurrency", "--workers", type=int, default=4, help="Concurrent API requests")
+    parser.add_argument("--rate", type=float, default=2.0, help="Starting requests per second")
+    parser.add_argument("--max-rate", type=float, default=10.0, help="Ceiling for the adaptive rate")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Addresses per building upsert / listing update")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Progress file for resuming")
+    parser.add_argument("--reset", action="store_true", help="Discard the checkpoint and start over")
     args = parser.parse_args()
 
-    backfill(batch_size=args.batch_size, workers=args.workers, delay=args.delay)
+    backfill(batch_size=args.batch_size, concurrency=args.concurrency, rate=args.rate, max_rate=args.max_rate,
+             chunk_size=args.chunk_size, checkpoint_path=args.checkpoint, reset=args.reset, mode=args.mode,
+             listings_per_call=args.listings_per_call)
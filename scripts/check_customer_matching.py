@@ -0,0 +1,99 @@
+"""
+Check that the in-process customer search index matches the live find_matching_customers RPC.
+
+Loads the index through get_active_customer_searches (sql/get_active_customer_searches.sql), then matches
+the most recent listings both ways and reports every listing where the (search, device) pairs differ.
+Also checks an incremental load: for a search whose user has several devices, loading only what changed
+since its newest device must bring back (and keep in the index) every device, not just the newest one.
+Exits non-zero on any mismatch, so it can gate a change to either function.
+
+Usage (from project root):
+    python -m scripts.check_customer_matching --listings 200
+"""
+
+import argparse
+import logging
+import sys
+
+from util.clients import get_supabase
+from util.customer_matcher import CustomerSearchIndex
+from util.db_queries import find_matching_customers, get_active_customer_searches
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+
+def recent_listings(limit):
+    rows = (
+        get_supabase().table("listings")
+        .select("id, area_name, bedroom_count, full_bathroom_count, half_bathroom_count, price, no_fee, zip_code")
+        .order("created_at", desc=True)
+        .limit(limit)
+        .execute()
+    ).data
+    # Same criteria insert_listings matches with
+    return [
+        {
+            "id": r["id"],
+            "area_name": r["area_name"],
+            "bedroom_count": r["bedroom_count"],
+            "bathroom_count": (r.get("full_bathroom_count") or 0) + (r.get("half_bathroom_count") or 0) * 0.5,
+            "price": r["price"],
+            "broker_fees": not r.get("no_fee", False),
+            "zip_code": r.get("zip_code"),
+        }
+        for r in rows
+    ]
+
+
+def check_sibling_devices(index, rows):
+    """Reload one multi-device search incrementally from its newest row; True if every device survives."""
+    by_search = {}
+    for row in rows:
+        by_search.setdefault(row["customer_search_id"], []).append(row)
+    candidates = [r for r in by_search.values()
+                  if len({x["device_token"] for x in r}) > 1 and len({x["updated_at"] for x in r}) > 1]
+    if not candidates:
+        logger.info("No search with several devices changed at different times; sibling check skipped")
+        return True
+
+    search_rows = candidates[0]
+    search_id = search_rows[0]["customer_search_id"]
+    expected = {r["device_token"] for r in search_rows}
+    index.apply(get_active_customer_searches(max(r["updated_at"] for r in search_rows)))
+    kept = index.device_tokens(search_id)
+    if kept != expected:
+        logger.warning(f"Search {search_id}: incremental load dropped devices {sorted(expected - kept)}")
+        return False
+    logger.info(f"Search {search_id}: incremental load kept all {len(expected)} devices")
+    return True
+
+
+def _pairs(rows):
+    return sorted((str(r["customer_search_id"]), r["device_token"]) for r in rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the customer search index with find_matching_customers")
+    parser.add_argument("--listings", type=int, default=200, help="Most recent listings to match")
+    args = parser.parse_args()
+
+    rows = get_active_customer_searches()
+    index = CustomerSearchIndex(loader=get_active_customer_searches)
+    index.apply(rows)
+    listings = recent_listings(args.listings)
+    local = index.match_batch(listings)
+
+    mismatches = 0
+    for listing in listings:
+        live = find_matching_customers(listing["area_name"], listing["bedroom_count"], listing["bathroom_count"],
+                                       listing["price"], listing["broker_fees"], listing["zip_code"]) or []
+        expected, actual = _pairs(live), _pairs(local[listing["id"]])
+        if expected != actual:
+            mismatches += 1
+            logger.warning(f"Listing {listing['id']}: RPC only {sorted(set(expected) - set(actual))}, "
+                           f"index only {sorted(set(actual) - set(expected))}")
+
+    logger.info(f"Checked {len(listings)} listings against {len(index)} search rows: {mismatches} mismatches")
+    siblings_ok = check_sibling_devices(index, rows)
+    sys.exit(1 if mismatches or not siblings_ok else 0)
@@ -0,0 +1,61 @@
+"""
+Long-running ingest worker: polls StreetEasy on a fixed interval and runs queued /insertListings jobs.
+
+Polling no longer depends on an HTTP request staying open, so the interval can be a few seconds.
+Set JOB_QUEUE=redis on the API (the default on Vercel) so jobs queued by /insertListings?mode=job are picked
+up here.
+
+Usage (from project root):
+    python -m scripts.poll_worker --interval 5 --per-page 25
+    python -m scripts.poll_worker --interval 30 --crawl --max-pages 3
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+from util.insert_listings import insert_listings_util
+from util.jobs import job_queue, run_job
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+
+def drain_jobs():
+    """Run every job currently queued."""
+    ran = 0
+    while True:
+        job_id = job_queue.get(timeout=0)
+        if not job_id:
+            return ran
+        run_job(job_id)
+        ran += 1
+
+
+def poll_forever(interval=5.0, per_page=25, crawl=False, max_pages=None):
+    logger.info(f"Starting poll worker: interval={interval}s, per_page={per_page}, crawl={crawl}")
+    while True:
+        started = time.monotonic()
+        try:
+            result = insert_listings_util(per_page, crawl=crawl, max_pages=max_pages)
+            logger.info(f"Poll complete: {len(result['newListings'])} new listings")
+        except Exception as e:
+            logger.error(f"Poll failed: {getattr(e, 'detail', e)}")
+
+        jobs = drain_jobs()
+        if jobs:
+            logger.info(f"Ran {jobs} queued jobs")
+
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Continuously poll StreetEasy for new listings")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between poll starts")
+    parser.add_argument("--per-page", type=int, default=25, help="Listings per page")
+    parser.add_argument("--crawl", action="store_true", help="Page through every configured area")
+    parser.add_argument("--max-pages", type=int, default=None, help="Pages per area in crawl mode")
+    args = parser.parse_args()
+
+    poll_forever(interval=args.interval, per_page=args.per_page, crawl=args.crawl, max_pages=args.max_pages)
@@ -0,0 +1,39 @@
+"""
+Rebuild the daily listing rollup behind the 14-day average from the listings table.
+
+The rollup is kept current by a trigger on listings (sql/listing_daily_rollup.sql); run this once after
+creating it to count existing history, or with --since to recount recent days after a bulk load.
+
+Usage (from project root):
+    python -m scripts.rebuild_listing_rollup
+    python -m scripts.rebuild_listing_rollup --since 2025-01-01
+    python -m scripts.rebuild_listing_rollup --days 14
+"""
+
+import argparse
+import logging
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from util.db_queries import rebuild_listing_daily_rollup
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild listing_daily_rollup from listings")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--since", type=date.fromisoformat, help="First day to recount (YYYY-MM-DD)")
+    group.add_argument("--days", type=int, help="Recount only the last N days")
+    args = parser.parse_args()
+
+    since = args.since
+    if args.days:
+        since = datetime.now(timezone.utc).date() - timedelta(days=args.days - 1)
+
+    started = time.monotonic()
+    logger.info(f"Rebuilding listing_daily_rollup {'from ' + since.isoformat() if since else 'for all history'}")
+    written = rebuild_listing_daily_rollup(since)
+    logger.info(f"Rebuild complete: {written} rollup rows written in {time.monotonic() - started:.1f}s")
@@ -0,0 +1,18 @@
+-- Apply many partial listing updates in one statement.
+-- p_rows: [{"id": ..., "status": ..., "off_market_at": ..., "building_id": ...}, ...]
+-- Keys that are missing or null leave the column unchanged. Returns the ids that were updated.
+create or replace function bulk_update_listings(p_rows jsonb)
+returns jsonb
+language sql
+as $$
+    with updated as (
+        update listings l
+        set status        = coalesce(r.status, l.status),
+            off_market_at = coalesce(r.off_market_at, l.off_market_at),
+            building_id   = coalesce(r.building_id, l.building_id)
+        from jsonb_populate_recordset(null::listings, p_rows) r
+        where l.id = r.id
+        returning l.id
+    )
+    select coalesce(jsonb_agg(id), '[]'::jsonb) from updated;
+$$;
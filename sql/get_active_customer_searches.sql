@@ -0,0 +1,62 @@
+-- Customer searches for the in-process match index (util/customer_matcher.CustomerSearchIndex), one row per
+-- (search, device). Reads the same tables and columns as find_matching_customers, so the index answers what
+-- the RPC would; run scripts.check_customer_matching against the live project after changing either one.
+--
+-- p_updated_since null: every active search (full load).
+-- p_updated_since set: every search whose row or any of its user's devices changed at or after it,
+-- including deactivated ones (is_active = false) so the index can drop them. A changed search comes back
+-- with all of its device rows, not just the changed ones: the index replaces a search's rows as a whole,
+-- so a partial set would drop the user's other devices. Rows at exactly the watermark come back again;
+-- applying a search twice is harmless. A search with no devices comes back once with a null
+-- device_token, which the index treats as "no longer matchable". Deleted searches and devices are only
+-- noticed by the periodic full reload.
+create or replace function get_active_customer_searches(p_updated_since timestamptz default null)
+returns table (
+    customer_search_id bigint,
+    user_id            uuid,
+    device_token       text,
+    neighborhoods      text[],
+    bedrooms           integer[],
+    min_bathroom       numeric,
+    min_price          numeric,
+    max_price          numeric,
+    broker_fees        boolean,
+    is_active          boolean,
+    updated_at         timestamptz
+)
+language sql
+stable
+as $$
+    with changed as (
+        select s.id
+        from customer_searches s
+        where p_updated_since is null and s.is_active
+        union
+        select s.id
+        from customer_searches s
+        where p_updated_since is not null and s.updated_at >= p_updated_since
+        union
+        select s.id
+        from customer_searches s
+        join devices d on d.user_id = s.user_id
+        where p_updated_since is not null and d.updated_at >= p_updated_since
+    )
+    select s.id,
+           s.user_id,
+           d.device_token,
+           s.neighborhoods,
+           s.bedrooms,
+           s.min_bathroom,
+           s.min_price,
+           s.max_price,
+           s.broker_fees,
+           s.is_active,
+           greatest(s.updated_at, d.updated_at)
+    from changed c
+    join customer_searches s on s.id = c.id
+    left join devices d on d.user_id = s.user_id;
+$$;
+
+-- Incremental refreshes run every 30 seconds
+create index if not exists customer_searches_updated_at_idx on customer_searches (updated_at);
+create index if not exists devices_updated_at_idx on devices (updated_at);
@@ -0,0 +1,43 @@
+-- Link every unlinked listing at an address to that address's building in one statement.
+-- p_rows: [{"street": ..., "zip_code": ..., "building_id": ...}, ...]
+-- Only listings whose building_id is null are touched. If an address appears more than once, the earliest
+-- entry in p_rows wins (ordered by position, as the row-by-row fallback in db_queries would apply them).
+-- Returns one entry per address: [{"street", "zip_code", "building_id", "linked"}, ...]
+create or replace function link_listings_to_buildings(p_rows jsonb)
+returns jsonb
+language sql
+as $$
+    with addresses as (
+        select distinct on (r.street, r.zip_code) r.street, r.zip_code, r.building_id
+        from jsonb_populate_recordset(null::listings, p_rows) with ordinality r
+        where r.building_id is not null
+        order by r.street, r.zip_code, r.ordinality
+    ),
+    updated as (
+        update listings l
+        set building_id = a.building_id
+        from addresses a
+        where l.street = a.street
+          and l.zip_code is not distinct from a.zip_code
+          and l.building_id is null
+        returning l.street, l.zip_code
+    ),
+    counts as (
+        select street, zip_code, count(*) as linked
+        from updated
+        group by street, zip_code
+    )
+    select coalesce(jsonb_agg(jsonb_build_object(
+        'street', a.street,
+        'zip_code', a.zip_code,
+        'building_id', a.building_id,
+        'linked', coalesce(c.linked, 0)
+    )), '[]'::jsonb)
+    from addresses a
+    left join counts c on c.street = a.street and c.zip_code is not distinct from a.zip_code;
+$$;
+
+-- Keeps the address match an index lookup as the unlinked set shrinks
+create index if not exists listings_unlinked_address_idx
+    on listings (street, zip_code)
+    where building_id is null;
@@ -0,0 +1,146 @@
+-- Daily listing counts by (area, bedrooms, bathrooms, price bucket, no_fee), so the 14-day average sums a
+-- few hundred rollup rows instead of scanning two weeks of listings.
+--
+-- day is the UTC date of listings.created_at. bathroom_count is full + 0.5 * half. price_bucket is the
+-- price rounded down to $50. Listings without a price are not counted (no price range can match them).
+-- Price filters stay exact: avg_listings_last_14_days_from_rollup sums every bucket a bound touches, then
+-- subtracts the listings in those edge buckets that fall outside the bound, counted from listings.
+create table if not exists listing_daily_rollup (
+    area_name      text    not null,
+    day            date    not null,
+    bedroom_count  integer not null,
+    bathroom_count numeric not null,
+    price_bucket   integer not null,
+    no_fee         boolean not null,
+    listing_count  integer not null default 0,
+    primary key (area_name, day, bedroom_count, bathroom_count, price_bucket, no_fee)
+);
+
+create or replace function listing_rollup_apply(p_created_at timestamptz, p_area_name text, p_bedroom_count numeric,
+                                                p_full_bathroom_count numeric, p_half_bathroom_count numeric,
+                                                p_price numeric, p_no_fee boolean, p_delta integer)
+returns void
+language sql
+as $$
+    insert into listing_daily_rollup as r
+        (area_name, day, bedroom_count, bathroom_count, price_bucket, no_fee, listing_count)
+    values (
+        coalesce(p_area_name, ''),
+        (coalesce(p_created_at, now()) at time zone 'utc')::date,
+        coalesce(p_bedroom_count, -1),
+        coalesce(p_full_bathroom_count, 0) + coalesce(p_half_bathroom_count, 0) * 0.5,
+        (floor(p_price / 50) * 50)::integer,
+        coalesce(p_no_fee, false),
+        p_delta
+    )
+    on conflict (area_name, day, bedroom_count, bathroom_count, price_bucket, no_fee)
+    do update set listing_count = r.listing_count + excluded.listing_count;
+$$;
+
+-- Keeps the rollup in step with every write to listings: the upserts in insert_listings_util (new and
+-- changed listings) as well as manual edits. A re-upsert of an existing listing is an UPDATE, so it
+-- moves the listing between buckets instead of counting it twice.
+create or replace function listing_rollup_trigger()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op = 'UPDATE' and (old.created_at, old.area_name, old.bedroom_count, old.full_bathroom_count,
+                             old.half_bathroom_count, old.price, old.no_fee)
+        is not distinct from (new.created_at, new.area_name, new.bedroom_count, new.full_bathroom_count,
+                              new.half_bathroom_count, new.price, new.no_fee) then
+        return null;
+    end if;
+    if tg_op in ('UPDATE', 'DELETE') and old.price is not null then
+        perform listing_rollup_apply(old.created_at, old.area_name, old.bedroom_count, old.full_bathroom_count,
+                                     old.half_bathroom_count, old.price, old.no_fee, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') and new.price is not null then
+        perform listing_rollup_apply(new.created_at, new.area_name, new.bedroom_count, new.full_bathroom_count,
+                                     new.half_bathroom_count, new.price, new.no_fee, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists listings_daily_rollup on listings;
+create trigger listings_daily_rollup
+    after insert or delete or update of created_at, area_name, bedroom_count, full_bathroom_count,
+        half_bathroom_count, price, no_fee
+    on listings
+    for each row execute function listing_rollup_trigger();
+
+-- Recount the rollup from listings, for history or after a bulk load with triggers disabled.
+-- p_since: only rebuild days from this date on (null = everything). Returns the number of rollup rows written.
+-- The table lock makes concurrent listing writes wait, so none are lost or counted twice.
+create or replace function rebuild_listing_daily_rollup(p_since date default null)
+returns integer
+language plpgsql
+as $$
+declare
+    written integer;
+begin
+    lock table listing_daily_rollup in exclusive mode;
+    delete from listing_daily_rollup where p_since is null or day >= p_since;
+    insert into listing_daily_rollup
+        (area_name, day, bedroom_count, bathroom_count, price_bucket, no_fee, listing_count)
+    select coalesce(area_name, ''),
+           (created_at at time zone 'utc')::date,
+           coalesce(bedroom_count, -1),
+           coalesce(full_bathroom_count, 0) + coalesce(half_bathroom_count, 0) * 0.5,
+           (floor(price / 50) * 50)::integer,
+           coalesce(no_fee, false),
+           count(*)
+    from listings
+    where price is not null
+      and (p_since is null or created_at >= p_since::timestamp at time zone 'utc')
+    group by 1, 2, 3, 4, 5, 6;
+    get diagnostics written = row_count;
+    return written;
+end;
+$$;
+
+-- Average listings per day over the last 14 days (today and the 13 before it, UTC) matching the criteria.
+-- Same parameters and results as avg_listings_last_14_days_by_name; p_broker_fees = false counts only
+-- no-fee listings. When a price bound isn't a multiple of $50 its bucket also holds listings just outside
+-- the range (min_price = 2020 buckets a $2000 listing with $2020 ones); those are counted exactly from
+-- listings, over at most two $50 price slices, and taken off the bucket sum.
+create or replace function avg_listings_last_14_days_from_rollup(p_neighborhoods text[], p_min_price numeric,
+                                                                  p_max_price numeric, p_bedrooms integer[],
+                                                                  p_min_bathroom numeric, p_broker_fees boolean)
+returns numeric
+language sql
+stable
+as $$
+    with buckets as (
+        select coalesce(sum(listing_count), 0) as listings
+        from listing_daily_rollup
+        where area_name = any(p_neighborhoods)
+          and day > (now() at time zone 'utc')::date - 14
+          and (p_bedrooms is null or bedroom_count = any(p_bedrooms))
+          and (p_min_bathroom is null or bathroom_count >= p_min_bathroom)
+          and (p_min_price is null or price_bucket >= floor(p_min_price / 50) * 50)
+          and (p_max_price is null or price_bucket <= floor(p_max_price / 50) * 50)
+          and (p_broker_fees is null or p_broker_fees or no_fee)
+    ),
+    outside_bounds as (
+        -- Same bucketing as the rollup (listing_rollup_apply), restricted to the edge buckets
+        select count(*) as listings
+        from listings l
+        where l.price is not null
+          and l.area_name = any(p_neighborhoods)
+          and l.created_at >= ((now() at time zone 'utc')::date - 13)::timestamp at time zone 'utc'
+          and (p_bedrooms is null or coalesce(l.bedroom_count, -1) = any(p_bedrooms))
+          and (p_min_bathroom is null
+               or coalesce(l.full_bathroom_count, 0) + coalesce(l.half_bathroom_count, 0) * 0.5 >= p_min_bathroom)
+          and (p_broker_fees is null or p_broker_fees or coalesce(l.no_fee, false))
+          and ((p_min_price is not null and l.price >= floor(p_min_price / 50) * 50 and l.price < p_min_price)
+               or (p_max_price is not null and l.price > p_max_price
+                   and l.price < floor(p_max_price / 50) * 50 + 50))
+    )
+    select greatest(b.listings - o.listings, 0)::numeric / 14
+    from buckets b, outside_bounds o;
+$$;
+
+-- Keeps the edge-bucket correction an index range scan per neighborhood
+create index if not exists listings_area_price_created_idx on listings (area_name, price, created_at);
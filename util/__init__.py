@@ -0,0 +1,4 @@
+from dotenv import load_dotenv
+
+# Load .env once for every util module (and scripts that import them)
+load_dotenv()
@@ -0,0 +1,213 @@
+"""
+Async engine for long-running backfills against StreetEasy.
+
+run_backfill() fetches items with bounded concurrency behind an AdaptiveRateLimiter, hands results
+to a writer in chunks as they arrive, and records every written item in a Checkpoint so an
+interrupted run picks up where it stopped. The fetch and write callables are plain (blocking)
+functions; they run on a thread pool sized to the concurrency.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+
+class Throttled(Exception):
+    """Raised by a fetch callable when the upstream pushed back (429, 5xx, timeout); the item is retried."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_throttle_status(status_code):
+    return status_code == 429 or status_code >= 500
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose refill rate adapts to the upstream (AIMD).
+
+    Every success raises the rate by `increase` / rate, i.e. by about `increase` requests/s per second
+    of clean traffic; a throttle multiplies it by `decrease` (at most once per `cooldown` seconds, so a
+    burst of concurrent failures counts once) and empties the bucket. A Retry-After pauses all callers.
+    """
+
+    def __init__(self, rate=2.0, min_rate=0.2, max_rate=20.0, increase=0.5, decrease=0.5, burst=2, cooldown=2.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self.cooldown = cooldown
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+            elif self._tokens >= 1:
+                self._tokens -= 1
+                return
+            else:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self, retry_after=None):
+        now = time.monotonic()
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        if now - self._last_decrease >= self.cooldown:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = 0.0
+            self._last_decrease = now
+            logger.info(f"Upstream throttled; rate lowered to {self.rate:.2f} req/s")
+
+
+class Checkpoint:
+    """Append-only JSON-lines file of finished items ({"key", "value"}); the last value per key wins."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash mid-write
+                    self.done[str(entry["key"])] = entry.get("value")
+            logger.info(f"Resuming from checkpoint {path}: {len(self.done)} items already done")
+
+    def __contains__(self, key):
+        return str(key) in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def record(self, entries):
+        """Persist {key: value} for a written chunk."""
+        if not entries:
+            return
+        for key, value in entries.items():
+            self.done[str(key)] = value
+        if not self.path:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps({"key": str(key), "value": value}) + "\n" for key, value in entries.items())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def reset(self):
+        self.done = {}
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def _run(items, fetch, write, key, checkpoint, limiter, concurrency, chunk_size, max_attempts, progress_every):
+    queue = asyncio.Queue()
+    for item in items:
+        if key(item) not in checkpoint:
+            queue.put_nowait(item)
+    total = queue.qsize()
+    stats = {"total": total, "fetched": 0, "failed": 0, "throttled": 0, "written": 0, "write_failures": 0}
+    buffer = []
+    write_lock = asyncio.Lock()
+    writes = set()
+    started = time.monotonic()
+
+    async def flush(force=False):
+        async with write_lock:
+            while buffer and (force or len(buffer) >= chunk_size):
+                chunk = buffer[:chunk_size]
+                del buffer[:chunk_size]
+                try:
+                    written = await asyncio.to_thread(write, chunk)
+                except Exception as e:
+                    stats["write_failures"] += len(chunk)
+                    logger.error(f"Failed to write chunk of {len(chunk)}; it will be retried next run: {e}")
+                    continue
+                checkpoint.record(written)
+                stats["written"] += len(chunk)
+
+    async def worker():
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            for attempt in range(1, max_attempts + 1):
+                await limiter.acquire()
+                try:
+                    result = await asyncio.to_thread(fetch, item)
+                except Throttled as e:
+                    stats["throttled"] += 1
+                    limiter.on_throttle(e.retry_after)
+                    if attempt == max_attempts:
+                        stats["failed"] += 1
+                        logger.warning(f"Giving up on {key(item)} after {attempt} attempts: {e}")
+                    continue
+                except Exception as e:
+                    stats["failed"] += 1
+                    logger.warning(f"Failed to fetch {key(item)}: {e}")
+                    break
+                limiter.on_success()
+                stats["fetched"] += 1
+                buffer.append((item, result))
+                break
+
+            done = stats["fetched"] + stats["failed"]
+            if progress_every and done % progress_every == 0:
+                elapsed = time.monotonic() - started
+                logger.info(f"  Progress: {done}/{total} ({stats['fetched']} ok, {stats['failed']} failed, "
+                            f"{stats['throttled']} throttled) at {done / max(elapsed, 1e-6):.1f}/s, "
+                            f"limit {limiter.rate:.2f} req/s")
+            if len(buffer) >= chunk_size:
+                # Write in the background; fetching carries on while the chunk is upserted
+                task = asyncio.create_task(flush())
+                writes.add(task)
+                task.add_done_callback(writes.discard)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    await asyncio.gather(*writes)
+    await flush(force=True)
+    stats["elapsed_seconds"] = round(time.monotonic() - started, 1)
+    stats["final_rate"] = round(limiter.rate, 2)
+    return stats
+
+
+def run_backfill(items, fetch, write, key=lambda item: item, checkpoint=None, limiter=None, concurrency=8,
+                 chunk_size=100, max_attempts=4, progress_every=100):
+    """
+    Fetch every item not already in the checkpoint and write the results in chunks.
+
+    fetch(item) returns a result or raises Throttled (retried, slows the limiter) or any other error
+    (counted as failed, not checkpointed, so it's tried again next run). write(chunk) receives a list of
+    (item, result) pairs and returns {key: value} to checkpoint; if it raises, the chunk isn't
+    checkpointed. Returns run statistics.
+    """
+    checkpoint = checkpoint if checkpoint is not None else Checkpoint(None)
+    limiter = limiter or AdaptiveRateLimiter()
+
+    async def main():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency + 1))
+        return await _run(items, fetch, write, key, checkpoint, limiter, concurrency, chunk_size, max_attempts,
+                          progress_every)
+
+    return asyncio.run(main())
@@ -0,0 +1,92 @@
+import logging
+import sys
+import threading
+
+from util.clients import get_redis, get_supabase
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+KNOWN_BUILDINGS_KEY = "known_building_ids"
+WARM_PAGE_SIZE = 1000
+
+
+class KnownBuildings:
+    """Building IDs that exist in the buildings table: an in-process set backed by a Redis set.
+
+    Buildings are effectively never deleted, so membership only grows. Lookups hit the local set
+    first, then one SMISMEMBER for the rest; anything still unknown must be checked against the DB
+    by the caller and reported back with add().
+    """
+
+    def __init__(self, key=KNOWN_BUILDINGS_KEY):
+        self.key = key
+        self._local = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._local)
+
+    def filter_known(self, building_ids):
+        """Return the subset of building_ids known to exist."""
+        ids = {str(bid) for bid in building_ids}
+        known = ids & self._local
+        misses = list(ids - known)
+        if misses:
+            try:
+                flags = get_redis().smismember(self.key, *misses)
+                remote = {bid for bid, flag in zip(misses, flags) if flag}
+                if remote:
+                    with self._lock:
+                        self._local |= remote
+                    known |= remote
+            except Exception as e:
+                logger.warning(f"Known-building lookup in Redis failed: {e}")
+        return known
+
+    def add(self, building_ids):
+        ids = {str(bid) for bid in building_ids}
+        if not ids:
+            return
+        with self._lock:
+            self._local |= ids
+        try:
+            get_redis().sadd(self.key, *ids)
+        except Exception as e:
+            logger.warning(f"Failed to add {len(ids)} known buildings to Redis: {e}")
+
+    def warm(self):
+        """Load the Redis set into memory, seeding it from the buildings table if it's empty."""
+        members = get_redis().smembers(self.key)
+        if members:
+            with self._lock:
+                self._local |= set(members)
+            logger.info(f"Warmed {len(members)} known buildings from Redis")
+            return len(members)
+
+        total = 0
+        last_id = None
+        while True:
+            query = get_supabase().table("buildings").select("id").order("id").limit(WARM_PAGE_SIZE)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            rows = query.execute().data
+            if not rows:
+                break
+            self.add(r["id"] for r in rows)
+            total += len(rows)
+            last_id = rows[-1]["id"]
+        logger.info(f"Warmed {total} known buildings from the buildings table")
+        return total
+
+
+known_buildings = KnownBuildings()
+
+
+def warm_known_buildings():
+    """known_buildings.warm() for startup: a failure is logged and the cache just fills lazily."""
+    try:
+        return known_buildings.warm()
+    except Exception as e:
+        logger.warning(f"Known-building warm-up failed: {e}")
+        return 0
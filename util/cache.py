@@ -0,0 +1,175 @@
+import hashlib
+import json
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from util.flow import run_flow, run_flow_async
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+
+def canonical_key(*parts):
+    """Stable cache key for JSON-like arguments (dict keys sorted, no whitespace)."""
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+class TwoTierCache:
+    """In-process LRU with TTL in front of a shared Redis tier.
+
+    Invalidation bumps a version number stored in Redis; keys in both tiers include the version, so
+    every instance stops serving old entries once it re-reads the version (at most every
+    `version_check_interval` seconds). Redis errors degrade to local-only caching.
+
+    get_or_compute_async() is the event-loop variant: same tiers and keys, Redis through
+    `get_async_redis` and an async compute.
+    """
+
+    def __init__(self, name, get_redis=None, maxsize=1024, local_ttl=60, redis_ttl=3600, version_check_interval=5,
+                 get_async_redis=None):
+        self.name = name
+        self._get_redis = get_redis
+        self._redis = None
+        self._get_async_redis = get_async_redis
+        self.maxsize = maxsize
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.version_check_interval = version_check_interval
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        self._version_checked_at = 0.0
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "invalidations": 0, "redis_errors": 0}
+
+    @property
+    def redis(self):
+        """Shared Redis tier, created on first use; None (local-only) if unavailable."""
+        if self._redis is None and self._get_redis is not None:
+            try:
+                self._redis = self._get_redis()
+            except Exception as e:
+                logger.warning(f"Cache {self.name}: Redis unavailable, caching locally only: {e}")
+                self._get_redis = None
+        return self._redis
+
+    @property
+    def _version_key(self):
+        return f"cache:{self.name}:version"
+
+    @property
+    def async_redis(self):
+        """Async client for the shared tier; None (local-only) if unavailable."""
+        if self._get_async_redis is None:
+            return None
+        try:
+            return self._get_async_redis()
+        except Exception as e:
+            logger.warning(f"Cache {self.name}: Redis unavailable, caching locally only: {e}")
+            self._get_async_redis = None
+            return None
+
+    def _get_local(self, full_key, now):
+        with self._lock:
+            entry = self._local.get(full_key)
+            if entry and entry[0] > now:
+                self._local.move_to_end(full_key)
+                self.stats["local_hits"] += 1
+                return True, entry[1]
+        return False, None
+
+    def _lookup(self, key, has_redis):
+        """
+        One get-or-compute as a flow (util/flow.py), shared by get_or_compute() and get_or_compute_async():
+        yields ("get", redis_key), ("set", redis_key, raw) or ("compute",) and is sent the result. Redis
+        errors are thrown back in and degrade to local-only caching; compute errors propagate.
+        """
+        now = time.monotonic()
+        if has_redis and now - self._version_checked_at > self.version_check_interval:
+            self._version_checked_at = now
+            try:
+                self._version = int((yield "get", self._version_key) or 0)
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"Cache {self.name}: failed to read version: {e}")
+        full_key = f"cache:{self.name}:{self._version}:{key}"
+
+        hit, value = self._get_local(full_key, now)
+        if hit:
+            return value
+
+        if has_redis:
+            try:
+                raw = yield "get", full_key
+                if raw is not None:
+                    value = json.loads(raw)
+                    self._store_local(full_key, value, now)
+                    self.stats["redis_hits"] += 1
+                    return value
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"Cache {self.name}: Redis read failed: {e}")
+
+        self.stats["misses"] += 1
+        value = yield ("compute",)
+        self._store_local(full_key, value, now)
+        if has_redis:
+            try:
+                yield "set", full_key, json.dumps(value)
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"Cache {self.name}: Redis write failed: {e}")
+        return value
+
+    def _perform(self, redis, compute):
+        """The flow's requests on a Redis client; returns awaitables when the client and compute are async."""
+        def perform(request):
+            command, *args = request
+            if command == "compute":
+                return compute()
+            if command == "set":
+                return redis.set(*args, ex=self.redis_ttl)
+            return redis.get(*args)
+        return perform
+
+    def get_or_compute(self, key, compute):
+        redis = self.redis
+        return run_flow(self._lookup(key, redis is not None), self._perform(redis, compute))
+
+    async def get_or_compute_async(self, key, compute):
+        """get_or_compute() with an async compute (a zero-argument coroutine function)."""
+        redis = self.async_redis
+        return await run_flow_async(self._lookup(key, redis is not None), self._perform(redis, compute))
+
+    def _store_local(self, full_key, value, now):
+        with self._lock:
+            self._local[full_key] = (now + self.local_ttl, value)
+            self._local.move_to_end(full_key)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def invalidate(self):
+        """Drop every entry, locally and (via the version bump) on every other instance."""
+        with self._lock:
+            self._local.clear()
+        self.stats["invalidations"] += 1
+        if self.redis is not None:
+            try:
+                self._version = int(self.redis.incr(self._version_key))
+                self._version_checked_at = time.monotonic()
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"Cache {self.name}: failed to bump version: {e}")
+
+    def get_stats(self):
+        lookups = self.stats["local_hits"] + self.stats["redis_hits"] + self.stats["misses"]
+        hits = lookups - self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._local),
+            "version": self._version,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+        }
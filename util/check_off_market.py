@@ -1,60 +1,50 @@
+import asyncio
 import logging
-import os
 import sys
 
-import requests
-from dotenv import load_dotenv
-from supabase import create_client
-
-from util.get_building import SE_HEADERS, BUILDING_FIELDS, _parse_building, _get_proxy
+from util.building_cache import known_buildings
+from util.clients import get_supabase, get_async_supabase
+from util.flow import run_flow, run_flow_async
+from util.get_building import fetch_buildings_by_ids
+from util.listing_changes import listing_changes
+from util.db_queries import bulk_update_listings, link_listings_to_buildings
+from util.streeteasy_api import LISTING_STATUSES, execute, execute_async
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+EMPTY_CHECK = {"checked": 0, "off_market": 0, "expired": 0, "buildings_added": 0, "buildings_linked": 0,
+               "address_linked": 0}
 
-SE_API_URL = "https://api-v6.streeteasy.com/"
 
+def _parse_statuses(data):
+    return {
+        l["id"]: {
+            "status": l["status"],
+            "off_market_at": l.get("offMarketAt"),
+            "building_id": l.get("buildingId"),
+        }
+        for l in data["data"]["rentalsByListingIds"]
+    }
 
-def fetch_listing_statuses(listing_ids):
-    """Bulk fetch listing statuses + building IDs from StreetEasy.
-    Returns dict of {listing_id: {status, offMarketAt, buildingId}} for listings SE still knows about.
-    """
+
+def _statuses_flow(listing_ids):
+    """The rentalsByListingIds check as a flow (util/flow.py): yields the variables to send, is sent the
+    response body, and retries once (on a different proxy port) when the call fails or returns no data."""
     if not listing_ids:
         return {}
 
-    payload = {
-        "query": """query CheckListingStatus($ids: [ID!]!) {
-            rentalsByListingIds(ids: $ids) {
-                id buildingId status offMarketAt
-            }
-        }""",
-        "variables": {"ids": [str(id) for id in listing_ids]}
-    }
+    variables = {"ids": [str(id) for id in listing_ids]}
 
-    # Retry once with a different proxy port on failure
     for attempt in range(2):
         try:
-            response = requests.post(SE_API_URL, headers=SE_HEADERS, json=payload, proxies=_get_proxy(), timeout=30)
-            response.raise_for_status()
-            data = response.json()
+            data = yield variables
 
-            if "data" not in data:
+            if not data.get("data"):
                 logger.warning(f"Unexpected response (attempt {attempt + 1}): {str(data)[:200]}")
                 continue
 
-            listings = data["data"]["rentalsByListingIds"]
-            return {
-                l["id"]: {
-                    "status": l["status"],
-                    "off_market_at": l.get("offMarketAt"),
-                    "building_id": l.get("buildingId"),
-                }
-                for l in listings
-            }
+            return _parse_statuses(data)
         except Exception as e:
             logger.warning(f"Attempt {attempt + 1} failed: {e}")
 
@@ -62,39 +52,43 @@ def fetch_listing_statuses(listing_ids):
     return None  # None = API failed, {} = API succeeded but returned no matches
 
 
+def fetch_listing_statuses(listing_ids):
+    """Bulk fetch listing statuses + building IDs from StreetEasy.
+    Returns dict of {listing_id: {status, offMarketAt, buildingId}} for listings SE still knows about.
+    """
+    return run_flow(_statuses_flow(listing_ids), lambda variables: execute(LISTING_STATUSES, variables, timeout=30))
+
+
+async def fetch_listing_statuses_async(listing_ids):
+    """fetch_listing_statuses() over the async transport; same return values."""
+    return await run_flow_async(_statuses_flow(listing_ids),
+                                lambda variables: execute_async(LISTING_STATUSES, variables, timeout=30))
+
+
 def fetch_and_upsert_buildings(building_ids):
     """Fetch full building data for IDs we don't have yet, upsert them.
-    Returns (count_added, set_of_all_known_ids) so callers know which building_ids are safe to link.
+    Returns (count_added, set_of_all_known_ids as strings) so callers know which building_ids are safe to link.
     """
     if not building_ids:
         return 0, set()
 
-    # Check which buildings we already have
-    existing = supabase.table("buildings").select("id").in_("id", list(building_ids)).execute()
-    existing_ids = {r["id"] for r in existing.data}
-    new_ids = [bid for bid in building_ids if bid not in existing_ids]
+    # Check which buildings we already have: known-building cache first, DB only for cache misses
+    existing_ids = known_buildings.filter_known(building_ids)
+    unknown_ids = [bid for bid in building_ids if str(bid) not in existing_ids]
+    if unknown_ids:
+        existing = get_supabase().table("buildings").select("id").in_("id", unknown_ids).execute()
+        found_ids = {str(r["id"]) for r in existing.data}
+        known_buildings.add(found_ids)
+        existing_ids |= found_ids
+    new_ids = [bid for bid in building_ids if str(bid) not in existing_ids]
 
     if not new_ids:
         return 0, existing_ids
 
     logger.info(f"Fetching {len(new_ids)} new buildings via buildingsByIds")
 
-    payload = {
-        "query": f"""query GetBuildingsByIds($ids: [ID!]!) {{
-            buildingsByIds(ids: $ids) {{
-                {BUILDING_FIELDS}
-            }}
-        }}""",
-        "variables": {"ids": new_ids}
-    }
-
     try:
-        response = requests.post(SE_API_URL, headers=SE_HEADERS, json=payload, proxies=_get_proxy(), timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        raw_buildings = data.get("data", {}).get("buildingsByIds") or []
-
-        buildings = [_parse_building(b) for b in raw_buildings if b]
+        buildings = fetch_buildings_by_ids(new_ids)
         if buildings:
             seen = {}
             for b in buildings:
@@ -104,9 +98,10 @@ def fetch_and_upsert_buildings(building_ids):
 
             for i in range(0, len(unique), 100):
                 chunk = unique[i:i+100]
-                supabase.table("buildings").upsert(chunk).execute()
+                get_supabase().table("buildings").upsert(chunk).execute()
 
-            upserted_ids = {b["id"] for b in unique}
+            upserted_ids = {str(b["id"]) for b in unique}
+            known_buildings.add(upserted_ids)
             logger.info(f"Upserted {len(unique)} new buildings")
             return len(unique), existing_ids | upserted_ids
     except Exception as e:
@@ -115,20 +110,21 @@ def fetch_and_upsert_buildings(building_ids):
     return 0, existing_ids
 
 
-def check_off_market(batch_size=500):
+async def check_off_market_async(batch_size=500):
     """
     Check ACTIVE listings for off-market status and backfill building IDs.
 
     1. Get batch of oldest ACTIVE listings from DB
     2. Bulk check their status via rentalsByListingIds (one API call)
-    3. Update status + off_market_at for any that changed
-    4. Fetch and upsert any new buildings discovered
-    5. Backfill building_id on listings
+    3. Fetch and upsert any new buildings discovered
+    4. Write status + off_market_at changes and building_id backfills in one bulk update
+
+    The read and the status check run on the async clients; the writes (step 3 on) run in a worker thread.
     """
-    # Get oldest ACTIVE listings
-    response = (
-        supabase.table("listings")
-        .select("id, building_id, created_at")
+    client = await get_async_supabase()
+    response = await (
+        client.table("listings")
+        .select("id, building_id, street, zip_code, created_at")
         .eq("status", "ACTIVE")
         .order("created_at")
         .limit(batch_size)
@@ -137,19 +133,31 @@ def check_off_market(batch_size=500):
     listing_rows = response.data
     if not listing_rows:
         logger.info("No ACTIVE listings to check")
-        return {"checked": 0, "off_market": 0, "expired": 0, "buildings_added": 0, "buildings_linked": 0}
+        return dict(EMPTY_CHECK)
 
     listing_ids = [r["id"] for r in listing_rows]
-    listings_missing_building = {r["id"] for r in listing_rows if not r.get("building_id")}
-    listing_dates = {r["id"]: r.get("created_at") for r in listing_rows}
+    logger.info(f"Checking {len(listing_ids)} listings "
+                f"({sum(1 for r in listing_rows if not r.get('building_id'))} missing building_id)")
+
+    se_data = await fetch_listing_statuses_async(listing_ids)
+    result = await asyncio.to_thread(apply_listing_statuses, listing_rows, se_data)
+    logger.info(f"Check complete: {result}")
+    return result
 
-    logger.info(f"Checking {len(listing_ids)} listings ({len(listings_missing_building)} missing building_id)")
 
-    # Bulk fetch statuses from StreetEasy
-    se_data = fetch_listing_statuses(listing_ids)
+def apply_listing_statuses(listing_rows, se_data):
+    """
+    Write the outcome of a rentalsByListingIds check for a batch of listing rows ({id, building_id}, plus
+    street and zip_code when known): off-market statuses, EXPIRED for listings SE no longer returns, new
+    buildings and building links. A building found for one listing is also linked to every other unlinked
+    listing at the same address, in one set-based update.
+    """
+    listing_ids = [r["id"] for r in listing_rows]
+    listings_missing_building = {r["id"] for r in listing_rows if not r.get("building_id")}
+
     if se_data is None:
         logger.error("SE API call failed — skipping this batch entirely to avoid false expires")
-        return {"checked": len(listing_ids), "se_returned": 0, "expired": 0, "off_market": 0, "buildings_added": 0, "buildings_linked": 0, "skipped": True}
+        return {"checked": len(listing_ids), "se_returned": 0, "expired": 0, "off_market": 0, "buildings_added": 0, "buildings_linked": 0, "address_linked": 0, "skipped": True}
     logger.info(f"StreetEasy returned data for {len(se_data)} out of {len(listing_ids)} listings")
 
     # Separate: status updates + building ID collection
@@ -177,59 +185,56 @@ def check_off_market(batch_size=500):
     # Mark listings not returned by SE as EXPIRED (they've been purged)
     returned_ids = set(se_data.keys())
     not_returned = list(set(listing_ids) - returned_ids)
-    expired_count = 0
     if not_returned:
         logger.info(f"{len(not_returned)} listings not returned by StreetEasy — marking as EXPIRED")
-        # Batch update in chunks of 100
-        for i in range(0, len(not_returned), 100):
-            chunk = not_returned[i:i+100]
-            try:
-                supabase.table("listings").update({
-                    "status": "EXPIRED",
-                }).in_("id", chunk).execute()
-                expired_count += len(chunk)
-            except Exception as e:
-                logger.error(f"Failed to mark expired listings: {e}")
-
-    # 1. Update off-market statuses
-    off_market_count = 0
-    for update in status_updates:
-        try:
-            supabase.table("listings").update({
-                "status": update["status"],
-                "off_market_at": update["off_market_at"],
-            }).eq("id", update["id"]).execute()
-            off_market_count += 1
-        except Exception as e:
-            logger.error(f"Failed to update listing {update['id']}: {e}")
 
-    logger.info(f"Updated {off_market_count} listings to off-market")
-
-    # 2. Fetch and upsert new buildings
+    # Fetch and upsert new buildings first so links only point at buildings that exist
     buildings_added, known_building_ids = fetch_and_upsert_buildings(building_ids_to_fetch)
 
-    # 3. Backfill building_id on listings (only for buildings we know exist)
-    buildings_linked = 0
+    # One row per listing: status change and/or building link, written in bulk
+    rows = {lid: {"id": lid, "status": "EXPIRED"} for lid in not_returned}
+    for update in status_updates:
+        rows[update["id"]] = dict(update)
+    linked = []
     for update in building_id_updates:
-        if update["building_id"] not in known_building_ids:
-            continue
-        try:
-            supabase.table("listings").update({
-                "building_id": update["building_id"],
-            }).eq("id", update["id"]).execute()
-            buildings_linked += 1
-        except Exception as e:
-            logger.error(f"Failed to link building on listing {update['id']}: {e}")
+        if str(update["building_id"]) in known_building_ids:
+            rows.setdefault(update["id"], {"id": update["id"]})["building_id"] = update["building_id"]
+            linked.append(update["id"])
+
+    updated_ids, failures = bulk_update_listings(list(rows.values()))
+    for failure in failures:
+        logger.error(f"Failed to update listing {failure['id']}: {failure['error']}")
+
+    expired_count = sum(1 for lid in not_returned if str(lid) in updated_ids)
+    off_market_count = sum(1 for u in status_updates if str(u["id"]) in updated_ids)
+    buildings_linked = sum(1 for lid in linked if str(lid) in updated_ids)
+
+    # Other listings at a newly linked address (older units, already off-market ones) get the same building
+    addresses = {r["id"]: r for r in listing_rows if r.get("street")}
+    address_links = [
+        {"street": addresses[lid]["street"], "zip_code": addresses[lid].get("zip_code"),
+         "building_id": rows[lid]["building_id"]}
+        for lid in linked if lid in addresses and str(lid) in updated_ids
+    ]
+    address_linked = link_listings_to_buildings(address_links)[0] if address_links else 0
+
+    # Keep change detection in step so a relisted listing is reported as back on market
+    try:
+        listing_changes.mark_statuses({u["id"]: u["status"] for u in status_updates if str(u["id"]) in updated_ids})
+        listing_changes.forget(lid for lid in not_returned if str(lid) in updated_ids)
+    except Exception as e:
+        logger.warning(f"Failed to update listing fingerprints: {e}")
 
-    logger.info(f"Linked {buildings_linked} listings to buildings")
+    logger.info(f"Updated {off_market_count} listings to off-market")
+    logger.info(f"Linked {buildings_linked} listings to buildings ({address_linked} more by address)")
 
-    result = {
+    return {
         "checked": len(listing_ids),
         "se_returned": len(se_data),
         "expired": expired_count,
         "off_market": off_market_count,
         "buildings_added": buildings_added,
         "buildings_linked": buildings_linked,
+        "address_linked": address_linked,
+        "failed": failures,
     }
-    logger.info(f"Check complete: {result}")
-    return result
@@ -0,0 +1,161 @@
+"""
+Shared, lazily created clients (Supabase, Upstash Redis, HTTP session).
+
+Nothing here connects or imports the client libraries until first use, so importing the app stays
+cheap on a cold start. Every module gets the same instance and therefore the same connection pool.
+
+The async variants (get_async_supabase, get_async_redis, get_async_http_client) are for code running on
+the event loop; they're bound to the loop that first used them and closed by close_async_clients().
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _get_or_create(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def _supabase_config():
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_KEY")
+    if not url or not key:
+        logger.error("Missing Supabase configuration")
+        raise ValueError("Missing Supabase configuration")
+    return url, key
+
+
+def _create_supabase():
+    from supabase import create_client
+
+    return create_client(*_supabase_config())
+
+
+def _redis_config():
+    url = os.getenv("KV_REST_API_URL")
+    token = os.getenv("KV_REST_API_TOKEN")
+    if not url or not token:
+        logger.error("Missing Redis configuration")
+        raise ValueError("Missing Redis configuration")
+    return {"url": url, "token": token}
+
+
+def _create_redis():
+    from upstash_redis import Redis
+
+    return Redis(**_redis_config())
+
+
+def _create_http_session():
+    import requests
+
+    return requests.Session()
+
+
+def get_supabase():
+    return _get_or_create("supabase", _create_supabase)
+
+
+def get_redis():
+    return _get_or_create("redis", _create_redis)
+
+
+def get_http_session():
+    """Keep-alive session for direct (non-proxied) HTTP calls."""
+    return _get_or_create("http_session", _create_http_session)
+
+
+_async_clients = {}
+_async_lock = None
+
+
+def _create_async_redis():
+    from upstash_redis.asyncio import Redis
+
+    return Redis(**_redis_config())
+
+
+def _create_async_http_client():
+    import httpx
+
+    return httpx.AsyncClient(limits=httpx.Limits(max_connections=100, max_keepalive_connections=100))
+
+
+async def get_async_supabase():
+    global _async_lock
+    client = _async_clients.get("supabase")
+    if client is None:
+        from supabase import acreate_client
+
+        _async_lock = _async_lock or asyncio.Lock()
+        async with _async_lock:
+            client = _async_clients.get("supabase")
+            if client is None:
+                client = _async_clients["supabase"] = await acreate_client(*_supabase_config())
+    return client
+
+
+def get_async_redis():
+    client = _async_clients.get("redis")
+    if client is None:
+        client = _async_clients["redis"] = _create_async_redis()
+    return client
+
+
+def get_async_http_client():
+    """Keep-alive httpx.AsyncClient for direct (non-proxied) HTTP calls from the event loop."""
+    client = _async_clients.get("http_client")
+    if client is None:
+        client = _async_clients["http_client"] = _create_async_http_client()
+    return client
+
+
+async def close_async_clients():
+    """Close the async clients (on shutdown, or before switching event loops)."""
+    global _async_lock
+    from util.proxy_pool import close_async_proxy_clients
+
+    clients = dict(_async_clients)
+    _async_clients.clear()
+    _async_lock = None
+    for name, client in clients.items():
+        try:
+            if name == "http_client":
+                await client.aclose()
+            elif name == "redis":
+                await client.close()
+            elif name == "supabase":
+                await client.postgrest.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close async {name} client: {e}")
+    await close_async_proxy_clients()
+
+
+def prewarm():
+    """Create every client and open connections so the first real request doesn't pay for it."""
+    from util.proxy_pool import get_proxy_pool
+
+    get_proxy_pool()
+    try:
+        get_redis().ping()
+    except Exception as e:
+        logger.warning(f"Redis prewarm failed: {e}")
+    try:
+        get_supabase().table("listings").select("id").limit(1).execute()
+    except Exception as e:
+        logger.warning(f"Supabase prewarm failed: {e}")
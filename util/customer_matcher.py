@@ -0,0 +1,211 @@
+import logging
+import sys
+import threading
+import time
+from bisect import bisect_right
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+# StreetEasy reuses a few neighborhood names across boroughs. Customer searches store the
+# disambiguated name, so listings are rewritten by zip code prefix before matching.
+AREA_ZIP_OVERRIDES = {
+    "Murray Hill": ("11", "Murray Hill (Queens)"),
+    "Bay Terrace": ("11", "Bay Terrace (Queens)"),
+    "Sunnyside": ("10", "Sunnyside (Staten Island)"),
+    "Chelsea": ("103", "Chelsea (Staten Island)"),
+}
+
+REFRESH_INTERVAL_SECONDS = 30
+FULL_RELOAD_INTERVAL_SECONDS = 3600
+
+
+def resolve_area_name(area_name, zip_code=None):
+    """Return the customer-facing area name for a listing, applying the Queens/Staten Island rewrites."""
+    override = AREA_ZIP_OVERRIDES.get(area_name)
+    if override and str(zip_code).startswith(override[0]):
+        logger.debug(f"Rewriting area {area_name} ({zip_code}) to {override[1]}")
+        return override[1]
+    return area_name
+
+
+class _PriceBucket:
+    """Searches sharing (area, bedrooms, fee preference, min bathrooms), sorted by min_price.
+
+    A listing price stabs every interval whose min_price is at or below it, which is a
+    prefix of the sorted list; only that prefix is checked against max_price. match() sorts lazily,
+    so callers hold the index lock.
+    """
+
+    __slots__ = ("entries", "min_prices", "dirty")
+
+    def __init__(self):
+        self.entries = []
+        self.min_prices = []
+        self.dirty = False
+
+    def add(self, entry):
+        self.entries.append(entry)
+        self.dirty = True
+
+    def remove(self, row_key):
+        self.entries = [e for e in self.entries if e[3] != row_key]
+        self.dirty = True
+
+    def match(self, price):
+        if self.dirty:
+            self.entries.sort(key=lambda e: e[0])
+            self.min_prices = [e[0] for e in self.entries]
+            self.dirty = False
+        end = bisect_right(self.min_prices, price)
+        return [e[2] for e in self.entries[:end] if e[1] >= price]
+
+
+class CustomerSearchIndex:
+    """In-memory index of active customer searches, matched against listings without a DB round trip.
+
+    Rows come from ``loader(updated_since)``, which returns one row per (search, device) with
+    ``customer_search_id``, ``user_id``, ``device_token``, ``neighborhoods``, ``bedrooms``,
+    ``min_bathroom``, ``min_price``, ``max_price``, ``broker_fees``, ``is_active`` and ``updated_at``.
+    Matching follows the ``find_matching_customers`` RPC: area in neighborhoods, bedroom count in
+    bedrooms, bathrooms >= min_bathroom, min_price <= price <= max_price, and fee listings only for
+    searches that accept broker fees.
+
+    Safe to share between threads: loading happens outside the lock, applying rows and matching under it.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._rows_by_search = {}
+        # (area_name, bedroom_count, accepts_broker_fees) -> {min_bathroom: _PriceBucket}
+        self._buckets = {}
+        self._watermark = None
+        self._last_refresh = 0.0
+        self._last_full_reload = 0.0
+
+    def __len__(self):
+        with self._lock:
+            return self._size()
+
+    def device_tokens(self, search_id):
+        """Device tokens a search currently matches for."""
+        with self._lock:
+            return {row["device_token"] for row in self._rows_by_search.get(search_id, [])}
+
+    def _size(self):
+        return sum(len(rows) for rows in self._rows_by_search.values())
+
+    def refresh(self, force_full=False):
+        """Pull searches changed since the last refresh; periodically reload everything to drop deleted rows."""
+        now = time.monotonic()
+        with self._lock:
+            full = force_full or self._watermark is None or now - self._last_full_reload > FULL_RELOAD_INTERVAL_SECONDS
+            watermark = self._watermark
+        rows = self._loader(None if full else watermark)
+
+        with self._lock:
+            if full:
+                self._rows_by_search = {}
+                self._buckets = {}
+                self._last_full_reload = now
+            self._apply(rows)
+            self._last_refresh = now
+            size = self._size()
+        logger.info(f"{'Loaded' if full else 'Refreshed'} customer search index: {len(rows)} rows, {size} active")
+
+    def refresh_if_stale(self, max_age=REFRESH_INTERVAL_SECONDS):
+        with self._lock:
+            stale = self._watermark is None or time.monotonic() - self._last_refresh > max_age
+        if stale:
+            self.refresh()
+
+    def apply(self, rows):
+        """Insert, replace or drop searches. Rows for one search always replace all of its previous rows."""
+        with self._lock:
+            self._apply(rows)
+
+    def _apply(self, rows):
+        changed = {}
+        for row in rows:
+            changed.setdefault(row["customer_search_id"], []).append(row)
+            updated_at = row.get("updated_at")
+            if updated_at and (self._watermark is None or updated_at > self._watermark):
+                self._watermark = updated_at
+
+        for search_id, search_rows in changed.items():
+            self._remove(search_id)
+            active = [r for r in search_rows if r.get("is_active", True) and r.get("device_token")]
+            if active:
+                self._rows_by_search[search_id] = active
+                for row in active:
+                    self._add(row)
+
+    def _keys(self, row):
+        accepts_fees = bool(row.get("broker_fees"))
+        for area in row.get("neighborhoods") or []:
+            for bedrooms in row.get("bedrooms") or []:
+                yield (area, bedrooms, accepts_fees), float(row.get("min_bathroom") or 0)
+
+    def _add(self, row):
+        min_price = row.get("min_price")
+        max_price = row.get("max_price")
+        result = {
+            "customer_search_id": row["customer_search_id"],
+            "device_token": row["device_token"],
+            "user_id": row["user_id"],
+        }
+        entry = (
+            min_price if min_price is not None else float("-inf"),
+            max_price if max_price is not None else float("inf"),
+            result,
+            (row["customer_search_id"], row["device_token"]),
+        )
+        for key, min_bathroom in self._keys(row):
+            self._buckets.setdefault(key, {}).setdefault(min_bathroom, _PriceBucket()).add(entry)
+
+    def _remove(self, search_id):
+        for row in self._rows_by_search.pop(search_id, []):
+            row_key = (search_id, row["device_token"])
+            for key, min_bathroom in self._keys(row):
+                bucket = self._buckets.get(key, {}).get(min_bathroom)
+                if bucket:
+                    bucket.remove(row_key)
+
+    def match(self, area_name, bedroom_count, bathroom_count, price, broker_fees, zip_code=None):
+        """Same arguments and rows as ``find_matching_customers``."""
+        with self._lock:
+            return self._match(area_name, bedroom_count, bathroom_count, price, broker_fees, zip_code)
+
+    def _match(self, area_name, bedroom_count, bathroom_count, price, broker_fees, zip_code=None):
+        area_name = resolve_area_name(area_name, zip_code)
+        if price is None:
+            return []
+        # Fee listings only reach searches that accept fees; no-fee listings reach everyone
+        fee_options = (True,) if broker_fees else (True, False)
+        matches = []
+        for accepts_fees in fee_options:
+            for min_bathroom, bucket in self._buckets.get((area_name, bedroom_count, accepts_fees), {}).items():
+                if min_bathroom <= bathroom_count:
+                    matches.extend(bucket.match(price))
+        return matches
+
+    def match_batch(self, listings):
+        """Match many listings in one pass.
+
+        :param listings: dicts with ``id``, ``area_name``, ``bedroom_count``, ``bathroom_count``,
+            ``price``, ``broker_fees`` and ``zip_code``
+        :return: {listing_id: [matching customer rows]}
+        """
+        with self._lock:
+            return {
+                listing["id"]: self._match(
+                    listing["area_name"],
+                    listing["bedroom_count"],
+                    listing["bathroom_count"],
+                    listing["price"],
+                    listing["broker_fees"],
+                    listing.get("zip_code"),
+                )
+                for listing in listings
+            }
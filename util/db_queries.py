@@ -1,11 +1,13 @@
-import os
+import asyncio
 import logging
 from fastapi import HTTPException
-from dotenv import load_dotenv
 from datetime import datetime, timezone
-from supabase import create_client
 
-load_dotenv()
+from util.building_cache import known_buildings
+from util.cache import TwoTierCache, canonical_key
+from util.clients import get_supabase, get_redis, get_async_supabase, get_async_redis
+from util.customer_matcher import CustomerSearchIndex, resolve_area_name
+from util.metrics import upstream_call
 
 # Configure logging
 logging.basicConfig(
@@ -16,27 +18,126 @@ logger = logging.getLogger(__name__)
 logging.getLogger("httpx").setLevel(logging.INFO)
 logging.getLogger("urllib3").setLevel(logging.INFO)
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# The 14-day average barely moves within an hour (one new listing adds 1/14), so ingest writes don't
+# invalidate it and entries simply expire; only a rollup rebuild, which can rewrite history, does.
+avg_listings_cache = TwoTierCache("avg_listings_14d", get_redis=get_redis, local_ttl=300, redis_ttl=3600,
+                                  get_async_redis=get_async_redis)
+AVG_BATCH_CONCURRENCY = 8
 
 
-def get_avg_listings_last_14_days_by_name(neighborhood_names, min_price, max_price, bedrooms, min_bathroom):
+def _normalize_number(value):
+    if value is None:
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def canonical_avg_listings_criteria(neighborhood_names, min_price, max_price, bedrooms, min_bathroom):
+    """Normalize search criteria so equivalent requests share a cache entry."""
+    if neighborhood_names is not None and not isinstance(neighborhood_names, (list, tuple)):
+        # A bare string would otherwise be read as a list of one-letter neighborhoods
+        raise ValueError("neighborhood_names must be a list of neighborhood names")
+    if not isinstance(bedrooms, (list, tuple)):
+        bedrooms = [bedrooms] if bedrooms is not None else None
+    return {
+        "neighborhood_names": sorted(set(neighborhood_names or [])),
+        "min_price": _normalize_number(min_price),
+        "max_price": _normalize_number(max_price),
+        "bedrooms": sorted({_normalize_number(b) for b in bedrooms}) if bedrooms is not None else None,
+        "min_bathroom": _normalize_number(min_bathroom),
+    }
+
+
+async def get_avg_listings_last_14_days_by_name_async(neighborhood_names, min_price, max_price, bedrooms,
+                                                     min_bathroom):
     """
     Given user inputs of search criteria, return the average number of listings in the last 14 days.
+    Answered from the listing_daily_rollup table (sql/listing_daily_rollup.sql), so the cost doesn't grow
+    with the listings table; falls back to scanning listings if the rollup RPC fails.
+    Results are cached (in-process LRU + Redis) under the canonicalized criteria.
     :return: a float representing the average number of listings (i.e. 22.8667)
     """
-    response = supabase.rpc("avg_listings_last_14_days_by_name", {
-        "p_neighborhoods": neighborhood_names,
-        "p_min_price": min_price,
-        "p_max_price": max_price,
-        "p_bedrooms": bedrooms,
-        "p_min_bathroom": min_bathroom,
-        "p_broker_fees": False
-    }).execute()
+    criteria = canonical_avg_listings_criteria(neighborhood_names, min_price, max_price, bedrooms, min_bathroom)
+    return await avg_listings_cache.get_or_compute_async(
+        canonical_key(criteria),
+        lambda: _fetch_avg_listings_last_14_days_async(criteria, neighborhood_names, min_price, max_price, bedrooms,
+                                                       min_bathroom),
+    )
+
+
+async def get_avg_listings_last_14_days_batch_async(criteria_list, concurrency=AVG_BATCH_CONCURRENCY):
+    """
+    Evaluate many search criteria (dicts with the same keys as the single endpoint's body) in one call.
+    Criteria that canonicalize to the same search are computed once; distinct ones run concurrently (at
+    most `concurrency` at a time), each through the same cache as get_avg_listings_last_14_days_by_name_async.
+    :return: list of averages in the order of criteria_list
+    """
+    distinct = {}
+    keys = []
+    for criteria in criteria_list:
+        key = canonical_key(canonical_avg_listings_criteria(
+            criteria["neighborhood_names"], criteria["min_price"], criteria["max_price"], criteria["bedrooms"],
+            criteria["min_bathroom"],
+        ))
+        distinct.setdefault(key, criteria)
+        keys.append(key)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def evaluate(criteria):
+        async with semaphore:
+            return await get_avg_listings_last_14_days_by_name_async(
+                neighborhood_names=criteria["neighborhood_names"],
+                min_price=criteria["min_price"],
+                max_price=criteria["max_price"],
+                bedrooms=criteria["bedrooms"],
+                min_bathroom=criteria["min_bathroom"],
+            )
+
+    values = await asyncio.gather(*(evaluate(criteria) for criteria in distinct.values()))
+    results = dict(zip(distinct, values))
+    return [results[key] for key in keys]
+
+
+async def _fetch_avg_listings_last_14_days_async(criteria, neighborhood_names, min_price, max_price, bedrooms,
+                                                min_bathroom):
+    client = await get_async_supabase()
+    try:
+        with upstream_call("supabase", "avg_listings_last_14_days_from_rollup"):
+            response = await client.rpc("avg_listings_last_14_days_from_rollup", {
+                "p_neighborhoods": criteria["neighborhood_names"],
+                "p_min_price": criteria["min_price"],
+                "p_max_price": criteria["max_price"],
+                "p_bedrooms": criteria["bedrooms"],
+                "p_min_bathroom": criteria["min_bathroom"],
+                "p_broker_fees": False
+            }).execute()
+        return float(response.data)
+    except Exception as e:
+        logger.warning(f"Rollup average failed, scanning listings instead: {e}")
+
+    with upstream_call("supabase", "avg_listings_last_14_days_by_name"):
+        response = await client.rpc("avg_listings_last_14_days_by_name", {
+            "p_neighborhoods": neighborhood_names,
+            "p_min_price": min_price,
+            "p_max_price": max_price,
+            "p_bedrooms": bedrooms,
+            "p_min_bathroom": min_bathroom,
+            "p_broker_fees": False
+        }).execute()
 
     return response.data
 
+
+def rebuild_listing_daily_rollup(since=None):
+    """Recount listing_daily_rollup from listings for days from `since` (a date, or None for all history)."""
+    with upstream_call("supabase", "rebuild_listing_daily_rollup"):
+        response = get_supabase().rpc("rebuild_listing_daily_rollup", {
+            "p_since": since.isoformat() if since else None
+        }).execute()
+    avg_listings_cache.invalidate()
+    return response.data
+
 def find_matching_customers(area_name, bedroom_count, bathroom_count, price, broker_fees, zip_code=None):
     """
     Given attributes of a listing, return an array of device tokens of customers that match
@@ -49,40 +150,67 @@ def find_matching_customers(area_name, bedroom_count, bathroom_count, price, bro
     :return: an array of dictionaries containing 'customer_search_id', 'device_token', and 'user_id'
     """
 
-    if area_name == "Murray Hill":
-        if str(zip_code).startswith("11"):
-            print("Yoooooo Im in Queens!!")
-            area_name = "Murray Hill (Queens)"
-
-    if area_name == "Bay Terrace":
-        if str(zip_code).startswith("11"):
-            print("Yoooooo Im in Queens!!")
-            area_name = "Bay Terrace (Queens)"
-
-    if area_name == "Sunnyside":
-        if str(zip_code).startswith("10"):
-            print("Enter the Shaolin... Staten Island!")
-            area_name = "Sunnyside (Staten Island)"
-
-    if area_name == "Chelsea":
-        if str(zip_code).startswith("103"):
-            print("Enter the Shaolin... Staten Island!")
-            area_name = "Chelsea (Staten Island)"
-
-    response = supabase.rpc("find_matching_customers", {
-        "p_area_name": area_name,
-        "p_bedroom_count": bedroom_count,
-        "p_bathroom_count": bathroom_count,
-        "p_price": price,
-        "p_no_fee": broker_fees
-    }).execute()
+    area_name = resolve_area_name(area_name, zip_code)
+
+    with upstream_call("supabase", "find_matching_customers"):
+        response = get_supabase().rpc("find_matching_customers", {
+            "p_area_name": area_name,
+            "p_bedroom_count": bedroom_count,
+            "p_bathroom_count": bathroom_count,
+            "p_price": price,
+            "p_no_fee": broker_fees
+        }).execute()
 
     return response.data
 
 
+def get_active_customer_searches(updated_since=None):
+    """
+    Load customer searches for the in-process match index (sql/get_active_customer_searches.sql).
+    :param updated_since: only return searches whose row or devices changed after this timestamp, each with all
+        of its device rows (includes deactivated ones)
+    :return: an array of dictionaries with 'customer_search_id', 'user_id', 'device_token', 'neighborhoods',
+        'bedrooms', 'min_bathroom', 'min_price', 'max_price', 'broker_fees', 'is_active' and 'updated_at'
+    """
+    with upstream_call("supabase", "get_active_customer_searches"):
+        response = get_supabase().rpc("get_active_customer_searches", {"p_updated_since": updated_since}).execute()
+    return response.data or []
+
+
+customer_search_index = CustomerSearchIndex(loader=get_active_customer_searches)
+
+
+def find_matching_customers_batch(listings):
+    """
+    Match a batch of listings against all customer searches in one local pass.
+    Falls back to one find_matching_customers RPC per listing if the index can't be loaded.
+    :param listings: dictionaries with 'id', 'area_name', 'bedroom_count', 'bathroom_count', 'price',
+        'broker_fees' and 'zip_code'
+    :return: a dictionary of {listing_id: [{'customer_search_id', 'device_token', 'user_id'}]}
+    """
+    if not listings:
+        return {}
+    try:
+        customer_search_index.refresh_if_stale()
+        return customer_search_index.match_batch(listings)
+    except Exception as e:
+        logger.warning(f"Customer search index unavailable, falling back to RPC matching: {e}")
+        return {
+            listing["id"]: find_matching_customers(
+                listing["area_name"],
+                listing["bedroom_count"],
+                listing["bathroom_count"],
+                listing["price"],
+                listing["broker_fees"],
+                listing.get("zip_code"))
+            for listing in listings
+        }
+
+
 def upsert_new_listings(new_listings):
     try:
-        response = supabase.table("listings").upsert(new_listings).execute()
+        with upstream_call("supabase", "upsert_listings"):
+            response = get_supabase().table("listings").upsert(new_listings).execute()
         logger.info(f"Supabase upsert successful!")
         return response
     except Exception as e:
@@ -90,10 +218,82 @@ def upsert_new_listings(new_listings):
         raise HTTPException(status_code=500, detail=f"Supabase Error: {e}")
 
 
+def bulk_update_listings(rows, chunk_size=500):
+    """
+    Apply partial updates ({id, status, off_market_at, building_id}) to many listings with one
+    bulk_update_listings RPC per chunk. Missing or null keys leave that column unchanged.
+    If a chunk fails, its rows are retried one at a time so a bad row doesn't sink the batch.
+    :return: (set of updated ids, list of {'id', 'error'} failures)
+    """
+    updated_ids = set()
+    failures = []
+    for i in range(0, len(rows), chunk_size):
+        chunk = rows[i:i + chunk_size]
+        try:
+            with upstream_call("supabase", "bulk_update_listings"):
+                response = get_supabase().rpc("bulk_update_listings", {"p_rows": chunk}).execute()
+            updated_ids.update(str(lid) for lid in response.data or [])
+            continue
+        except Exception as e:
+            logger.warning(f"Bulk listing update failed for {len(chunk)} rows, retrying row by row: {e}")
+
+        for row in chunk:
+            values = {k: v for k, v in row.items() if k != "id" and v is not None}
+            try:
+                with upstream_call("supabase", "update_listing"):
+                    response = get_supabase().table("listings").update(values).eq("id", row["id"]).execute()
+                if response.data:
+                    updated_ids.add(str(row["id"]))
+            except Exception as e:
+                failures.append({"id": row["id"], "error": str(e)})
+
+    failed_ids = {str(f["id"]) for f in failures}
+    failures.extend(
+        {"id": row["id"], "error": "Listing not found"}
+        for row in rows
+        if str(row["id"]) not in updated_ids and str(row["id"]) not in failed_ids
+    )
+    return updated_ids, failures
+
+
+def link_listings_to_buildings(links, chunk_size=1000):
+    """
+    Link every listing without a building_id at each address ({street, zip_code, building_id}) to that
+    building, with one link_listings_to_buildings RPC per chunk. If a chunk fails, its addresses are
+    linked one update at a time instead.
+    :return: (total listings linked, list of {'street', 'zip_code', 'building_id', 'linked'} per address)
+    """
+    results = []
+    for i in range(0, len(links), chunk_size):
+        chunk = [{k: link[k] for k in ("street", "zip_code", "building_id")} for link in links[i:i + chunk_size]]
+        try:
+            with upstream_call("supabase", "link_listings_to_buildings"):
+                response = get_supabase().rpc("link_listings_to_buildings", {"p_rows": chunk}).execute()
+            results.extend(response.data or [])
+            continue
+        except Exception as e:
+            logger.warning(f"Bulk building link failed for {len(chunk)} addresses, retrying one by one: {e}")
+
+        for link in chunk:
+            query = get_supabase().table("listings").update({"building_id": link["building_id"]}).eq("street", link["street"])
+            query = query.eq("zip_code", link["zip_code"]) if link["zip_code"] is not None else query.is_("zip_code", "null")
+            try:
+                with upstream_call("supabase", "link_listings_to_building"):
+                    response = query.is_("building_id", "null").execute()
+                results.append({**link, "linked": len(response.data or [])})
+            except Exception as e:
+                logger.error(f"Failed to link listings at {link['street']}, {link['zip_code']}: {e}")
+                results.append({**link, "linked": 0})
+
+    return sum(r["linked"] for r in results), results
+
+
 def upsert_building(building):
     """Upsert a single building into the buildings table."""
     try:
-        response = supabase.table("buildings").upsert(building).execute()
+        with upstream_call("supabase", "upsert_building"):
+            response = get_supabase().table("buildings").upsert(building).execute()
+        known_buildings.add([building["id"]])
         logger.info(f"Building upsert successful: {building['id']}")
         return response
     except Exception as e:
@@ -106,7 +306,9 @@ def upsert_buildings(buildings):
     if not buildings:
         return None
     try:
-        response = supabase.table("buildings").upsert(buildings).execute()
+        with upstream_call("supabase", "upsert_buildings"):
+            response = get_supabase().table("buildings").upsert(buildings).execute()
+        known_buildings.add(b["id"] for b in buildings)
         logger.info(f"Bulk building upsert successful: {len(buildings)} buildings")
         return response
     except Exception as e:
@@ -122,7 +324,8 @@ def insert_customer_matches(matches_dict: [dict]):
             for match in matches_dict
         ]
 
-        response = supabase.table("customer_matches").insert(payload).execute()
+        with upstream_call("supabase", "insert_customer_matches"):
+            response = get_supabase().table("customer_matches").insert(payload).execute()
         return response
     except Exception as exception:
         return exception
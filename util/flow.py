@@ -0,0 +1,39 @@
+"""
+Drivers for I/O flows: generators that hold the logic of an exchange and yield each request they need
+made, so one implementation serves both blocking callers and the event loop (streeteasy_api's
+persisted-query exchange works the same way).
+
+The driver hands every yielded request to `perform` and sends the result back into the generator; if
+`perform` raises, the exception is thrown into the generator at the yield, where the flow can handle it
+like any other. The generator's return value is the driver's.
+"""
+
+
+def run_flow(flow, perform):
+    """Drive a flow with a blocking perform(request) -> result."""
+    try:
+        request = next(flow)
+        while True:
+            try:
+                result = perform(request)
+            except Exception as e:
+                request = flow.throw(e)
+            else:
+                request = flow.send(result)
+    except StopIteration as done:
+        return done.value
+
+
+async def run_flow_async(flow, perform):
+    """Drive a flow on the event loop; perform(request) returns an awaitable."""
+    try:
+        request = next(flow)
+        while True:
+            try:
+                result = await perform(request)
+            except Exception as e:
+                request = flow.throw(e)
+            else:
+                request = flow.send(result)
+    except StopIteration as done:
+        return done.value
@@ -1,16 +1,24 @@
-import os
+import asyncio
 import logging
+import os
 import sys
+import uuid
+from contextlib import contextmanager
 
-from dotenv import load_dotenv
 from fastapi import HTTPException
-from upstash_redis import Redis
-from supabase import create_client, Client
 
-from util.get_listings import fetch_listings
-from util.push_notification import send_push_notification
-from util.db_queries import upsert_new_listings, insert_customer_matches, find_matching_customers
+from util.get_listings import fetch_listings, fetch_listings_async
+from util.listing_mapper import map_listing_edges, map_web_listing_edges
+from util.push_notification import (
+    build_listing_notification, coalesce_notifications, send_push_notifications, send_push_notifications_async,
+)
+from util.db_queries import upsert_new_listings, insert_customer_matches, find_matching_customers_batch
 from util.check_off_market import fetch_listing_statuses, fetch_and_upsert_buildings
+from util.seen_listings import SeenListingStore
+from util.listing_changes import BACK_ON_MARKET, PRICE_DROP, listing_changes
+from util.clients import get_redis
+from util.flow import run_flow, run_flow_async
+from util.metrics import count_items, run_timer, stage
 
 # Configure logging
 logging.basicConfig(
@@ -20,175 +28,279 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+seen_listings = SeenListingStore(get_redis)
+
+# One run at a time across the poll worker, job threads and /insertListings on every instance
+INSERT_LOCK_KEY = "lock:insert_listings"
+INSERT_LOCK_TTL = int(os.getenv("INSERT_LOCK_TTL", "600"))
+_RELEASE_LOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+
+def _acquire_run_lock():
+    """
+    Take the single-flight lock (SET NX EX, so a crashed run frees it after INSERT_LOCK_TTL seconds).
+    Returns the token to release it with, or None if Redis is unavailable and the run goes ahead unlocked.
+    Raises 409 while another run holds it.
+    """
+    token = uuid.uuid4().hex
+    try:
+        acquired = get_redis().set(INSERT_LOCK_KEY, token, nx=True, ex=INSERT_LOCK_TTL)
+    except Exception as e:
+        logger.warning(f"Could not take the insert_listings lock, running unlocked: {e}")
+        return None
+    if not acquired:
+        raise HTTPException(status_code=409, detail="Another insert_listings run is in progress")
+    return token
+
 
-# Redis configuration
-KV_REST_API_URL = os.getenv("KV_REST_API_URL")
-KV_REST_API_TOKEN = os.getenv("KV_REST_API_TOKEN")
-if not KV_REST_API_URL or not KV_REST_API_TOKEN:
-    logger.error("Missing Redis configuration")
-    raise ValueError("Missing Redis configuration")
+def _release_run_lock(token):
+    if token is None:
+        return
+    try:
+        # Only delete our own lock, not one another run took after ours expired
+        get_redis().eval(_RELEASE_LOCK, keys=[INSERT_LOCK_KEY], args=[token])
+    except Exception as e:
+        logger.warning(f"Failed to release the insert_listings lock (expires in {INSERT_LOCK_TTL}s): {e}")
+
+
+@contextmanager
+def _single_flight():
+    token = _acquire_run_lock()
+    try:
+        yield
+    finally:
+        _release_run_lock(token)
 
-redis = Redis(url=KV_REST_API_URL, token=KV_REST_API_TOKEN)
 
-# Supabase configuration
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-if not SUPABASE_URL or not SUPABASE_KEY:
-    logger.error("Missing Supabase configuration")
-    raise ValueError("Missing Supabase configuration")
+def insert_listings_util(per_page, crawl=False, max_pages=None):
+    """Fetch the newest listings, store the new and changed ones and notify matching customers of new
+    listings, price drops and listings back on market. The response includes a per-stage timing breakdown of this run.
+    Only one run goes at a time (a Redis lock); a second concurrent call gets a 409."""
+    with run_timer("insert_listings") as run, _single_flight():
+        result = _insert_listings(per_page, crawl, max_pages)
+    result["timings"] = run.breakdown()
+    return result
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+async def insert_listings_util_async(per_page, crawl=False, max_pages=None):
+    """insert_listings_util() for the event loop: listings are fetched and pushes sent over the async
+    transports; the Redis and Supabase stages in between run in a worker thread."""
+    loop = asyncio.get_running_loop()
 
-def insert_listings_util(per_page):
-    # Try to fetch listings using v6 API first
+    def send_push(messages):
+        return asyncio.run_coroutine_threadsafe(send_push_notifications_async(messages), loop).result()
+
+    token = await asyncio.to_thread(_acquire_run_lock)
+    try:
+        with run_timer("insert_listings") as run:
+            with stage("fetch"):
+                fetched = await _fetch_latest_async(per_page, crawl, max_pages)
+            result = await asyncio.to_thread(_insert_listings, per_page, crawl, max_pages, fetched, send_push)
+    finally:
+        await asyncio.to_thread(_release_run_lock, token)
+    result["timings"] = run.breakdown()
+    return result
+
+
+def _fetch_methods(per_page, crawl, max_pages):
+    # Try to fetch listings using v6 API first (paging through every configured area in crawl mode)
     methods = [
         {"name": "v6", "params": {"method": "v6", "per_page": per_page}},
         {"name": "web", "params": {"method": "web"}}
     ]
-    for method in methods:
+    if crawl:
+        crawl_params = {"method": "crawl", "per_page": per_page, "filter_unseen": seen_listings.filter_unseen}
+        if max_pages:
+            crawl_params["max_pages"] = max_pages
+        methods.insert(0, {"name": "crawl", "params": crawl_params})
+    return methods
+
+
+def _fetch_latest_flow(per_page, crawl, max_pages):
+    """The fetch-method fallback as a flow (util/flow.py): yields fetch_listings() keyword arguments and is
+    sent the fetched data. Returns (source, edges) from the first fetch method that works."""
+    for method in _fetch_methods(per_page, crawl, max_pages):
         try:
-            fetched_data = fetch_listings(**method["params"])
-            edges = fetched_data.get("edges", [])
+            fetched_data = yield method["params"]
             logger.info(f"Successfully fetched listings using {method['name']} method")
-            break
+            return method["name"], fetched_data.get("edges", [])
         except Exception as e:
             logger.warning(f"{method['name']} method failed: {e}")
-            if method["name"] == "web":  # If this was the last method to try
-                logger.error("All fetch methods failed")
-                raise HTTPException(status_code=500, detail="Error fetching listings from all methods")
-
-    latest_ids = [edge["node"]["id"] for edge in edges]
+    logger.error("All fetch methods failed")
+    raise HTTPException(status_code=500, detail="Error fetching listings from all methods")
 
-    try:
-        # Get last IDs from Redis
-        last_ids_raw = redis.get("last_ids")
-        last_ids = last_ids_raw.split(",") if last_ids_raw else []
-        # Find new IDs (not present in last_ids from Redis)
-        new_ids = [id for id in latest_ids if id not in last_ids]
-        logger.info(f"Got {len(new_ids)} new listings: {new_ids}")
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Error doing Redis comparison")
+def _fetch_latest(per_page, crawl, max_pages):
+    return run_flow(_fetch_latest_flow(per_page, crawl, max_pages), lambda params: fetch_listings(**params))
 
-    # Prepare new listings for upsert
-    new_listings = []
-    new_matches = []
 
-    for edge in edges:
-        node = edge["node"]
-        if node.get("id") in new_ids:
-            listing = {
-                "id": node.get("id"),
-                "area_name": node.get("areaName"),
-                "available_at": node.get("availableAt"),
-                "bedroom_count": node.get("bedroomCount"),
-                "building_type": node.get("buildingType"),
-                "full_bathroom_count": node.get("fullBathroomCount"),
-                "furnished": node.get("furnished"),
-                "latitude": node.get("geoPoint", {}).get("latitude"),
-                "longitude": node.get("geoPoint", {}).get("longitude"),
-                "half_bathroom_count": node.get("halfBathroomCount"),
-                "has_tour_3d": node.get("hasTour3d"),
-                "has_videos": node.get("hasVideos"),
-                "is_new_development": node.get("isNewDevelopment"),
-                "lease_term": node.get("leaseTerm"),
-                "living_area_size": node.get("livingAreaSize"),
-                "media_asset_count": node.get("mediaAssetCount"),
-                "months_free": node.get("monthsFree"),
-                "no_fee": node.get("noFee"),
-                "net_effective_price": node.get("netEffectivePrice"),
-                "off_market_at": node.get("offMarketAt"),
-                "price": node.get("price"),
-                "price_changed_at": node.get("priceChangedAt"),
-                "price_delta": node.get("priceDelta"),
-                "source_group_label": node.get("sourceGroupLabel"),
-                "source_type": node.get("sourceType"),
-                "state": node.get("state"),
-                "status": node.get("status"),
-                "street": node.get("street"),
-                "unit": node.get("unit"),
-                "zip_code": node.get("zipCode"),
-                "url_path": node.get("urlPath"),
-                "lead_media_photo": (node.get("leadMedia") or {}).get("photo", {}).get("key"),
-                "photos": ",".join(photo.get("key", "") for photo in (node.get("photos") or [])),
-                "upcoming_open_house_start": (node.get("upcomingOpenHouse") or {}).get("startTime"),
-                "upcoming_open_house_end": (node.get("upcomingOpenHouse") or {}).get("endTime"),
-                "upcoming_open_house_appointment_only": (node.get("upcomingOpenHouse") or {}).get("appointmentOnly"),
-            }
-
-            new_listings.append(listing)
+async def _fetch_latest_async(per_page, crawl, max_pages):
+    return await run_flow_async(_fetch_latest_flow(per_page, crawl, max_pages),
+                                lambda params: fetch_listings_async(**params))
 
-            total_bathrooms = listing.get("full_bathroom_count", 0) + (listing.get("half_bathroom_count", 0)*0.5)
-            total_bathrooms = int(total_bathrooms) if total_bathrooms.is_integer() else total_bathrooms
 
-            bedroom_display = "Studio" if listing.get("bedroom_count", 0) == 0 else f"{listing['bedroom_count']} Bed"
+def _insert_listings(per_page, crawl, max_pages, fetched=None, send_push=send_push_notifications):
+    """The whole run; `fetched` is a (source, edges) pair when the caller has already fetched."""
+    if fetched is None:
+        with stage("fetch"):
+            fetched = _fetch_latest(per_page, crawl, max_pages)
+    source, edges = fetched
 
-            matched_customers = find_matching_customers(
-                listing["area_name"],
-                listing["bedroom_count"],
-                total_bathrooms,
-                listing["price"],
-                not listing.get("no_fee", False),
-                listing.get("zip_code"))
-
-            logger.info(f"Found {len(matched_customers)} matching customers on listing {listing['id']}")
-
-            if matched_customers:
+    latest_ids = [edge["node"]["id"] for edge in edges]
 
-                # Send push notifications
-                matched_customers_device_tokens = [customer["device_token"] for customer in matched_customers]
-                send_push_notification(
-                    to=matched_customers_device_tokens,
-                    title=f"New Listing in {listing['area_name']}",
-                    body=f"${listing['price']:,} | {bedroom_display} | {total_bathrooms} Bath",
-                    data_url=f"https://streeteasy.com{listing['url_path']}",
-                    listing_id=listing['id']
-                )
+    with stage("seen_diff"):
+        try:
+            # Find new IDs (not seen within the history window) in one Redis round trip
+            new_ids = set(seen_listings.filter_unseen(latest_ids))
+            logger.info(f"Got {len(new_ids)} new listings: {[id for id in latest_ids if str(id) in new_ids]}")
 
-                new_matches.extend(
-                    {"user_id": customer["user_id"], "listing_id": listing["id"]}
-                    for customer in matched_customers
-                )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail="Error doing Redis comparison")
 
-    # Bulk fetch building IDs for all new listings (1 API call instead of N)
-    if new_listings:
+    with stage("change_diff"):
         try:
-            new_listing_ids = [l["id"] for l in new_listings]
-            se_data = fetch_listing_statuses(new_listing_ids)
-            if se_data:
-                # Collect building IDs we need to fetch
-                building_ids_needed = set()
-                listing_to_building = {}
-                for lid, info in se_data.items():
-                    if info.get("building_id"):
-                        building_ids_needed.add(info["building_id"])
-                        listing_to_building[lid] = info["building_id"]
-
-                # Bulk fetch and upsert buildings (1 API call)
-                if building_ids_needed:
-                    _, known_building_ids = fetch_and_upsert_buildings(building_ids_needed)
-
-                    # Set building_id on listings (only if building exists in DB)
-                    for listing in new_listings:
-                        bid = listing_to_building.get(listing["id"])
-                        if bid and bid in known_building_ids:
-                            listing["building_id"] = bid
-
-                    logger.info(f"Bulk linked {sum(1 for l in new_listings if l.get('building_id'))} listings to buildings")
+            # Price, status, fee and open-house changes on listings we already have, in one Redis round trip
+            changes = listing_changes.detect([edge["node"] for edge in edges], skip_ids=new_ids)
         except Exception as e:
-            logger.warning(f"Bulk building fetch failed, continuing without building data: {e}")
-
-        upsert_new_listings(new_listings)
-        redis.set("last_ids", ",".join(latest_ids))
+            logger.warning(f"Change detection failed, continuing with new listings only: {e}")
+            changes = {}
+        changed_ids = {lid for lid, change in changes.items() if change["kind"]}
+        events = {lid: change["kind"] for lid, change in changes.items() if change["kind"] in (PRICE_DROP, BACK_ON_MARKET)}
+        if changed_ids:
+            logger.info(f"Got {len(changed_ids)} changed listings: {events}")
+
+    # Map new and changed listings to rows for upsert in one pass
+    new_matches = []
+    event_matches = []
+
+    with stage("map"):
+        mapper = map_web_listing_edges if source == "web" else map_listing_edges
+        new_listings = mapper(edges, new_ids)
+        changed_listings = mapper(edges, changed_ids) if changed_ids else []
+
+    # Match every new listing and every price drop / relist against customer searches in one pass
+    notify_listings = new_listings + [listing for listing in changed_listings if str(listing["id"]) in events]
+    with stage("match"):
+        listing_criteria = []
+        for listing in notify_listings:
+            total_bathrooms = listing.get("full_bathroom_count", 0) + (listing.get("half_bathroom_count", 0)*0.5)
+            total_bathrooms = int(total_bathrooms) if total_bathrooms.is_integer() else total_bathrooms
+            listing_criteria.append({
+                "id": listing["id"],
+                "area_name": listing["area_name"],
+                "bedroom_count": listing["bedroom_count"],
+                "bathroom_count": total_bathrooms,
+                "price": listing["price"],
+                "broker_fees": not listing.get("no_fee", False),
+                "zip_code": listing.get("zip_code"),
+            })
+        matches_by_listing = find_matching_customers_batch(listing_criteria)
+
+    # Every (customer, listing) match for this run first; pushes are coalesced per device below
+    notifications = []
+
+    for listing, criteria in zip(notify_listings, listing_criteria):
+        total_bathrooms = criteria["bathroom_count"]
+        bedroom_display = "Studio" if listing.get("bedroom_count", 0) == 0 else f"{listing['bedroom_count']} Bed"
+
+        matched_customers = matches_by_listing.get(listing["id"]) or []
+
+        logger.info(f"Found {len(matched_customers)} matching customers on listing {listing['id']}")
+
+        if matched_customers:
+
+            matched_customers_device_tokens = [customer["device_token"] for customer in matched_customers]
+            event = events.get(str(listing["id"]))
+            notifications.append(build_listing_notification(
+                to=matched_customers_device_tokens,
+                listing_id=listing['id'],
+                area_name=listing['area_name'],
+                body=f"${listing['price']:,} | {bedroom_display} | {total_bathrooms} Bath",
+                data_url=f"https://streeteasy.com{listing['url_path']}",
+                kind=event or "new",
+            ))
+
+            (event_matches if event else new_matches).extend(
+                {"user_id": customer["user_id"], "listing_id": listing["id"]}
+                for customer in matched_customers
+            )
+
+    if notifications:
+        with stage("push"):
+            # One notification per device: a summary where a user matched several listings
+            push_messages = coalesce_notifications(notifications)
+            send_push(push_messages)
+        count_items("push_messages", len(push_messages))
 
-    if new_matches:
-        insert_customer_matches(new_matches)
+    # Bulk fetch building IDs for all new listings (1 API call instead of N)
+    if new_listings:
+        with stage("buildings"):
+            try:
+                new_listing_ids = [l["id"] for l in new_listings]
+                se_data = fetch_listing_statuses(new_listing_ids)
+                if se_data:
+                    # Collect building IDs we need to fetch
+                    building_ids_needed = set()
+                    listing_to_building = {}
+                    for lid, info in se_data.items():
+                        if info.get("building_id"):
+                            building_ids_needed.add(info["building_id"])
+                            listing_to_building[lid] = info["building_id"]
+
+                    # Bulk fetch and upsert buildings (1 API call)
+                    if building_ids_needed:
+                        _, known_building_ids = fetch_and_upsert_buildings(building_ids_needed)
+
+                        # Set building_id on listings (only if building exists in DB)
+                        for listing in new_listings:
+                            bid = listing_to_building.get(listing["id"])
+                            if bid and str(bid) in known_building_ids:
+                                listing["building_id"] = bid
+
+                        logger.info(f"Bulk linked {sum(1 for l in new_listings if l.get('building_id'))} listings to buildings")
+            except Exception as e:
+                logger.warning(f"Bulk building fetch failed, continuing without building data: {e}")
+
+        with stage("upsert"):
+            upsert_new_listings(new_listings)
+
+    # Every fetched ID, not just new ones: refreshing their scores keeps listings still on the page from
+    # ageing out of the window during quiet periods and coming back as new
+    with stage("mark_seen"):
+        seen_listings.mark_seen(latest_ids)
+
+    if changed_listings:
+        # Separate upsert: these rows carry no building_id, so the existing link is left alone
+        with stage("upsert"):
+            upsert_new_listings(changed_listings)
+
+    if changes:
+        with stage("record_changes"):
+            try:
+                listing_changes.record(changes)
+            except Exception as e:
+                logger.warning(f"Failed to record listing fingerprints: {e}")
+
+    if new_matches or event_matches:
+        with stage("record_matches"):
+            # Event matches go in their own insert so a customer matched before can't sink the new ones
+            for matches in (new_matches, event_matches):
+                if matches:
+                    insert_customer_matches(matches)
+
+    count_items("fetched", len(latest_ids))
+    count_items("new", len(new_listings))
+    count_items("changed", len(changed_listings))
+    count_items("price_drops", sum(1 for kind in events.values() if kind == PRICE_DROP))
+    count_items("back_on_market", sum(1 for kind in events.values() if kind == BACK_ON_MARKET))
+    count_items("matches", len(new_matches) + len(event_matches))
 
     logger.debug("New listings: %s", new_listings)
-    return {"newListings": new_listings}
+    return {
+        "newListings": new_listings,
+        "listingChanges": [{"id": listing["id"], "change": changes[str(listing["id"])]["kind"]}
+                           for listing in changed_listings],
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+
+from util.clients import get_redis
+from util.insert_listings import insert_listings_util
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+# "memory" runs jobs on a thread in this process; "redis" leaves them for scripts.poll_worker. Serverless
+# functions (Vercel, Lambda) freeze or exit once the response is sent, so a job queued in memory there
+# may never run: they default to "redis" and need the poll worker running somewhere.
+SERVERLESS = bool(os.getenv("VERCEL") or os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+JOB_QUEUE = os.getenv("JOB_QUEUE", "redis" if SERVERLESS else "memory")
+JOB_QUEUE_KEY = "jobs:insert_listings"
+JOB_TTL_SECONDS = 86400
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _job_key(job_id):
+    return f"job:{job_id}"
+
+
+class InMemoryJobQueue:
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def put(self, job_id):
+        self._queue.put(job_id)
+
+    def get(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class RedisJobQueue:
+    """FIFO list in Redis, shared between API instances and the worker process."""
+
+    def __init__(self, key=JOB_QUEUE_KEY):
+        self.key = key
+
+    def put(self, job_id):
+        get_redis().lpush(self.key, job_id)
+
+    def get(self, timeout=None):
+        return get_redis().rpop(self.key)
+
+
+job_queue = RedisJobQueue() if JOB_QUEUE == "redis" else InMemoryJobQueue()
+if SERVERLESS and JOB_QUEUE != "redis":
+    logger.warning("JOB_QUEUE=memory on a serverless deployment: /insertListings?mode=job is disabled")
+_jobs = {}  # unfinished jobs of the in-process queue; finished ones live in Redis for JOB_TTL_SECONDS
+_worker_thread = None
+_worker_lock = threading.Lock()
+
+
+def save_job(job):
+    """Keep job state in Redis so any instance can answer status requests. Jobs on the in-process queue are
+    also held locally until they finish."""
+    if isinstance(job_queue, InMemoryJobQueue) and job["status"] in ("queued", "running"):
+        _jobs[job["id"]] = job
+    else:
+        _jobs.pop(job["id"], None)
+    try:
+        get_redis().set(_job_key(job["id"]), json.dumps(job, default=str), ex=JOB_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Failed to persist job {job['id']}: {e}")
+
+
+def get_job(job_id):
+    job = _jobs.get(job_id)
+    if job:
+        return job
+    raw = get_redis().get(_job_key(job_id))
+    return json.loads(raw) if raw else None
+
+
+def run_job(job_id):
+    job = get_job(job_id)
+    if not job:
+        logger.warning(f"Job {job_id} not found, skipping")
+        return None
+
+    job.update(status="running", started_at=_now())
+    save_job(job)
+    try:
+        result = insert_listings_util(**job["params"])
+        job.update(status="succeeded", result=result)
+    except HTTPException as e:
+        job.update(status="failed", error=e.detail)
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}")
+        job.update(status="failed", error=str(e))
+    job["finished_at"] = _now()
+    save_job(job)
+    return job
+
+
+def _work_forever():
+    while True:
+        job_id = job_queue.get(timeout=60)
+        if job_id:
+            run_job(job_id)
+
+
+def _ensure_worker_thread():
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is None or not _worker_thread.is_alive():
+            _worker_thread = threading.Thread(target=_work_forever, name="insert-listings-jobs", daemon=True)
+            _worker_thread.start()
+
+
+def enqueue_insert_listings(**params):
+    """Queue an insert_listings_util run and return its job record (status "queued")."""
+    if SERVERLESS and isinstance(job_queue, InMemoryJobQueue):
+        raise HTTPException(status_code=400,
+                            detail="mode=job needs JOB_QUEUE=redis and scripts.poll_worker on serverless deployments")
+    job = {"id": uuid.uuid4().hex, "type": "insert_listings", "status": "queued", "params": params, "created_at": _now()}
+    save_job(job)
+    queued = dict(job)
+    job_queue.put(job["id"])
+    if isinstance(job_queue, InMemoryJobQueue):
+        _ensure_worker_thread()
+    return queued
@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import os
+import sys
+import time
+
+from util.clients import get_redis
+from util.metrics import upstream_call
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+LISTING_FINGERPRINTS_KEY = "listing_fingerprints"
+# How long an off-market listing's fingerprint is kept so a relisting can still be reported
+OFF_MARKET_RETENTION_DAYS = float(os.getenv("OFF_MARKET_RETENTION_DAYS", "30"))
+
+PRICE_DROP = "price_drop"
+BACK_ON_MARKET = "back_on_market"
+UPDATED = "updated"  # fingerprint changed but nothing to notify about (price up, open house, concessions)
+
+
+def fingerprint(node):
+    """
+    Compact fingerprint of the fields we react to: "price|status|digest", where digest covers noFee,
+    monthsFree and the upcoming open house. Price and status stay readable so a change can be classified.
+    """
+    open_house = node.get("upcomingOpenHouse") or {}
+    rest = (f"{node.get('noFee')}|{node.get('monthsFree')}|{open_house.get('startTime')}|"
+            f"{open_house.get('endTime')}|{open_house.get('appointmentOnly')}")
+    digest = hashlib.blake2b(rest.encode(), digest_size=4).hexdigest()
+    return f"{node.get('price')}|{node.get('status')}|{digest}"
+
+
+def _classify(old, new):
+    old_price, old_status, _ = old.split("|", 2)
+    new_price, new_status, _ = new.split("|", 2)
+    if old_status != "ACTIVE" and new_status == "ACTIVE":
+        return BACK_ON_MARKET
+    try:
+        if float(new_price) < float(old_price):
+            return PRICE_DROP
+    except ValueError:
+        pass
+    return UPDATED
+
+
+class ListingChangeDetector:
+    """Per-listing fingerprints in one Redis hash (listing id -> fingerprint).
+
+    detect() compares a polled page against the stored fingerprints with a single HMGET and returns
+    only the listings whose fingerprint differs; record() writes those back once they've been handled.
+    Unchanged listings are never written. The off-market sweep keeps the stored status current
+    (mark_statuses) so a listing that reappears as ACTIVE is reported as back on market, and drops
+    listings StreetEasy has purged (forget).
+
+    Off-market listings are also tracked in a sorted set ("<key>:off_market", scored by when they went
+    off market); mark_statuses() forgets those off market for longer than the retention window, so the
+    hash stays bounded by active listings plus recent removals. A listing relisted after that is seen
+    as having no fingerprint yet and only gets a baseline.
+    """
+
+    def __init__(self, get_redis, key=LISTING_FINGERPRINTS_KEY, off_market_retention_days=OFF_MARKET_RETENTION_DAYS):
+        self._get_redis = get_redis
+        self.key = key
+        self.off_market_key = f"{key}:off_market"
+        self.off_market_retention_seconds = int(off_market_retention_days * 86400)
+
+    @property
+    def redis(self):
+        return self._get_redis()
+
+    def detect(self, nodes, skip_ids=()):
+        """
+        Return {listing_id: {"kind", "fingerprint"}} for nodes whose fingerprint changed. kind is
+        PRICE_DROP, BACK_ON_MARKET or UPDATED; listings with no stored fingerprint yet (or in skip_ids,
+        e.g. brand-new ones) come back as kind None so record() can store a baseline for them.
+        """
+        current = {}
+        for node in nodes:
+            current[str(node["id"])] = fingerprint(node)
+        if not current:
+            return {}
+        ids = list(current)
+        with upstream_call("redis", "fingerprint_diff"):
+            stored = self.redis.hmget(self.key, *ids)
+
+        skip_ids = {str(lid) for lid in skip_ids}
+        changes = {}
+        for lid, old in zip(ids, stored):
+            new = current[lid]
+            if old == new:
+                continue
+            kind = None if old is None or lid in skip_ids else _classify(old, new)
+            changes[lid] = {"kind": kind, "fingerprint": new}
+        return changes
+
+    def record(self, changes):
+        """Store the fingerprints returned by detect()."""
+        if not changes:
+            return
+        active = [lid for lid, change in changes.items() if change["fingerprint"].split("|", 2)[1] == "ACTIVE"]
+        pipeline = self.redis.pipeline()
+        pipeline.hset(self.key, values={lid: change["fingerprint"] for lid, change in changes.items()})
+        if active:
+            # Back on market: no longer up for expiry
+            pipeline.zrem(self.off_market_key, *active)
+        with upstream_call("redis", "fingerprint_record"):
+            pipeline.exec()
+
+    def mark_statuses(self, statuses):
+        """
+        Update the stored status of tracked listings ({listing_id: status}), keeping price and digest, then
+        forget listings that have been off market for longer than the retention window.
+        """
+        ids = [str(lid) for lid in statuses]
+        stored = []
+        if ids:
+            with upstream_call("redis", "fingerprint_status"):
+                stored = self.redis.hmget(self.key, *ids)
+        updates = {}
+        for lid, status, old in zip(ids, statuses.values(), stored):
+            if old is not None:
+                price, _, digest = old.split("|", 2)
+                updates[lid] = f"{price}|{status}|{digest}"
+        now = time.time()
+        if updates:
+            off_market = {lid: now for lid, status in zip(ids, statuses.values())
+                          if lid in updates and status != "ACTIVE"}
+            active = [lid for lid, status in zip(ids, statuses.values()) if lid in updates and status == "ACTIVE"]
+            pipeline = self.redis.pipeline()
+            pipeline.hset(self.key, values=updates)
+            if off_market:
+                # nx: the retention window runs from when the listing first went off market
+                pipeline.zadd(self.off_market_key, off_market, nx=True)
+            if active:
+                pipeline.zrem(self.off_market_key, *active)
+            with upstream_call("redis", "fingerprint_status"):
+                pipeline.exec()
+        self._forget_off_market_before(now - self.off_market_retention_seconds)
+
+    def _forget_off_market_before(self, cutoff):
+        with upstream_call("redis", "fingerprint_prune"):
+            expired = self.redis.zrangebyscore(self.off_market_key, "-inf", cutoff)
+        if expired:
+            self.forget(expired)
+            logger.info(f"Forgot {len(expired)} listings off market for over "
+                        f"{self.off_market_retention_seconds // 86400} days")
+
+    def forget(self, listing_ids):
+        ids = [str(lid) for lid in listing_ids]
+        if ids:
+            pipeline = self.redis.pipeline()
+            pipeline.hdel(self.key, *ids)
+            pipeline.zrem(self.off_market_key, *ids)
+            with upstream_call("redis", "fingerprint_forget"):
+                pipeline.exec()
+
+
+listing_changes = ListingChangeDetector(get_redis)
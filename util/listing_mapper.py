@@ -0,0 +1,161 @@
+"""
+StreetEasy listing node -> listings table row, compiled from one declarative field spec.
+
+Each spec entry is (column, source). A source is a dotted path into the node, with two list forms:
+    "geoPoint.latitude"     nested lookup; a missing or null parent gives None
+    "photos[0].key"         first element of a list
+    "photos[].key"          every element's key, joined with ","
+    "photos[]"              list length (0 when missing)
+
+compile_mapper() turns a spec into Python source once, so mapping a batch is a single loop with each
+nested object looked up once per node and no intermediate dicts. The web (SRP) payload has the same
+node shape as v6 except for lead media and media count, which it derives from photos; WEB_OVERRIDES
+covers those, so web nodes are mapped straight from the page data.
+"""
+
+import json
+import os
+
+LISTING_FIELDS = (
+    ("id", "id"),
+    ("area_name", "areaName"),
+    ("available_at", "availableAt"),
+    ("bedroom_count", "bedroomCount"),
+    ("building_type", "buildingType"),
+    ("full_bathroom_count", "fullBathroomCount"),
+    ("furnished", "furnished"),
+    ("latitude", "geoPoint.latitude"),
+    ("longitude", "geoPoint.longitude"),
+    ("half_bathroom_count", "halfBathroomCount"),
+    ("has_tour_3d", "hasTour3d"),
+    ("has_videos", "hasVideos"),
+    ("is_new_development", "isNewDevelopment"),
+    ("lease_term", "leaseTerm"),
+    ("living_area_size", "livingAreaSize"),
+    ("media_asset_count", "mediaAssetCount"),
+    ("months_free", "monthsFree"),
+    ("no_fee", "noFee"),
+    ("net_effective_price", "netEffectivePrice"),
+    ("off_market_at", "offMarketAt"),
+    ("price", "price"),
+    ("price_changed_at", "priceChangedAt"),
+    ("price_delta", "priceDelta"),
+    ("source_group_label", "sourceGroupLabel"),
+    ("source_type", "sourceType"),
+    ("state", "state"),
+    ("status", "status"),
+    ("street", "street"),
+    ("unit", "unit"),
+    ("zip_code", "zipCode"),
+    ("url_path", "urlPath"),
+    ("lead_media_photo", "leadMedia.photo.key"),
+    ("photos", "photos[].key"),
+    ("upcoming_open_house_start", "upcomingOpenHouse.startTime"),
+    ("upcoming_open_house_end", "upcomingOpenHouse.endTime"),
+    ("upcoming_open_house_appointment_only", "upcomingOpenHouse.appointmentOnly"),
+)
+
+WEB_OVERRIDES = {
+    "lead_media_photo": "photos[0].key",
+    "media_asset_count": "photos[]",
+}
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "introspection.json")
+
+
+def _compile_source(source, objects, lists):
+    """Python expression for one source path; registers the parent lookups it needs."""
+    head, _, rest = source.partition(".")
+    if head.endswith("[]") or head.endswith("[0]"):
+        name = head[:head.index("[")]
+        lists[name] = f"_list_{name}"
+        var = lists[name]
+        if head.endswith("[0]"):
+            return f'({var}[0].get("{rest}") if {var} else None)'
+        if not rest:
+            return f"len({var})"
+        return f'",".join([item.get("{rest}", "") for item in {var}])'
+
+    parts = source.split(".")
+    parent = "_get"
+    for depth in range(1, len(parts)):
+        key = ".".join(parts[:depth])
+        if key not in objects:
+            lookup = f'{parent}("{parts[depth - 1]}")' if parent == "_get" else f'{parent}.get("{parts[depth - 1]}")'
+            objects[key] = (f"_obj{len(objects)}", lookup)
+        parent = objects[key][0]
+    if parent == "_get":
+        return f'_get("{parts[-1]}")'
+    return f'{parent}.get("{parts[-1]}")'
+
+
+def compile_mapper(fields=LISTING_FIELDS, overrides=None, name="map_listing_edges"):
+    """
+    Build map(edges, wanted_ids=None) -> rows for a field spec. Only nodes whose str(id) is in
+    wanted_ids are mapped when it's given. The generated source is kept on the function as __source__.
+    """
+    overrides = overrides or {}
+    objects, lists = {}, {}
+    columns = [(column, _compile_source(overrides.get(column, source), objects, lists)) for column, source in fields]
+
+    body = [f"def {name}(edges, wanted_ids=None):", "    rows = []", "    append = rows.append",
+            "    for edge in edges:", '        node = edge["node"]', "        _get = node.get",
+            '        if wanted_ids is not None and str(_get("id")) not in wanted_ids:', "            continue"]
+    body += [f"        {var} = {lookup} or _EMPTY" for var, lookup in objects.values()]
+    body += [f'        {var} = _get("{key}") or ()' for key, var in lists.items()]
+    body.append("        append({")
+    body += [f'            "{column}": {expression},' for column, expression in columns]
+    body += ["        })", "    return rows"]
+    source = "\n".join(body) + "\n"
+
+    namespace = {"_EMPTY": {}}
+    exec(compile(source, f"<listing mapper {name}>", "exec"), namespace)
+    mapper = namespace[name]
+    mapper.__source__ = source
+    return mapper
+
+
+map_listing_edges = compile_mapper(name="map_listing_edges")
+map_web_listing_edges = compile_mapper(overrides=WEB_OVERRIDES, name="map_web_listing_edges")
+
+
+def selection_set(fields=LISTING_FIELDS, overrides=WEB_OVERRIDES):
+    """GraphQL selection covering exactly the node fields the spec reads, e.g. 'id geoPoint { latitude }'."""
+    tree = {}
+    for source in [source for _, source in fields] + list(overrides.values()):
+        branch = tree
+        for part in source.replace("[0]", "").replace("[]", "").split("."):
+            if part:
+                branch = branch.setdefault(part, {})
+
+    def render(branch):
+        return " ".join(f"{name} {{ {render(children)} }}" if children else name for name, children in branch.items())
+
+    return render(tree)
+
+
+def check_fields_against_schema(fields=LISTING_FIELDS, type_name="SearchRentalListing", path=SCHEMA_PATH):
+    """Return the spec sources that don't exist on the GraphQL type in introspection.json."""
+    with open(path, encoding="utf-8") as f:
+        schema = json.load(f)["data"]["__schema"]
+    types = {t["name"]: {field["name"]: field["type"] for field in t["fields"] or []} for t in schema["types"]}
+
+    missing = []
+    for column, source in list(fields) + list(WEB_OVERRIDES.items()):
+        current = type_name
+        for part in source.replace("[0]", "").replace("[]", "").split("."):
+            if not part:
+                continue
+            type_ref = types.get(current, {}).get(part)
+            if type_ref is None:
+                missing.append(f"{column}: {source}")
+                break
+            while type_ref.get("name") is None and type_ref.get("ofType"):
+                type_ref = type_ref["ofType"]
+            current = type_ref.get("name")
+    return missing
+
+
+if __name__ == "__main__":
+    print(map_listing_edges.__source__)
+    print("Fields missing from the schema:", check_fields_against_schema() or "none")
@@ -0,0 +1,215 @@
+"""
+In-process metrics for the ingest pipeline, exposed in the Prometheus text format on /metrics.
+
+stage() times a pipeline step; upstream_call() records one call to StreetEasy, Supabase, Redis or Expo
+(latency, outcome and, when known, bytes). Both also add to the current run's breakdown when one is
+active (see run_timer()), so a single /insertListings response can show where its time went.
+Counters and histograms are per process; they reset on restart.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_current_run = contextvars.ContextVar("metrics_current_run", default=None)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+stage_seconds = Histogram("firstmover_stage_duration_seconds", "Time spent in each pipeline stage",
+                          ["pipeline", "stage"])
+stage_errors = Counter("firstmover_stage_errors_total", "Pipeline stages that raised", ["pipeline", "stage"])
+runs_total = Counter("firstmover_runs_total", "Pipeline runs by outcome", ["pipeline", "outcome"])
+upstream_seconds = Histogram("firstmover_upstream_duration_seconds", "Latency of calls to external services",
+                             ["service", "operation"])
+upstream_requests = Counter("firstmover_upstream_requests_total", "Calls to external services by outcome",
+                            ["service", "operation", "outcome"])
+upstream_bytes = Counter("firstmover_upstream_bytes_total", "Bytes sent to and received from external services",
+                         ["service", "operation", "direction"])
+pipeline_items = Counter("firstmover_pipeline_items_total", "Items processed by pipeline stages",
+                         ["pipeline", "item"])
+
+
+class RunTimings:
+    """Stage durations and upstream call counts for one pipeline run."""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.upstream = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_upstream(self, service, seconds, ok):
+        with self._lock:
+            entry = self.upstream.setdefault(service, {"calls": 0, "errors": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["errors"] += 0 if ok else 1
+            entry["seconds"] += seconds
+
+    def breakdown(self):
+        with self._lock:
+            return {
+                "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+                "stages_ms": {name: round(s * 1000, 1) for name, s in self.stages.items()},
+                "upstream": {
+                    service: {"calls": entry["calls"], "errors": entry["errors"], "ms": round(entry["seconds"] * 1000, 1)}
+                    for service, entry in self.upstream.items()
+                },
+            }
+
+
+@contextmanager
+def run_timer(pipeline):
+    """Collect a per-run breakdown for everything timed inside this block (same thread or copied context)."""
+    run = RunTimings(pipeline)
+    token = _current_run.set(run)
+    try:
+        yield run
+        runs_total.inc(pipeline=pipeline, outcome="ok")
+    except Exception:
+        runs_total.inc(pipeline=pipeline, outcome="error")
+        raise
+    finally:
+        _current_run.reset(token)
+
+
+@contextmanager
+def stage(name, pipeline=None):
+    run = _current_run.get()
+    pipeline = pipeline or (run.pipeline if run else "default")
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        stage_errors.inc(pipeline=pipeline, stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, pipeline=pipeline, stage=name)
+        if run:
+            run.add_stage(name, elapsed)
+
+
+class _UpstreamCall:
+    def __init__(self):
+        self.sent_bytes = 0
+        self.received_bytes = 0
+        self.ok = True
+
+
+@contextmanager
+def upstream_call(service, operation):
+    """Time one external call. Set .sent_bytes / .received_bytes on the yielded object when known, and
+    .ok = False for failures that don't raise (e.g. a GraphQL response with only errors)."""
+    call = _UpstreamCall()
+    start = time.perf_counter()
+    try:
+        yield call
+    except Exception:
+        call.ok = False
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        upstream_seconds.observe(elapsed, service=service, operation=operation)
+        upstream_requests.inc(service=service, operation=operation, outcome="ok" if call.ok else "error")
+        if call.sent_bytes:
+            upstream_bytes.inc(call.sent_bytes, service=service, operation=operation, direction="sent")
+        if call.received_bytes:
+            upstream_bytes.inc(call.received_bytes, service=service, operation=operation, direction="received")
+        run = _current_run.get()
+        if run:
+            run.add_upstream(service, elapsed, call.ok)
+
+
+def count_items(item, amount, pipeline=None):
+    run = _current_run.get()
+    pipeline_items.inc(amount, pipeline=pipeline or (run.pipeline if run else "default"), item=item)
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """executor.submit that carries the current run over to the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,154 @@
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from util.check_off_market import fetch_listing_statuses, apply_listing_statuses
+from util.clients import get_supabase, get_redis
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+SWEEP_CURSOR_KEY = "off_market_sweep_cursor"
+COUNTERS = ("checked", "se_returned", "expired", "off_market", "buildings_added", "buildings_linked",
+            "address_linked")
+
+
+class _RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _fetch_page(cursor, page_size):
+    query = (
+        get_supabase().table("listings")
+        .select("id, building_id, street, zip_code")
+        .eq("status", "ACTIVE")
+        .order("id")
+        .limit(page_size)
+    )
+    if cursor is not None:
+        query = query.gt("id", cursor)
+    return query.execute().data
+
+
+def _check_batch(index, rows, limiter):
+    limiter.wait()
+    started = time.monotonic()
+    se_data = fetch_listing_statuses([r["id"] for r in rows])
+    return index, rows, se_data, time.monotonic() - started
+
+
+def _write_batch(index, rows, se_data, fetch_seconds):
+    started = time.monotonic()
+    result = apply_listing_statuses(rows, se_data)
+    result["batch"] = index
+    result["cursor"] = rows[-1]["id"]
+    result["fetch_seconds"] = round(fetch_seconds, 3)
+    result["write_seconds"] = round(time.monotonic() - started, 3)
+    result["listings_per_second"] = round(len(rows) / max(fetch_seconds + result["write_seconds"], 1e-6), 1)
+    return result
+
+
+def sweep_off_market(page_size=500, concurrency=2, requests_per_second=1.0, cursor=None, resume=False,
+                     max_batches=None, time_budget=None):
+    """
+    Walk every ACTIVE listing in id order (keyset pagination) and check it against StreetEasy.
+
+    Up to `concurrency` rentalsByListingIds calls run at once, spaced by `requests_per_second`, while
+    DB writes for earlier batches run on a separate thread. Only `concurrency` + 1 pages are held in
+    memory. The cursor (last listing id whose batch was written) is saved to Redis after each batch, so
+    `resume=True` continues an interrupted sweep. `time_budget` (seconds) stops starting new batches so
+    the call fits inside a request limit. If a batch's status check fails, the sweep stops before that
+    batch without moving the cursor past it, so the next run checks it again.
+    """
+    if resume and cursor is None:
+        cursor = get_redis().get(SWEEP_CURSOR_KEY)
+    started = time.monotonic()
+    limiter = _RateLimiter(requests_per_second)
+    totals = {k: 0 for k in COUNTERS}
+    batches = []
+    in_flight = []
+    pending_write = None
+    next_cursor = cursor
+    read_cursor = cursor
+    exhausted = False
+    failed_batch = None
+    index = 0
+
+    def finish_write(future):
+        nonlocal next_cursor
+        result = future.result()
+        for key in COUNTERS:
+            totals[key] += result.get(key, 0)
+        next_cursor = result["cursor"]
+        get_redis().set(SWEEP_CURSOR_KEY, next_cursor)
+        batches.append(result)
+        logger.info(
+            f"Sweep batch {result['batch']}: {result['checked']} checked, {result['expired']} expired, "
+            f"{result['off_market']} off-market, {result['listings_per_second']} listings/s"
+        )
+
+    with ThreadPoolExecutor(max_workers=concurrency) as fetchers, ThreadPoolExecutor(max_workers=1) as writer:
+        while True:
+            out_of_budget = (max_batches is not None and index >= max_batches) or \
+                (time_budget is not None and time.monotonic() - started > time_budget)
+            while not exhausted and not out_of_budget and len(in_flight) < concurrency:
+                rows = _fetch_page(read_cursor, page_size)
+                if not rows:
+                    exhausted = True
+                    break
+                read_cursor = rows[-1]["id"]
+                in_flight.append(fetchers.submit(_check_batch, index, rows, limiter))
+                index += 1
+                if max_batches is not None and index >= max_batches:
+                    break
+
+            if not in_flight:
+                break
+
+            # Batches are written in order so the saved cursor never skips an unwritten batch
+            checked = in_flight.pop(0).result()
+            if checked[2] is None:
+                failed_batch = checked[0]
+                logger.error(f"Sweep batch {failed_batch}: StreetEasy status check failed; stopping before it "
+                             f"so the next run retries from cursor {next_cursor}")
+                for future in in_flight:
+                    future.cancel()
+                in_flight = []
+                exhausted = False
+                break
+            if pending_write is not None:
+                finish_write(pending_write)
+            pending_write = writer.submit(_write_batch, *checked)
+
+        if pending_write is not None:
+            finish_write(pending_write)
+
+    if exhausted:
+        get_redis().delete(SWEEP_CURSOR_KEY)
+        logger.info("Sweep reached the end of ACTIVE listings; cursor reset")
+
+    elapsed = time.monotonic() - started
+    return {
+        **totals,
+        "batches": batches,
+        "complete": exhausted,
+        "failed_batch": failed_batch,
+        "next_cursor": None if exhausted else next_cursor,
+        "elapsed_seconds": round(elapsed, 1),
+        "listings_per_second": round(totals["checked"] / max(elapsed, 1e-6), 1),
+    }
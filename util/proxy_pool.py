@@ -0,0 +1,257 @@
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+import requests
+
+from util.random_port import port_ranges
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+PROXY_USERNAME = os.getenv("PROXY_USERNAME")
+PROXY_PASSWORD = os.getenv("PROXY_PASSWORD")
+PROXY_HOST = "state.smartproxy.com"
+
+ACTIVE_PORTS = int(os.getenv("PROXY_ACTIVE_PORTS", "8"))  # ports kept warm with live sessions
+DECAY = 0.8  # weight of history in the success/latency moving averages
+QUARANTINE_SECONDS = 300
+QUARANTINE_SUCCESS_RATE = 0.5
+MIN_SAMPLES_FOR_QUARANTINE = 2
+# Statuses the proxy itself answers with (auth, upstream connect failure, overloaded). Anything else came
+# from the target site and says nothing about the port.
+PROXY_ERROR_STATUSES = {407, 502, 503}
+
+
+class _PortState:
+    __slots__ = ("port", "session", "async_client", "success_rate", "latency", "requests", "failures",
+                 "in_flight", "retired")
+
+    def __init__(self, port):
+        self.port = port
+        self.session = None
+        self.async_client = None  # httpx.AsyncClient through the same proxy, created by request_async()
+        self.success_rate = 1.0
+        self.latency = None
+        self.requests = 0
+        self.failures = 0
+        self.in_flight = 0  # requests between acquire() and release(), sync or async
+        self.retired = False  # quarantined; its clients are closed once in_flight drops to 0
+
+    def score(self):
+        # Healthy, fast ports score highest; unmeasured ports get a neutral latency
+        return self.success_rate / max(self.latency if self.latency is not None else 1.0, 0.01)
+
+
+class ProxyPool:
+    """Smartproxy ports with one keep-alive requests.Session each and decayed health stats.
+
+    A small set of active ports is used for requests, picked weighted by success rate / latency so
+    TLS connections to the proxy are reused. Ports whose success rate drops below the threshold are
+    quarantined and replaced by a fresh random port; its session and client are closed once the requests
+    still running on it finish. Only transport errors and proxy error statuses count against a port and
+    are retried on another one; other HTTP errors go straight back to the caller. request_async() uses the
+    same ports and health stats with an httpx.AsyncClient per port, for callers on the event loop.
+    """
+
+    def __init__(self, username=PROXY_USERNAME, password=PROXY_PASSWORD, active_ports=ACTIVE_PORTS):
+        self.username = username
+        self.password = password
+        self.active_ports = active_ports
+        self._ports = {}
+        self._quarantined = {}
+        self._retired_async_clients = []  # idle clients of retired ports, closed on the event loop by request_async()/aclose()
+        self._lock = threading.Lock()
+
+    def _random_port(self):
+        while True:
+            low, high = random.choice(port_ranges)
+            port = random.randint(low, high)
+            if port not in self._ports and self._quarantined.get(port, 0) < time.monotonic():
+                self._quarantined.pop(port, None)
+                return port
+
+    def _new_session(self, port):
+        proxy_url = f"http://{self.username}:{self.password}@{PROXY_HOST}:{port}"
+        session = requests.Session()
+        session.proxies = {"http": proxy_url, "https": proxy_url}
+        return session
+
+    def _fill(self):
+        while len(self._ports) < self.active_ports:
+            port = self._random_port()
+            state = _PortState(port)
+            state.session = self._new_session(port)
+            self._ports[port] = state
+
+    def acquire(self, exclude=()):
+        """
+        Pick a port, weighted towards healthy and fast ones, avoiding `exclude` when there's a choice.
+        Every acquire() must be paired with a release() once the request is done.
+        """
+        with self._lock:
+            self._fill()
+            states = [s for s in self._ports.values() if s.port not in exclude] or list(self._ports.values())
+            state = random.choices(states, weights=[s.score() for s in states])[0]
+            state.in_flight += 1
+            return state
+
+    def release(self, state):
+        with self._lock:
+            state.in_flight -= 1
+            if state.retired and state.in_flight == 0:
+                self._close_clients(state)
+
+    def record(self, state, ok, latency):
+        with self._lock:
+            state.requests += 1
+            state.success_rate = DECAY * state.success_rate + (1 - DECAY) * (1.0 if ok else 0.0)
+            if ok:
+                state.latency = latency if state.latency is None else DECAY * state.latency + (1 - DECAY) * latency
+            else:
+                state.failures += 1
+                if state.requests == state.failures or (
+                        state.requests >= MIN_SAMPLES_FOR_QUARANTINE and state.success_rate < QUARANTINE_SUCCESS_RATE):
+                    self._quarantine(state)
+
+    def _quarantine(self, state):
+        if self._ports.pop(state.port, None) is not None:
+            logger.info(f"Quarantining proxy port {state.port} for {QUARANTINE_SECONDS}s")
+            now = time.monotonic()
+            self._quarantined = {p: until for p, until in self._quarantined.items() if until > now}
+            self._quarantined[state.port] = now + QUARANTINE_SECONDS
+            # Other threads and tasks may still be mid-request on this port; the last release() closes it
+            state.retired = True
+            if state.in_flight == 0:
+                self._close_clients(state)
+
+    def _close_clients(self, state):
+        state.session.close()
+        if state.async_client is not None:
+            self._retired_async_clients.append(state.async_client)
+            state.async_client = None
+
+    def request(self, method, url, attempts=2, **kwargs):
+        """
+        Send a request through the pool. Transport and proxy errors are retried on a different port;
+        other HTTP errors raise HTTPError without a retry. Raises the last error.
+        """
+        last_error = None
+        tried = set()
+        for attempt in range(attempts):
+            state = self.acquire(exclude=tried)
+            tried.add(state.port)
+            start = time.monotonic()
+            try:
+                response = state.session.request(method, url, **kwargs)
+                if response.status_code in PROXY_ERROR_STATUSES:
+                    response.raise_for_status()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.HTTPError) as e:
+                self.record(state, False, time.monotonic() - start)
+                logger.warning("Attempt %d failed on port %s: %s", attempt + 1, state.port, e)
+                last_error = e
+                continue
+            else:
+                self.record(state, True, time.monotonic() - start)
+            finally:
+                self.release(state)
+            response.raise_for_status()  # the target's own errors: not the port's fault, not retried
+            return response
+        raise last_error
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def _async_client(self, state):
+        import httpx
+
+        with self._lock:
+            if state.async_client is None:
+                state.async_client = httpx.AsyncClient(proxy=state.session.proxies["https"])
+            return state.async_client
+
+    async def _close_retired(self):
+        with self._lock:
+            retired, self._retired_async_clients = self._retired_async_clients, []
+        for client in retired:
+            await client.aclose()
+
+    async def request_async(self, method, url, attempts=2, timeout=30, **kwargs):
+        """Async request(): same port choice, retries and health tracking. Returns an httpx.Response."""
+        import httpx
+
+        await self._close_retired()
+        last_error = None
+        tried = set()
+        for attempt in range(attempts):
+            state = self.acquire(exclude=tried)
+            tried.add(state.port)
+            start = time.monotonic()
+            try:
+                client = self._async_client(state)
+                response = await client.request(method, url, timeout=timeout, **kwargs)
+                if response.status_code in PROXY_ERROR_STATUSES:
+                    response.raise_for_status()
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                self.record(state, False, time.monotonic() - start)
+                logger.warning("Attempt %d failed on port %s: %s", attempt + 1, state.port, e)
+                last_error = e
+                continue
+            else:
+                self.record(state, True, time.monotonic() - start)
+            finally:
+                self.release(state)
+            response.raise_for_status()
+            return response
+        raise last_error
+
+    async def post_async(self, url, **kwargs):
+        return await self.request_async("POST", url, **kwargs)
+
+    async def aclose(self):
+        """Close the per-port async clients (they're bound to the event loop that created them)."""
+        with self._lock:
+            clients = [s.async_client for s in self._ports.values() if s.async_client is not None]
+            for state in self._ports.values():
+                state.async_client = None
+        await self._close_retired()
+        for client in clients:
+            await client.aclose()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "active": [
+                    {
+                        "port": s.port,
+                        "success_rate": round(s.success_rate, 3),
+                        "latency_ms": round(s.latency * 1000) if s.latency is not None else None,
+                        "requests": s.requests,
+                        "failures": s.failures,
+                    }
+                    for s in sorted(self._ports.values(), key=lambda s: -s.score())
+                ],
+                "quarantined": sorted(p for p, until in self._quarantined.items() if until > now),
+            }
+
+
+_pool = None
+
+
+def get_proxy_pool():
+    global _pool
+    if _pool is None:
+        if not all([PROXY_USERNAME, PROXY_PASSWORD]):
+            raise ValueError("Missing required proxy credentials in the environment variables.")
+        _pool = ProxyPool()
+    return _pool
+
+
+async def close_async_proxy_clients():
+    if _pool is not None:
+        await _pool.aclose()
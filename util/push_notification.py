@@ -1,29 +1,243 @@
-import requests
-import json
+import asyncio
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from util.flow import run_flow, run_flow_async
+from util.metrics import submit_in_context, upstream_call
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+EXPO_PUSH_URL = "https://api.expo.dev/v2/push/send"
+MAX_RECIPIENTS_PER_REQUEST = 100  # Expo rejects requests with more than 100 notifications
+MAX_CONCURRENT_REQUESTS = 6
+MAX_LISTINGS_IN_SUMMARY = 3  # listing lines shown in a coalesced notification's body
+
+# kind -> (title for one listing, plural for a coalesced notification)
+NOTIFICATION_KINDS = {
+    "new": ("New Listing", "new listings"),
+    "price_drop": ("Price Drop", "price drops"),
+    "back_on_market": ("Back on Market", "listings back on market"),
+}
+
+
+def build_push_message(to: [str], title, body, data_url, listing_id=None):
+    """Build one Expo message. A message can address many tokens; dispatch() splits it if needed."""
+    return {
+        "to": list(to),
+        "title": title,
+        "body": body,
+        "sound": "default",
+        "data": {
+            "url": data_url,
+            "listingId": str(listing_id) if listing_id else None
+        }
+    }
+
+
+def build_listing_notification(to: [str], listing_id, area_name, body, data_url, kind="new"):
+    """One listing's notification for its matched tokens, before coalescing (see coalesce_notifications)."""
+    return {"to": list(to), "listing_id": listing_id, "area_name": area_name, "body": body, "data_url": data_url,
+            "kind": kind}
+
+
+def _summary_title(notifications):
+    kinds = {n["kind"] for n in notifications}
+    label = NOTIFICATION_KINDS[kinds.pop()][1] if len(kinds) == 1 else "listing updates"
+    areas = list(dict.fromkeys(n["area_name"] for n in notifications))
+    where = areas[0] if len(areas) == 1 else f"{areas[0]} and {len(areas) - 1} more"
+    return f"{len(notifications)} {label} in {where}"
+
+
+def _summary_message(to, notifications):
+    several_areas = len({n["area_name"] for n in notifications}) > 1
+    lines = [f"{n['area_name']}: {n['body']}" if several_areas else n["body"]
+             for n in notifications[:MAX_LISTINGS_IN_SUMMARY]]
+    if len(notifications) > MAX_LISTINGS_IN_SUMMARY:
+        lines.append(f"+{len(notifications) - MAX_LISTINGS_IN_SUMMARY} more")
+    message = build_push_message(to, _summary_title(notifications), "\n".join(lines), notifications[0]["data_url"])
+    message["data"]["listingIds"] = [str(n["listing_id"]) for n in notifications]
+    return message
+
+
+def coalesce_notifications(notifications):
+    """
+    Turn per-listing notifications into Expo messages with one notification per device per run.
+
+    A token matched by a single listing gets that listing's usual message; a token matched by several gets
+    one summary ("3 new listings in Chelsea"). Tokens receiving identical content share a message, so
+    dispatch() can still pack them into as few requests as possible.
+    """
+    by_token = {}
+    for index, notification in enumerate(notifications):
+        for token in notification["to"]:
+            by_token.setdefault(token, []).append(index)
+
+    recipients = {}  # tuple of notification indexes -> tokens, in first-seen order
+    for token, indexes in by_token.items():
+        recipients.setdefault(tuple(dict.fromkeys(indexes)), []).append(token)
+
+    messages = []
+    for indexes, tokens in recipients.items():
+        if len(indexes) == 1:
+            n = notifications[indexes[0]]
+            title = f"{NOTIFICATION_KINDS[n['kind']][0]} in {n['area_name']}"
+            messages.append(build_push_message(tokens, title, n["body"], n["data_url"], listing_id=n["listing_id"]))
+        else:
+            messages.append(_summary_message(tokens, [notifications[i] for i in indexes]))
+    return messages
+
+
+class PushDispatcher:
+    """Sends Expo push messages over one pooled keep-alive client with bounded parallel requests.
+
+    Messages for different listings are packed into the same request (Expo accepts an array of
+    messages, up to 100 notifications in total), and every recipient gets a ticket back:
+    {"to", "listing_id", "status", "id", "message", "details"}. dispatch_async() does the same on the
+    event loop over the shared async HTTP client.
+    """
+
+    HEADERS = {"Content-Type": "application/json", "Accept": "application/json", "Accept-Encoding": "gzip"}
+
+    def __init__(self, max_concurrency=MAX_CONCURRENT_REQUESTS, timeout=10.0):
+        import httpx
+
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._client = httpx.Client(
+            timeout=timeout,
+            headers=self.HEADERS,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="expo-push")
+
+    @staticmethod
+    def pack(messages):
+        """Split messages into request bodies of at most MAX_RECIPIENTS_PER_REQUEST notifications."""
+        batches = []
+        batch, batch_size = [], 0
+        for message in messages:
+            tokens = message["to"]
+            i = 0
+            while i < len(tokens):
+                if batch_size == MAX_RECIPIENTS_PER_REQUEST:
+                    batches.append(batch)
+                    batch, batch_size = [], 0
+                chunk = tokens[i:i + MAX_RECIPIENTS_PER_REQUEST - batch_size]
+                batch.append({**message, "to": chunk})
+                batch_size += len(chunk)
+                i += len(chunk)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @staticmethod
+    def _recipients(batch):
+        return [
+            (token, message["data"].get("listingId") or ",".join(message["data"].get("listingIds") or []) or None)
+            for message in batch
+            for token in message["to"]
+        ]
+
+    @staticmethod
+    def _failed(recipients, error):
+        logger.error(f"Expo push request failed for {len(recipients)} recipients: {error}")
+        return [
+            {"to": token, "listing_id": listing_id, "status": "error", "id": None, "message": str(error), "details": None}
+            for token, listing_id in recipients
+        ]
+
+    @staticmethod
+    def _tickets(recipients, tickets):
+        results = []
+        for i, (token, listing_id) in enumerate(recipients):
+            ticket = tickets[i] if i < len(tickets) else {"status": "error", "message": "Missing ticket"}
+            results.append({
+                "to": token,
+                "listing_id": listing_id,
+                "status": ticket.get("status"),
+                "id": ticket.get("id"),
+                "message": ticket.get("message"),
+                "details": ticket.get("details"),
+            })
+        return results
+
+    def _send_flow(self, batch):
+        """One Expo request as a flow (util/flow.py): yields the batch to POST and is sent the response."""
+        recipients = self._recipients(batch)
+        try:
+            with upstream_call("expo", "push_send") as call:
+                response = yield batch
+                call.sent_bytes = len(response.request.content)
+                call.received_bytes = len(response.content)
+                response.raise_for_status()
+            tickets = response.json().get("data") or []
+        except Exception as e:
+            return self._failed(recipients, e)
+        return self._tickets(recipients, tickets)
+
+    def _send(self, batch):
+        return run_flow(self._send_flow(batch), lambda body: self._client.post(EXPO_PUSH_URL, json=body))
+
+    async def _send_async(self, client, semaphore, batch):
+        async with semaphore:
+            return await run_flow_async(
+                self._send_flow(batch),
+                lambda body: client.post(EXPO_PUSH_URL, json=body, headers=self.HEADERS, timeout=self.timeout),
+            )
+
+    def dispatch(self, messages):
+        """Send all messages, returning one ticket per recipient in message order."""
+        batches = self.pack(messages)
+        if not batches:
+            return []
+        tickets = []
+        for future in [submit_in_context(self._executor, self._send, batch) for batch in batches]:
+            tickets.extend(future.result())
+
+        errors = sum(1 for t in tickets if t["status"] != "ok")
+        logger.info(f"Sent {len(tickets)} push notifications in {len(batches)} requests ({errors} errors)")
+        return tickets
+
+    async def dispatch_async(self, messages):
+        """dispatch() on the event loop, at most max_concurrency requests in flight."""
+        from util.clients import get_async_http_client
+
+        batches = self.pack(messages)
+        if not batches:
+            return []
+        client = get_async_http_client()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(*(self._send_async(client, semaphore, batch) for batch in batches))
+        tickets = [ticket for batch_tickets in results for ticket in batch_tickets]
+
+        errors = sum(1 for t in tickets if t["status"] != "ok")
+        logger.info(f"Sent {len(tickets)} push notifications in {len(batches)} requests ({errors} errors)")
+        return tickets
+
+
+_dispatcher = None
+
+
+def get_push_dispatcher():
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = PushDispatcher()
+    return _dispatcher
+
+
+def send_push_notifications(messages):
+    """Send many messages (e.g. one per listing) through the shared dispatcher."""
+    return get_push_dispatcher().dispatch(messages)
+
+
+async def send_push_notifications_async(messages):
+    return await get_push_dispatcher().dispatch_async(messages)
+
 
 def send_push_notification(to: [str], title, body, data_url, listing_id=None):
-    url = "https://api.expo.dev/v2/push/send"
-    headers = {'Content-Type': 'application/json'}
-    responses = []
-
-    # Split 'to' into chunks of 100
-    for i in range(0, len(to), 100):
-        chunk = to[i:i + 100]
-        payload = json.dumps({
-            "to": chunk,
-            "title": title,
-            "body": body,
-            "sound": "default",
-            "data": {
-                "url": data_url,
-                "listingId": str(listing_id) if listing_id else None
-            }
-        })
-
-        response = requests.post(url, headers=headers, data=payload)
-        responses.append(response.text)
-
-    return responses
+    return send_push_notifications([build_push_message(to, title, body, data_url, listing_id)])
 
 
 if __name__ == "__main__":
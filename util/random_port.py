@@ -1,5 +1,3 @@
-import random
-
 # Define the port ranges
 port_ranges = [
     (17001, 17099), (17101, 17199), (17201, 17299), (17301, 17399), (10001, 10999),
@@ -13,12 +11,3 @@ port_ranges = [
     (20601, 20699), (20701, 20799), (14001, 14999), (20801, 20899), (20901, 20999),
     (15001, 15999), (16001, 16999), (21001, 21099), (21101, 21199), (21201, 21299)
 ]
-
-def get_random_valid_port():
-    # Select a random range from the list
-    port_range = random.choice(port_ranges)
-    # Pick a random port within that range
-    return random.randint(port_range[0], port_range[1])
-
-if __name__ == "__main__":
-    print(get_random_valid_port())
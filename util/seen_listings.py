@@ -0,0 +1,68 @@
+import logging
+import os
+import sys
+import time
+
+from util.metrics import upstream_call
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+SEEN_LISTINGS_KEY = "seen_listing_ids"
+LEGACY_LAST_IDS_KEY = "last_ids"
+SEEN_LISTINGS_WINDOW_DAYS = float(os.getenv("SEEN_LISTINGS_WINDOW_DAYS", "14"))
+
+
+class SeenListingStore:
+    """Listing IDs we've already processed, kept in a Redis sorted set scored by last-seen time.
+
+    Entries older than the history window are trimmed on every write, so a listing that drops off
+    the first page and comes back within the window is not treated as new again. Each check or
+    mark is a single pipelined round trip regardless of batch size.
+    """
+
+    def __init__(self, get_redis, key=SEEN_LISTINGS_KEY, window_days=SEEN_LISTINGS_WINDOW_DAYS):
+        self._get_redis = get_redis
+        self.key = key
+        self.window_seconds = int(window_days * 86400)
+
+    @property
+    def redis(self):
+        return self._get_redis()
+
+    def _unseen(self, ids, scores, exists):
+        if not exists:
+            # First run after moving off the comma-joined last_ids string: honour it so the
+            # current page isn't pushed to everyone again. mark_seen() deletes it, so this only
+            # applies until the first batch is recorded.
+            legacy = self.redis.get(LEGACY_LAST_IDS_KEY)
+            known = set(legacy.split(",")) if legacy else set()
+            return [lid for lid in ids if lid not in known]
+        return [lid for lid, score in zip(ids, scores) if score is None]
+
+    def filter_unseen(self, ids):
+        """Return the IDs not seen within the window, in input order, without marking them."""
+        ids = list(dict.fromkeys(str(lid) for lid in ids))
+        if not ids:
+            return []
+        pipeline = self.redis.pipeline()
+        pipeline.zmscore(self.key, ids)
+        pipeline.exists(self.key)
+        with upstream_call("redis", "seen_filter"):
+            scores, exists = pipeline.exec()
+        return self._unseen(ids, scores, exists)
+
+    def mark_seen(self, ids):
+        """Record IDs as seen now and evict anything older than the window."""
+        ids = list(dict.fromkeys(str(lid) for lid in ids))
+        if not ids:
+            return
+        now = time.time()
+        pipeline = self.redis.pipeline()
+        pipeline.zadd(self.key, {lid: now for lid in ids})
+        pipeline.zremrangebyscore(self.key, "-inf", now - self.window_seconds)
+        pipeline.expire(self.key, self.window_seconds)
+        # The sorted set now covers what the legacy string did
+        pipeline.delete(LEGACY_LAST_IDS_KEY)
+        with upstream_call("redis", "seen_mark"):
+            pipeline.exec()
@@ -0,0 +1,284 @@
+"""
+StreetEasy GraphQL transport: named operations with minimal selections, persisted queries,
+compressed responses and fast JSON.
+
+Every call goes through execute(operation, variables). Operations are sent Apollo persisted-query
+style: the first call of an operation sends the full text plus its sha256 (registering it), later
+calls send only the hash. On PersistedQueryNotFound the full text is sent again; if the server
+doesn't support persisted queries at all they're switched off for the process. Responses are
+requested gzip-compressed (and brotli when a brotli package is installed) and decoded with orjson
+when it's available.
+
+execute_async() is the same over httpx for callers on the event loop; both share the persisted-query
+state.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+
+import requests
+from util.clients import get_http_session, get_async_http_client
+from util.listing_mapper import selection_set
+from util.metrics import upstream_call
+from util.proxy_pool import get_proxy_pool
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", stream=sys.stdout)
+logger = logging.getLogger(__name__)
+
+# Point these at benchmarks.mock_streeteasy to run against the local stand-in
+SE_API_URL = os.getenv("STREETEASY_API_URL", "https://api-v6.streeteasy.com/")
+SE_USE_PROXY = os.getenv("STREETEASY_USE_PROXY", "true").lower() not in ("0", "false", "no")
+SE_PERSISTED_QUERIES = os.getenv("STREETEASY_PERSISTED_QUERIES", "true").lower() not in ("0", "false", "no")
+
+
+def _accept_encoding():
+    for module in ("brotli", "brotlicffi"):
+        try:
+            __import__(module)
+            return "gzip, deflate, br"  # urllib3 decodes br only when one of these is installed
+        except ImportError:
+            pass
+    return "gzip, deflate"
+
+
+SE_HEADERS = {
+    "sec-ch-ua-platform": '"macOS"',
+    "x-forwarded-proto": "https",
+    "sec-ch-ua": '"Chromium";v="131", "Not_A Brand";v="24"',
+    "sec-ch-ua-mobile": "?0",
+    "app-version": "1.0.0",
+    "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
+    "accept": "application/json",
+    "accept-encoding": _accept_encoding(),
+    "apollographql-client-version": "version  83ee85d5ed42e55b57081e8a6505003a62af073b",
+    "content-type": "application/json",
+    "apollographql-client-name": "srp-frontend-service",
+    "os": "web",
+    "dnt": "1",
+    "origin": "https://streeteasy.com",
+    "sec-fetch-site": "same-site",
+    "sec-fetch-mode": "cors",
+    "sec-fetch-dest": "empty",
+    "referer": "https://streeteasy.com/",
+    "accept-language": "en-US,en;q=0.9",
+    "priority": "u=1, i",
+}
+
+# Only the fields _parse_building stores
+BUILDING_FIELDS = """
+    id slug name description
+    address { street city state zipCode }
+    geoCenter { latitude longitude }
+    yearBuilt floorCount totalUnitCount residentialUnitCount type status
+    amenities { list doormanTypes parkingTypes sharedOutdoorSpaceTypes storageSpaceTypes }
+    policies { list petPolicy { catsAllowed dogsAllowed maxDogWeight } }
+    rentalInventorySummary { featureSummary { list } }
+    nyc { bin bbl buildingClass buildingClassDescription hasAbatements schoolDistrict }
+"""
+
+
+class Operation:
+    """A named GraphQL document, whitespace-normalized so its persisted-query hash is stable."""
+
+    def __init__(self, document):
+        self.document = re.sub(r"\s+", " ", document).strip()
+        self.name = re.match(r"(?:query|mutation)\s+(\w+)", self.document).group(1)
+        self.sha256 = hashlib.sha256(self.document.encode()).hexdigest()
+
+    def __repr__(self):
+        return f"Operation({self.name})"
+
+
+SEARCH_RENTALS = Operation(f"""
+    query GetAllRentalListingDetails($input: SearchRentalsInput!) {{
+        searchRentals(input: $input) {{
+            search {{ criteria }}
+            totalCount
+            edges {{ ... on OrganicRentalEdge {{ node {{ {selection_set()} }} }} }}
+        }}
+    }}
+""")
+
+LISTING_STATUSES = Operation("""
+    query CheckListingStatus($ids: [ID!]!) {
+        rentalsByListingIds(ids: $ids) { id buildingId status offMarketAt }
+    }
+""")
+
+BUILDINGS_BY_IDS = Operation(f"""
+    query GetBuildingsByIds($ids: [ID!]!) {{
+        buildingsByIds(ids: $ids) {{ {BUILDING_FIELDS} }}
+    }}
+""")
+
+BUILDING_BY_LISTING_ID = Operation(f"""
+    query GetBuildingByListingId($id: ID!) {{
+        buildingByRentalListingId(id: $id) {{ {BUILDING_FIELDS} }}
+    }}
+""")
+
+_PERSISTED_NOT_FOUND = {"PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND"}
+_PERSISTED_NOT_SUPPORTED = {"PersistedQueryNotSupported", "PERSISTED_QUERY_NOT_SUPPORTED"}
+# What a server that ignores the extension says to a request without query text
+_MISSING_QUERY_RE = re.compile(r"must provide (a )?query|no query|query (string )?(is )?missing", re.IGNORECASE)
+
+_registered = set()  # hashes the server has accepted with full text
+_persisted_enabled = SE_PERSISTED_QUERIES
+_lock = threading.Lock()
+
+
+def _dumps(payload):
+    return orjson.dumps(payload) if orjson else json.dumps(payload, separators=(",", ":")).encode()
+
+
+def _loads(content):
+    return orjson.loads(content) if orjson else json.loads(content)
+
+
+def _error_codes(body):
+    codes = set()
+    for error in body.get("errors") or []:
+        codes.add(error.get("message"))
+        codes.add((error.get("extensions") or {}).get("code"))
+    return codes
+
+
+def _send(operation, payload, timeout, use_proxy):
+    """POST one payload and return the decoded body."""
+    data = _dumps(payload)
+    with upstream_call("streeteasy", operation.name) as call:
+        if use_proxy:
+            response = get_proxy_pool().post(SE_API_URL, headers=SE_HEADERS, data=data, timeout=timeout)
+        else:
+            response = get_http_session().post(SE_API_URL, headers=SE_HEADERS, data=data, timeout=timeout)
+            response.raise_for_status()
+        call.sent_bytes = len(data)
+        # Wire size when the server says so (i.e. compressed), else the decoded size
+        call.received_bytes = int(response.headers.get("content-length") or len(response.content))
+        body = _loads(response.content)
+        call.ok = body.get("data") is not None or not body.get("errors")
+        return body
+
+
+async def _send_async(operation, payload, timeout, use_proxy):
+    data = _dumps(payload)
+    with upstream_call("streeteasy", operation.name) as call:
+        if use_proxy:
+            response = await get_proxy_pool().post_async(SE_API_URL, headers=SE_HEADERS, content=data,
+                                                         timeout=timeout)
+        else:
+            response = await get_async_http_client().post(SE_API_URL, headers=SE_HEADERS, content=data,
+                                                          timeout=timeout)
+            response.raise_for_status()
+        call.sent_bytes = len(data)
+        call.received_bytes = int(response.headers.get("content-length") or len(response.content))
+        body = _loads(response.content)
+        call.ok = body.get("data") is not None or not body.get("errors")
+        return body
+
+
+def _rejected_body(response):
+    """GraphQL errors from a hash-only request rejected with HTTP 400, or None if the body has none."""
+    try:
+        body = _loads(response.content)
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) and body.get("errors") else None
+
+
+def _disable_persisted_queries(reason):
+    global _persisted_enabled
+    with _lock:
+        if _persisted_enabled:
+            logger.info(f"Persisted queries disabled: {reason}")
+        _persisted_enabled = False
+
+
+def _persisted_flow(operation, variables):
+    """
+    The persisted-query exchange for one call, shared by execute() and execute_async(): yields
+    (payload, hash_only) to send and is sent back the decoded body. A hash-only request rejected with
+    HTTP 400 is sent back its GraphQL errors, or None when the 400 carried none. Returns the final body.
+    """
+    payload = {"operationName": operation.name, "variables": variables}
+    extensions = {"persistedQuery": {"version": 1, "sha256Hash": operation.sha256}}
+
+    if _persisted_enabled and operation.sha256 in _registered:
+        body = yield {**payload, "extensions": extensions}, True
+        if body is None:
+            body = {"errors": [{"message": "PersistedQueryNotSupported"}]}
+        codes = _error_codes(body)
+        if codes & _PERSISTED_NOT_SUPPORTED or any(_MISSING_QUERY_RE.search(str(c)) for c in codes if c):
+            _disable_persisted_queries("server does not support them")
+        elif not codes & _PERSISTED_NOT_FOUND:
+            return body
+        with _lock:
+            _registered.discard(operation.sha256)
+
+    full_payload = {**payload, "query": operation.document}
+    if _persisted_enabled:
+        full_payload["extensions"] = extensions
+    body = yield full_payload, False
+    if _persisted_enabled:
+        if _error_codes(body) & _PERSISTED_NOT_SUPPORTED:
+            _disable_persisted_queries("server does not support them")
+            return (yield {**payload, "query": operation.document}, False)
+        if body.get("data") is not None:
+            with _lock:
+                _registered.add(operation.sha256)
+    return body
+
+
+def execute(operation, variables, timeout=30, use_proxy=None):
+    """
+    Run a named operation and return the decoded response body ({"data": ...} and/or {"errors": [...]}).
+    Network and HTTP errors raise (after the proxy pool's retries), as before.
+    """
+    if use_proxy is None:
+        use_proxy = SE_USE_PROXY
+    flow = _persisted_flow(operation, variables)
+    payload, hash_only = next(flow)
+    while True:
+        try:
+            body = _send(operation, payload, timeout, use_proxy)
+        except requests.exceptions.HTTPError as e:
+            if not hash_only or e.response is None or e.response.status_code != 400:
+                raise
+            logger.warning(f"Hash-only {operation.name} rejected with HTTP 400: {e}")
+            body = _rejected_body(e.response)
+        try:
+            payload, hash_only = flow.send(body)
+        except StopIteration as done:
+            return done.value
+
+
+async def execute_async(operation, variables, timeout=30, use_proxy=None):
+    """execute() for the event loop. Network and HTTP errors raise httpx exceptions."""
+    import httpx
+
+    if use_proxy is None:
+        use_proxy = SE_USE_PROXY
+    flow = _persisted_flow(operation, variables)
+    payload, hash_only = next(flow)
+    while True:
+        try:
+            body = await _send_async(operation, payload, timeout, use_proxy)
+        except httpx.HTTPStatusError as e:
+            if not hash_only or e.response.status_code != 400:
+                raise
+            logger.warning(f"Hash-only {operation.name} rejected with HTTP 400: {e}")
+            body = _rejected_body(e.response)
+        try:
+            payload, hash_only = flow.send(body)
+        except StopIteration as done:
+            return done.value
@@ -1,12 +1,11 @@
 from fastapi import HTTPException, Header
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
 BEARER_TOKEN = os.getenv("BEARER_TOKEN")
 
 
-def validate_bearer_token(authorization: str = Header(...)):
+async def validate_bearer_token(authorization: str = Header(...)):
+    # No I/O, so it runs on the event loop instead of taking a threadpool slot per request
     # Check if the header is formatted as "Bearer <token>"
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Invalid Authorization header format.")